@@ -6,11 +6,18 @@ Consists of the single class that provides functionality for the 'Analyse
 Convergence' tab of the analysis GUI.
 '''
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import os
 import re
-from PyQt5 import QtCore
+import tempfile
+import numpy as np
+from PyQt5 import QtWidgets, QtCore
 from pyqtgraph import intColor as colr
 from ..ui.analysis_tab import AnalysisTab
+from ..ui.analysis_worker import AnalysisCancelled
+from ..ui.schemas import SCHEMAS
+from ..ui.small_multiples import SmallMultiplesDialog
 
 class AnalysisConvergence(AnalysisTab):
     '''
@@ -72,33 +79,44 @@ class AnalysisConvergence(AnalysisTab):
 
         Plots the orthonormality error for each mode for a given state.
         '''
-        output = self.runCmd(['ortho'])
-        # get the relevant data we want (between the two #, but skip first line
-        # which is the header - see docstring)
-        match = re.findall(r'#.*?\n(.*)#', output, flags=re.DOTALL)
-        if len(match) != 1:
-            raise ValueError('Invalid ortho output?')
-        # assemble data matrix
-        self.window().data = self.readFloats(match[0].split('\n'))
-
-        # only select rows where state column equals user selected state, using
-        # a numpy mask
         state = self.ortho_state.value()
-        arr = self.window().data[self.window().data[:, 1] == state, :]
-        if arr.size == 0:
-            max_state = self.window().data[:, 1].max()
-            raise ValueError(f'Selected state {state} is larger than highest '
-                             f'state {int(max_state)}')
-        # number of modes is number of columns minus time, state, total columns
-        n_modes = self.window().data.shape[1] - 3
-        # start plotting
-        self.window().plot.reset(switch_to_plot=True)
-        self.window().plot.setLabels(title='SPF Orthonormality',
-                                     bottom='Time (fs)', left='Orthonormality error')
-        self.window().plot.plot(arr[:, 0], arr[:, 2], name='Total', pen='k')
-        for i in range(1, n_modes+1):
-            self.window().plot.plot(arr[:, 0], arr[:, 2+i], name=f'Mode {i}',
-                                    pen=colr(i-1, n_modes, maxValue=200))
+        cwd = self.window().dir.cwd
+
+        def compute():
+            lines = self.runCmdIter(['ortho'], cwd=cwd)
+            # skip to the header line (the first starting with #), the
+            # relevant data we want is after it (see docstring)
+            for line in lines:
+                if line.startswith('#'):
+                    break
+            else:
+                raise ValueError('Invalid ortho output?')
+            # assemble data matrix, parsing blocks of lines while ortho is
+            # still running. the line starting with # at the end is ignored
+            return self.stackFloats(self.readFloatsChunked(lines, ignore_regex=r'^#',
+                                                           chunk_lines=1000))
+
+        def plot(data):
+            self.window().data = data
+            # only select rows where state column equals user selected state,
+            # using a numpy mask
+            arr = self.window().data[self.window().data[:, 1] == state, :]
+            if arr.size == 0:
+                max_state = self.window().data[:, 1].max()
+                raise ValueError(f'Selected state {state} is larger than highest '
+                                 f'state {int(max_state)}')
+            # number of modes is number of columns minus time, state, total columns
+            n_modes = self.window().data.shape[1] - 3
+            # start plotting
+            self.window().plot.reset(switch_to_plot=True)
+            self.window().plot.setLabels(title='SPF Orthonormality',
+                                         bottom='Time (fs)', left='Orthonormality error')
+            self.window().plot.plot(arr[:, 0], arr[:, 2], name='Total', pen='k')
+            for i in range(1, n_modes+1):
+                self.window().plot.plot(arr[:, 0], arr[:, 2+i], name=f'Mode {i}',
+                                        pen=colr(i-1, n_modes, maxValue=200))
+
+        self.runInThread(compute, plot)
 
     def rdgpop(self):
         '''
@@ -121,27 +139,34 @@ class AnalysisConvergence(AnalysisTab):
             str(self.gpop_nz.value()),
             str(self.gpop_dof.value())
         ]
-        self.runCmd(['rdgpop', '-w'] + gpop_options)
+        cwd = self.window().dir.cwd
 
-        filepath = self.window().dir.cwd/'gpop.pl'
-        # assemble data matrix
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().data = self.readFloats(f, 5, ignore_regex=r'^#')
+        def compute():
+            self.runCmd(['rdgpop', '-w'] + gpop_options, cwd=cwd,
+                        inputs=['gridpop'], outputs=['gpop.pl'])
+            filepath = cwd/'gpop.pl'
+            # assemble data matrix
+            return self.readCached(filepath, SCHEMAS['gpop.pl'].read,
+                                   ('schema', 'gpop.pl'))
 
-        # start plotting
-        self.window().plot.reset(switch_to_plot=True)
-        self.window().plot.setLabels(title='Grid edge population',
-                                     bottom='Time (fs)', left='Population')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 1],
-                                name='Grid (begin)', pen='r')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 2],
-                                name='Grid (end)',
-                                pen={'color': 'r', 'style': QtCore.Qt.DashLine})
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 3],
-                                name='Basis (begin)', pen='b')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 4],
-                                name='Basis (end)',
-                                pen={'color': 'b', 'style': QtCore.Qt.DashLine})
+        def plot(data):
+            self.window().data = data
+            # start plotting
+            self.window().plot.reset(switch_to_plot=True)
+            self.window().plot.setLabels(title='Grid edge population',
+                                         bottom='Time (fs)', left='Population')
+            self.window().plot.plot(self.window().data['time'], self.window().data['grid_begin'],
+                                    name='Grid (begin)', pen='r')
+            self.window().plot.plot(self.window().data['time'], self.window().data['grid_end'],
+                                    name='Grid (end)',
+                                    pen={'color': 'r', 'style': QtCore.Qt.DashLine})
+            self.window().plot.plot(self.window().data['time'], self.window().data['basis_begin'],
+                                    name='Basis (begin)', pen='b')
+            self.window().plot.plot(self.window().data['time'], self.window().data['basis_end'],
+                                    name='Basis (end)',
+                                    pen={'color': 'b', 'style': QtCore.Qt.DashLine})
+
+        self.runInThread(compute, plot)
 
     def natpop(self):
         '''
@@ -155,29 +180,50 @@ class AnalysisConvergence(AnalysisTab):
 
         where t is time and sn is the natural population for SPF n.
 
-        Plots the populations of natural orbitals against time.
+        Plots the populations of natural orbitals against time. If 'All modes
+        and states' is checked, runs rdcheck natpop for every mode and state
+        (see self.rdcheckAll).
         '''
         # additional arguments for natpop
         natpop_options = [
             str(self.natpop_mode.value()),
             str(self.natpop_state.value())
         ]
-        self.runCmd(['rdcheck', 'natpop'] + natpop_options)
+        cwd = self.window().dir.cwd
+        if self.natpop_all.isChecked():
+            n_modes, n_spf_states, _, _ = self.findModes(cwd)
+            self.rdcheckAll('natpop', n_modes, n_spf_states, 'Mode',
+                            self.natpop_mode, self.natpop_state, self.plotNatpop)
+            return None
+
+        def compute():
+            # find filename of command output
+            filepath = cwd/f'natpop_{"_".join(natpop_options)}.pl'
+            self.runCmd(['rdcheck', 'natpop'] + natpop_options, cwd=cwd,
+                        inputs=['check'], outputs=[filepath.name])
+            # assemble data matrix
+            return self.readCached(filepath, SCHEMAS['natpop_*.pl'].read,
+                                   ('schema', 'natpop_*.pl'))
 
-        # find filename of command output
-        filepath = self.window().dir.cwd/f'natpop_{"_".join(natpop_options)}.pl'
-        # assemble data matrix
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().data = self.readFloats(f)
+        def plot(data):
+            self.window().data = data
+            self.plotNatpop(data['time'], data['weight'].T)
 
-        # start plotting
+        self.runInThread(compute, plot)
+        return None
+
+    def plotNatpop(self, time:np.ndarray, weights:np.ndarray):
+        '''
+        Plots the natural populations (one row of weights for each SPF) against
+        time.
+        '''
         self.window().plot.reset(switch_to_plot=True)
         self.window().plot.setLabels(title='Natural population',
                                      bottom='Time (fs)', left='Weight')
-        n_spfs = self.window().data.shape[1] - 1 # minus time column
+        n_spfs = len(weights)
         for i in range(1, n_spfs + 1):
-            self.window().plot.plot(self.window().data[:, 0], self.window().data[:, i],
-                                    name=f'SPF {i}', pen=colr(i-1, n_spfs, maxValue=200))
+            self.window().plot.plot(time, weights[i-1], name=f'SPF {i}',
+                                    pen=colr(i-1, n_spfs, maxValue=200))
 
     def qdq(self):
         '''
@@ -192,30 +238,194 @@ class AnalysisConvergence(AnalysisTab):
         where t is time, q is the expectation of the coordinate value <q> and
         dq is the width of the <q>, <dq>.
 
-        Plots <q> and <dq> against time.
+        Plots <q> and <dq> against time. If 'All DOFs and states' is checked,
+        runs rdcheck qdq for every DOF and state (see self.rdcheckAll).
         '''
         # additional arguments for qdq
         qdq_options = [
             str(self.qdq_dof.value()),
             str(self.qdq_state.value())
         ]
-        self.runCmd(['rdcheck', 'qdq'] + qdq_options)
+        cwd = self.window().dir.cwd
+        if self.qdq_all.isChecked():
+            _, _, n_dofs, n_states = self.findModes(cwd)
+            self.rdcheckAll('qdq', n_dofs, n_states, 'DOF', self.qdq_dof,
+                            self.qdq_state, self.plotQdq)
+            return None
 
-        # find filename of command output
-        filepath = self.window().dir.cwd/f'qdq_{"_".join(qdq_options)}.pl'
-        # assemble data matrix
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().data = self.readFloats(f, 3)
+        def compute():
+            # find filename of command output
+            filepath = cwd/f'qdq_{"_".join(qdq_options)}.pl'
+            self.runCmd(['rdcheck', 'qdq'] + qdq_options, cwd=cwd,
+                        inputs=['check'], outputs=[filepath.name])
+            # assemble data matrix
+            return self.readCached(filepath, SCHEMAS['qdq_*.pl'].read,
+                                   ('schema', 'qdq_*.pl'))
 
-        # start plotting
+        def plot(data):
+            self.window().data = data
+            self.plotQdq(data['time'], [data['q'], data['dq']], qdq_options[0])
+
+        self.runInThread(compute, plot)
+        return None
+
+    def plotQdq(self, time:np.ndarray, q_dq:np.ndarray, dof:int=None):
+        '''
+        Plots <q> and <dq> (the two rows of q_dq) against time for a DOF, by
+        default the DOF selected in the options.
+        '''
+        if dof is None:
+            dof = self.qdq_dof.value()
         self.window().plot.reset(switch_to_plot=True)
         self.window().plot.setLabels(title='Coordinate expectation values',
-                                     bottom='Time (fs)',
-                                     left=f'DOF {self.qdq_dof.value()}')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 1],
-                                name='q', pen='r')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 2],
-                                name='dq', pen='b')
+                                     bottom='Time (fs)', left=f'DOF {dof}')
+        self.window().plot.plot(time, q_dq[0], name='q', pen='r')
+        self.window().plot.plot(time, q_dq[1], name='dq', pen='b')
+
+    @staticmethod
+    def findModes(cwd:Path) -> tuple:
+        '''
+        Reads the input file in the directory cwd, and returns a tuple of the
+        number of modes (combined modes in the SPF-BASIS-SECTION), the number
+        of sets of SPFs (the number of states if multi-set, otherwise 1), the
+        number of DOFs (lines in the PRIMITIVE-BASIS-SECTION, including the
+        electronic DOF) and the number of electronic states.
+        '''
+        try:
+            with open(cwd/'input', mode='r', encoding='utf-8') as f:
+                txt = f.read()
+        except FileNotFoundError:
+            raise ValueError('Input file is needed to find the modes and '
+                             'states') from None
+        spf_section = re.search(
+            r'S(?:PF-)?BASIS-SECTION\s*\n(.*?)\nend-s(?:pf-)?basis-section',
+            txt, re.DOTALL|re.IGNORECASE
+        )
+        primitive_section = re.search(
+            r'PRIMITIVE-BASIS-SECTION\s*\n(.*?)\nend-primitive-basis-section',
+            txt, re.DOTALL|re.IGNORECASE
+        )
+        if spf_section is None or primitive_section is None:
+            raise ValueError('Cannot find the SPF-BASIS-SECTION or PRIMITIVE-'
+                             'BASIS-SECTION in input file')
+        # each mode is a list of dofs, then = and the number of spfs for each
+        # state (if multi-set), see CoordinateSelector.findModeLabels
+        modes = [n_spfs.split(',') for dofs, n_spfs
+                 in re.findall(r'([^=\n]+?)=\s*(\d+(?:\s*,\s*\d+)*)', spf_section[1])
+                 if dofs.strip() not in ['packets', 'gwp_type']]
+        # one line for each dof, the electronic dof is in the form el el n
+        dofs = [line for line in primitive_section[1].split('\n') if line.strip()]
+        el = re.search(r'^\s*\S+\s+el\s+(\d+)', primitive_section[1],
+                       re.MULTILINE|re.IGNORECASE)
+        n_states = int(el[1]) if el else 1
+        if re.search(r'^\s*multi-set', spf_section[1], re.MULTILINE|re.IGNORECASE):
+            n_spf_states = max(len(n_spfs) for n_spfs in modes)
+        else:
+            n_spf_states = 1
+        if len(modes) == 0 or len(dofs) == 0:
+            raise ValueError('Cannot find the modes in input file')
+        return len(modes), n_spf_states, len(dofs), n_states
+
+    def rdcheckAll(self, task:str, n_rows:int, n_states:int, row_name:str,
+                   row_box:QtWidgets.QSpinBox, state_box:QtWidgets.QSpinBox,
+                   plot_cell:callable):
+        '''
+        Runs rdcheck task (natpop or qdq) for every mode/DOF (rows 1 ...
+        n_rows) and state (1 ... n_states), in parallel in a pool of threads.
+        Each command is run in its own scratch directory containing a link to
+        the check file, so that commands can't overwrite each other's files.
+        In no command mode, the existing .pl files are read instead.
+
+        The results are put into one array with shape (n_rows, n_states,
+        n_times, n_columns), padded with NaN, which is saved in
+        self.window().data. The (row, state) selected in row_box and
+        state_box is plotted in the main window using plot_cell(time, y)
+        where y has one row for each column after time, and a dialog shows a
+        small plot for every (row, state). Clicking on one shows it in the main
+        window.
+        '''
+        cwd = self.window().dir.cwd
+        no_command = self.window().no_command.isChecked()
+        schema = SCHEMAS[f'{task}_*.pl']
+        jobs = [(row, state) for row in range(1, n_rows+1)
+                for state in range(1, n_states+1)]
+
+        def run(row, state):
+            self.checkCancelled()
+            name = f'{task}_{row}_{state}.pl'
+            if no_command:
+                arr = schema.read(cwd/name)
+            else:
+                with tempfile.TemporaryDirectory(prefix='rdcheck_') as scratch:
+                    scratch = Path(scratch)
+                    (scratch/'check').symlink_to((cwd/'check').resolve())
+                    self.runCmd(['rdcheck', task, str(row), str(state)],
+                                cwd=scratch, show=False)
+                    arr = schema.read(scratch/name)
+            # structured array to 2D array of floats, time first
+            return np.column_stack([arr[field].reshape(len(arr), -1)
+                                    for field in arr.dtype.names])
+
+        def compute():
+            # rdcheck spends most of its time reading the check file, so use
+            # more threads than cpus
+            with ThreadPoolExecutor(max_workers=min(len(jobs), 2*(os.cpu_count() or 1))) as pool:
+                futures = {job: pool.submit(run, *job) for job in jobs}
+            results = {}
+            errors = []
+            for (row, state), future in futures.items():
+                try:
+                    results[row, state] = future.result()
+                except AnalysisCancelled:
+                    raise
+                except Exception as e:
+                    errors.append(f'{row_name} {row}, state {state}: '
+                                  f'{type(e).__name__}: {e}')
+            if not results:
+                raise ValueError(f'rdcheck {task} failed for every {row_name.lower()} '
+                                 'and state:\n' + '\n'.join(errors[:10]))
+            # pad into one array
+            n_times = max(len(result) for result in results.values())
+            n_columns = max(result.shape[1] for result in results.values())
+            data = np.full((n_rows, n_states, n_times, n_columns), np.nan)
+            for (row, state), result in results.items():
+                data[row-1, state-1, :len(result), :result.shape[1]] = result
+            return data, errors
+
+        def plotSelected(row, state):
+            # plot one cell of the array in the main window
+            row_box.setValue(row+1)
+            state_box.setValue(state+1)
+            cell = self.window().data[row, state]
+            if np.all(np.isnan(cell)):
+                self.window().statusbar.showMessage(
+                    f'rdcheck {task} failed for {row_name} {row+1}, state '
+                    f'{state+1}, see the text tab', 10000
+                )
+                return None
+            # drop padding
+            cell = cell[~np.isnan(cell[:, 0])]
+            cell = cell[:, ~np.all(np.isnan(cell), axis=0)]
+            plot_cell(cell[:, 0], cell[:, 1:].T)
+            return None
+
+        def plot(result):
+            self.window().data, errors = result
+            self.window().text.setPlainText(
+                f'Ran rdcheck {task} for {len(jobs)-len(errors)} of {len(jobs)} '
+                f'{row_name.lower()}/state pairs.\n' + '\n'.join(errors)
+            )
+            plotSelected(min(row_box.value(), n_rows) - 1,
+                         min(state_box.value(), n_states) - 1)
+            dialog = SmallMultiplesDialog(
+                self.window(), f'rdcheck {task}', self.window().data,
+                [f'{row_name} {row}' for row in range(1, n_rows+1)],
+                [f'State {state}' for state in range(1, n_states+1)]
+            )
+            dialog.cellClicked.connect(plotSelected)
+            dialog.show()
+
+        self.runInThread(compute, plot)
 
     def norm(self):
         '''
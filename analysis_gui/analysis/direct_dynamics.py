@@ -13,17 +13,45 @@ import numpy as np
 from PyQt5 import QtWidgets, QtCore
 from pyqtgraph import intColor as colr
 from ..ui.analysis_tab import AnalysisTab
+from ..ui.directory_cache import DirectoryCache
+from ..ui.log_index import LogIndex
+from ..ui.multi_line import MultiLineItem
+from ..ui.result_table import ResultTableModel
 
 class AnalysisDirectDynamics(AnalysisTab):
     '''
     Promoted widget that defines functionality for the 'Analyse Direct
     Dynamics' tab of the analysis GUI.
     '''
+    # the most of the log shown in the text view at once, in bytes
+    LOG_TEXT_BYTES = 8*1024**2
+    # the counters of the log (see LogIndex.COUNTERS) that can be plotted by
+    # calcrate, in the order of the calcrate_counter combo box
+    CALCRATE_COUNTERS = [('qc_calcs', 'QC calculations'),
+                         ('warnings', 'Warnings'),
+                         ('db_points', 'New DB points')]
+    # most colours used for the lines of the GWPs plotted by gwptraj (GWPs
+    # next to each other share a colour if there are more)
+    GWP_PENS = 64
+    # rows of the database read at a time by ddpesgeo
+    FETCH_ROWS = 10000
+
     def __init__(self):
         '''
         Constructor method. Loads the UI file.
         '''
         super().__init__(Path(__file__).parent/'direct_dynamics.ui')
+        # the index of the log plotted by calcrate, and whether the text view
+        # shows the end of the log
+        self._log_index = None
+        self._log_text_end = False
+        # (key, data, tensor) of the trajectory file read by gwptraj, see
+        # trajectoryTensor, and (file stamp, ngwp) of the input file
+        self._gwptraj = None
+        self._ngwp = None
+        # (key, database file, atom names, ranked table) of the near-
+        # degeneracies found by seams
+        self._seams = None
 
     def activate(self):
         '''
@@ -35,20 +63,24 @@ class AnalysisDirectDynamics(AnalysisTab):
             1: self.gwptraj,  # plot wavepacket basis function trajectories
             2: self.ddpesgeo, # inspect PES/APES in database
             3: self.checkdb,  # check or clean database
-            4: self.querydb   # query database
+            4: self.querydb,  # query database
+            5: self.seams     # find near-degeneracies in database
         }
         options = {
+            0: self.calcrate_box,
             1: self.gwptraj_box,
             2: self.ddpesgeo_box,
             3: self.clean_box,
-            4: self.sql_box
+            4: self.sql_box,
+            5: self.seam_box
         }
         required_files = {
             0: ['log'],
             1: ['psi'],
             2: ['database.sql'],
             3: ['database.sql'],
-            4: ['database.sql']
+            4: ['database.sql'],
+            5: ['database.sql']
         }
         super().activate(methods, options, required_files)
 
@@ -63,6 +95,14 @@ class AnalysisDirectDynamics(AnalysisTab):
         self.clean_rmfail.stateChanged.connect(self.cleanOptionChanged)
         # have the sql query box grow in size instead of adding a scroll bar
         self.sql_query.textChanged.connect(self.sqlChanged)
+        # redraw the trajectories (without reading them again) when the
+        # options change
+        self.gwptraj_task.currentIndexChanged.connect(self.gwptrajOptionChanged)
+        self.gwptraj_mode.valueChanged.connect(self.gwptrajOptionChanged)
+        self.gwptraj_allmodes.stateChanged.connect(self.gwptrajOptionChanged)
+        # show another page of the near-degeneracies without finding them again
+        self.seam_page.valueChanged.connect(self.seamsOptionChanged)
+        self.seam_rows.valueChanged.connect(self.seamsOptionChanged)
 
     @QtCore.pyqtSlot()
     def ddpesgeoOptionChanged(self):
@@ -77,6 +117,35 @@ class AnalysisDirectDynamics(AnalysisTab):
             else:
                 box.hide()
 
+    @QtCore.pyqtSlot()
+    def gwptrajOptionChanged(self):
+        '''
+        Redraws the GWP trajectories plotted by gwptraj for the task and mode
+        chosen, if they are still plotted. The mode can't be chosen when
+        plotting all modes.
+        '''
+        self.gwptraj_mode.setEnabled(not self.gwptraj_allmodes.isChecked())
+        if self._gwptraj is None or self.worker is not None \
+        or self.window().data is not self._gwptraj[1]:
+            return None
+        try:
+            self.gwptrajPlot()
+        except ValueError as e:
+            self.window().statusbar.showMessage(str(e), 5000)
+        return None
+
+    @QtCore.pyqtSlot()
+    def seamsOptionChanged(self):
+        '''
+        Shows the page of near-degeneracies chosen, if the result of seams is
+        still shown.
+        '''
+        if self._seams is None or self.worker is not None \
+        or self.window().data is not self._seams[3]:
+            return None
+        self.seamsPage()
+        return None
+
     @QtCore.pyqtSlot()
     def cleanOptionChanged(self):
         '''
@@ -112,41 +181,57 @@ class AnalysisDirectDynamics(AnalysisTab):
         No. QC calculations :     N1.n
         ... (etc)
 
-        and plots the number of calculations per timestep against time.
+        and plots the number of calculations per timestep against time (or
+        another of the counters in LogIndex.COUNTERS, eg. warnings).
+
+        The log is indexed by time step once (see LogIndex) and the index is
+        kept in the directory cache, so plotting it again is a lookup and only
+        the part of the log added since is scanned. The text view shows up to
+        LOG_TEXT_BYTES of the log, from the start or from the time step at the
+        time chosen.
         '''
         filepath = self.window().dir.cwd/'log'
-        times = []
-        n_calcs = []
-        self.window().text.clear()
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            for line in f:
-                self.window().text.appendPlainText(line[:-1])
-                # find a line with time[fs] in it and get time
-                if re.search(r'time\[fs\]', line):
-                    try:
-                        time = float(re.search(r'[+-]?\d+(?:\.\d*)?', line)[0])
-                        times.append(time)
-                        n_calcs.append(0)
-                    except ValueError:
-                        pass
-                # find a line with No. QC calculations in it and get n_calc
-                if re.search(r'No\. QC calculations', line):
-                    try:
-                        n_calc = int(re.search(r'\d+', line)[0])
-                        n_calcs[-1] += n_calc
-                    except ValueError:
-                        pass
-        if len(times) == 0:
-            # nothing found?
-            raise ValueError('Invalid log file')
-        self.window().data = np.array([times, n_calcs])
-
-        # start plotting, depending on options
-        self.window().plot.reset(switch_to_plot=True)
-        self.window().plot.setLabels(title='Calculations per time step',
-                                      bottom='Time (fs)', left='QC calculations')
-        self.window().plot.plot(self.window().data[0, :], self.window().data[1, :],
-                                 name='QC calculations', pen='r')
+        cache = self.directoryCache(filepath.parent)
+        counter, label = self.CALCRATE_COUNTERS[self.calcrate_counter.currentIndex()]
+        time = self.calcrate_time.value() if self.calcrate_goto.isChecked() else None
+
+        def compute():
+            log_index = LogIndex(filepath, cache)
+            if len(log_index) == 0:
+                # nothing found?
+                raise ValueError('Invalid log file')
+            step = None if time is None else log_index.find(time)
+            txt, more = log_index.read(step, self.LOG_TEXT_BYTES)
+            return log_index, txt, more
+
+        def plot(result):
+            log_index, txt, more = result
+            self._log_index = log_index
+            # only add new lines to the text view if it shows the end of the log
+            self._log_text_end = more == 0
+            self.window().text.setPlainText(txt.rstrip('\n'))
+            if more:
+                self.window().text.appendPlainText(f'... ({more} more bytes of log)')
+            self.window().data = np.array([log_index.times, log_index.counts(counter)])
+
+            # start plotting, depending on options
+            self.window().plot.reset(switch_to_plot=True)
+            self.window().plot.setLabels(title=f'{label} per time step',
+                                          bottom='Time (fs)', left=label)
+            self.window().plot.plot(self.window().data[0, :], self.window().data[1, :],
+                                     name=label, pen='r')
+            self.followFile(filepath, update, log_index.end)
+
+        def update(txt:str):
+            # index the new lines, which may add to the last time step too
+            self._log_index.refresh()
+            if self._log_text_end:
+                self.window().text.appendPlainText(txt.rstrip('\n'))
+            self.window().data = np.array([self._log_index.times,
+                                           self._log_index.counts(counter)])
+            self.window().plot.listDataItems()[0].setData(self.window().data[0, :],
+                                                          self.window().data[1, :])
+        self.runInThread(compute, plot)
 
     def gwptraj(self):
         '''
@@ -162,29 +247,57 @@ class AnalysisDirectDynamics(AnalysisTab):
         are the modes. The columns are then repeated for momenta instead of
         GWP center coordinates.
 
-        Plots the GWPs' center or momentum for a given mode. No legend is
-        output.
-        '''
-        # -trj outputs a trajectory file only
-        self.runCmd(['gwptraj', '-trj'])
-        filepath = self.window().dir.cwd/'trajectory'
-        # assemble data matrix
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().data = self.readFloats(f)
+        Plots the GWPs' center or momentum against time, or their momentum
+        against their center (a phase portrait), for a given mode or all
+        modes, see gwptrajPlot. No legend is output.
 
-        # add contents of showd1d.log to text view
-        filepath = self.window().dir.cwd/'gwptraj.log'
-        if filepath.is_file():
-            with open(filepath, mode='r', encoding='utf-8') as f:
-                self.window().text.appendPlainText(f'{"-"*80}\n{f.read()}')
-
-        # find ngwp from input. if input not found ask user for value
+        The trajectories are kept in memory (see trajectoryTensor) until the
+        file changes, so changing the options redraws them without reading
+        the file again.
+        '''
+        cwd = self.window().dir.cwd
+        ngwp = self.findNgwp(cwd)
+        cached = self._gwptraj
+
+        def compute():
+            # -trj outputs a trajectory file only
+            self.runCmd(['gwptraj', '-trj'], cwd=cwd, inputs=['psi', 'input'],
+                        outputs=['trajectory', 'gwptraj.log'])
+            filepath = cwd/'trajectory'
+            key = (DirectoryCache.fileStamp(filepath), ngwp)
+            if cached is not None and cached[0] == key:
+                data, tensor = cached[1:]
+            else:
+                # assemble data matrix. file can be very large, read in chunks
+                data = self.readFloatsCached(filepath, chunked=True)
+                tensor = self.trajectoryTensor(data, ngwp)
+            return (key, data, tensor), self.readLog(cwd/'gwptraj.log')
+
+        def plot(result):
+            self._gwptraj, log = result
+            self.window().data = self._gwptraj[1]
+            # add contents of gwptraj.log to text view
+            if log is not None:
+                self.window().text.appendPlainText(log)
+            self.gwptrajPlot()
+
+        self.runInThread(compute, plot)
+
+    def findNgwp(self, cwd:Path) -> int:
+        '''
+        Returns ngwp, the number of GWPs, from the input file in cwd (kept
+        until the input file changes). If input is not found or ngwp is not in
+        it, asks the user for the value.
+        '''
         try:
-            with open(self.window().dir.cwd/'input', mode='r',
-                      encoding='utf-8') as f:
+            stamp = DirectoryCache.fileStamp(cwd/'input')
+            if self._ngwp is not None and self._ngwp[0] == stamp:
+                return self._ngwp[1]
+            with open(cwd/'input', mode='r', encoding='utf-8') as f:
                 txt = f.read()
                 # IndexError raised when ngwp not found
                 ngwp = int(re.findall(r'ngwp\s*?=\s*?(\d+)', txt)[0])
+            self._ngwp = (stamp, ngwp)
         except (FileNotFoundError, IndexError):
             ngwp, ok = QtWidgets.QInputDialog.getInt(
                 parent=self.window(),
@@ -196,34 +309,66 @@ class AnalysisDirectDynamics(AnalysisTab):
             )
             if not ok:
                 raise ValueError('User cancelled operation') from None
+        return ngwp
+
+    @staticmethod
+    def trajectoryTensor(data:np.ndarray, ngwp:int) -> np.ndarray:
+        '''
+        Given the (times, columns) array of a trajectory file (see gwptraj),
+        returns a (times, 2, ngwp, nmode) view of it without the time column,
+        where [:, 0] are the GWP centres and [:, 1] their momenta. Raises
+        ValueError if the number of columns doesn't fit ngwp.
+        '''
+        ncol = data.shape[1] - 1
+        # the number of columns is 2*number of gaussians*number of modes.
+        # the 2 is from the momenta being written after the gwp centers, and
+        # columns are written for each gaussian with ascending mode
+        if ncol == 0 or ncol % (2*ngwp) != 0:
+            raise ValueError(f'Trajectory file has {ncol} columns, which is not '
+                             f'a multiple of 2*ngwp = {2*ngwp}')
+        return data[:, 1:].reshape(len(data), 2, ngwp, ncol//(2*ngwp))
+
+    def gwptrajPlot(self):
+        '''
+        Plots the trajectories read by gwptraj for the task and mode chosen,
+        as one MultiLineItem with a colour for each GWP.
+        '''
+        times, tensor = self._gwptraj[1][:, 0], self._gwptraj[2]
+        ngwp, nmode = tensor.shape[2:]
+        task = self.gwptraj_task.currentIndex()
+        if self.gwptraj_allmodes.isChecked():
+            modes = slice(None)
+            mode_label = 'all modes'
+        else:
+            mode = self.gwptraj_mode.value()
+            if mode > nmode:
+                raise ValueError(f'Mode {mode} is larger than number of modes {nmode}')
+            modes = slice(mode-1, mode)
+            mode_label = f'mode {mode}'
+        # (lines, times) arrays, one line for each gwp and mode
+        centres = tensor[:, 0, :, modes].reshape(len(times), -1).T
+        momenta = tensor[:, 1, :, modes].reshape(len(times), -1).T
+        n_pens = min(ngwp, self.GWP_PENS)
+        pens = [colr(i, n_pens, maxValue=200) for i in range(n_pens)]
+        # colour by gwp, lines are in the order of the columns (gwp, mode)
+        gwp = np.arange(centres.shape[0]) // (centres.shape[0]//ngwp)
+        pen_index = gwp*n_pens//ngwp
 
-        mode = self.gwptraj_mode.value()
-        # the number of columns is 2*number of gaussians*number of modes. the
-        # 2 is from the momenta being written after the gwp centers
-        ncol = self.window().data.shape[1]
-        nmode = (ncol-1)//(2*ngwp)
-        if mode > nmode:
-            raise ValueError(f'Mode {mode} is larger than number of modes {nmode}')
-        # start plotting
         self.window().plot.reset(switch_to_plot=True)
-        if self.gwptraj_task.currentIndex() == 0:
-            # task is plot centre coordinates, which make up the first half of
-            # the columns in trajectory file
-            offset = mode
-            self.window().plot.setLabels(title='GWP function centre coordinates',
-                                          bottom='Time (fs)', left='GWP Center (au)')
+        if task == 0:
+            self.window().plot.setLabels(title=f'GWP function centre coordinates, {mode_label}',
+                                         bottom='Time (fs)', left='GWP Center (au)')
+            item = MultiLineItem(times, centres, pens, pen_index)
+        elif task == 1:
+            self.window().plot.setLabels(title=f'GWP function momentum, {mode_label}',
+                                         bottom='Time (fs)', left='GWP Momentum (au)')
+            item = MultiLineItem(times, momenta, pens, pen_index)
         else:
-            # task is plot momentum, which make up the second half of the
-            # columns in trajectory file
-            offset = (ncol-1)//2 + mode
-            self.window().plot.setLabels(title='GWP function momentum',
-                                          bottom='Time (fs)', left='GWP Momentum (au)')
-        # plot line for each gaussian. columns are written for each gaussian
-        # with ascending mode. to pick the gaussians for one mode we skip
-        # nmode columns each time until we get to ngwp lines
-        for i, col in enumerate(range(offset, offset+ngwp*nmode, nmode)):
-            self.window().plot.plot(self.window().data[:, 0], self.window().data[:, col],
-                                     pen=colr(i, ngwp, maxValue=200))
+            self.window().plot.setLabels(title=f'GWP function phase portraits, {mode_label}',
+                                         bottom='GWP Center (au)',
+                                         left='GWP Momentum (au)')
+            item = MultiLineItem(centres, momenta, pens, pen_index)
+        self.window().plot.addItem(item)
 
     def ddpesgeo(self):
         '''
@@ -231,146 +376,356 @@ class AnalysisDirectDynamics(AnalysisTab):
         a certain user-defined interval or where energies between two states
         match within a tolerance.
 
-        The output in text view is in the form
-
-        STATE X [& Y] {
+        The matches are shown in the table tab (see ResultTable), one row for
+        each state (or pair of states) an entry matches, in the form
 
-            ID: 12345
-            ----------------------------------------
-                     eng_X |           eng_Y |   ... (relevant states highlighted)
-            1.23456789e+01 |  1.23456789e+01 |   ...
-            ----------------------------------------
-            Atom 1       x y z
-            Atom 2       x y z
-            ...
+        States |    ID |          eng_1 |          eng_2 | ...
+             1 | 12345 | 1.23456789e+01 | 1.23456789e+01 | ...
+        ... repeat for all matches and states
 
-            ... repeat for all matches
-
-        }
-        ... repeat for more states
+        with the energies of the relevant states in bold. Selecting a row
+        shows the geometry of the entry below the table. Rows are only
+        formatted when they are scrolled to, and the table can be exported
+        to a file by right-clicking it.
         '''
         filepath = self.window().dir.cwd/'database.sql'
-        con = sqlite3.connect(f'file:{filepath}?mode=ro', uri=True,
-                              timeout=self.window().timeout.value())
-        cur = con.cursor()
-        version = cur.execute('SELECT dbversion FROM versions;').fetchone()[0]
-        match version:
-            case 4:
-                self._ddpesgeoV4(con, cur)
-            case x:
-                raise NotImplementedError('ddpesgeo not implemented for DB '
-                                         f'version {x}')
-
-    def _ddpesgeoV4(self, con:sqlite3.Connection, cur:sqlite3.Cursor):
+        timeout = self.window().timeout.value()
+        table = 'pes' if self.ddpesgeo_type.currentIndex() == 0 else 'apes'
+        if self.ddpesgeo_task[0].isChecked():
+            # task is find energies between interval
+            criterion = ('interval', self.ddpesgeo_emin.value(),
+                         self.ddpesgeo_emax.value())
+        else:
+            # task is find matching energies
+            criterion = ('match', self.ddpesgeo_state.value(),
+                         self.ddpesgeo_tol.value())
+
+        def compute():
+            con = sqlite3.connect(f'file:{filepath}?mode=ro', uri=True,
+                                  timeout=timeout)
+            try:
+                cur = con.cursor()
+                version = cur.execute('SELECT dbversion FROM versions;').fetchone()[0]
+                match version:
+                    case 4:
+                        return self._ddpesgeoV4(cur, table, criterion)
+                    case x:
+                        raise NotImplementedError('ddpesgeo not implemented for DB '
+                                                  f'version {x}')
+            finally:
+                con.close()
+
+        self.runInThread(compute, lambda result: self._writePesGeo(*result))
+
+    def _ddpesgeoV4(self, cur:sqlite3.Cursor, table:str, criterion:tuple) -> tuple:
         '''
         ddpesgeo implemented for DB version 4. See docstring for ddpesgeo for
-        more details.
+        more details. table is 'pes' or 'apes', and criterion is ('interval',
+        emin, emax) or ('match', state, tol).
+
+        The joined table is read once, FETCH_ROWS rows at a time, into arrays
+        of the energies and geometries, and the criterion is checked for every
+        state at once. The query only returns the rows that match for some
+        state. Returns (description, col_names, atom_names, state_cols,
+        pesgeo), where pesgeo is a dict of the form {states (tuple): (ids,
+        energies, geos)}, with ids a (matches,) array, energies a (matches,
+        len(col_names)) array and geos a (matches, atoms, 3) array, and
+        state_cols are the indices in col_names of the energy of each state.
         '''
+        quote = lambda name: '"' + name.replace('"', '""') + '"'
         # the number of electronic states
         nroot = cur.execute('SELECT Nroot FROM refdb;').fetchone()[0]
-        # dictionary of the form {state(s) (frozenset): [list of entries]}
-        # where an entry is also a dict of form {id (int), energy (tuple),
-        # geo (np.ndarray where columns are x y z)}
-        pesgeo = {}
-        # since we join pes/apes table to geo but want to seperate the two
-        # after sql query, need to find the number of columns in geo table (not
-        # counting id so -1)
-        geo_length = cur.execute(
-            'SELECT COUNT(*) FROM pragma_table_info("geo");'
-        ).fetchall()[0][0] - 1
         # get atom names in refdbrefgeom
         atom_names = [col[0] for col in cur.execute(
             'SELECT name FROM refdbrefgeom;'
         ).fetchall()]
+        # column names in the pes/apes table, but don't include id
+        col_names = [col[0] for col in cur.execute(
+            'SELECT name FROM pragma_table_info(?);', (table,)
+        ).fetchall() if col[0] != 'id']
+        # since we join pes/apes table to geo but want to seperate the two
+        # after sql query, need to find the number of columns in geo table (not
+        # counting id so -1)
+        geo_length = cur.execute(
+            'SELECT COUNT(*) FROM pragma_table_info(?);', ('geo',)
+        ).fetchone()[0] - 1
 
-        if self.ddpesgeo_type.currentIndex() == 0:
-            table = 'pes'
-            # lambda mapping states to column names
-            state_name = lambda s: f'eng_{s}_{s}'
-        else:
-            table = 'apes'
-            state_name = lambda s: f'eng_{s}'
+        state_names = self._stateNames(table, nroot, col_names)
+        state_cols = np.array([col_names.index(name) for name in state_names])
 
-        if self.ddpesgeo_task[0].isChecked():
-            # task is find energies between interval
-            emin = self.ddpesgeo_emin.value()
-            emax = self.ddpesgeo_emax.value()
+        task, *values = criterion
+        if task == 'interval':
+            emin, emax = values
             description = (f'Finding database entries in {table} where '
                            f'energies between {emin} and {emax}')
-            # retrieve matching id + energies
-            for s in range(1, nroot+1):
-                query = (f'SELECT * FROM {table} LEFT JOIN geo USING(id) '
-                         f'WHERE {state_name(s)} BETWEEN {emin} AND {emax};')
-                res = cur.execute(query).fetchall()
-                # add id, energies, geo. split geo into geo_length subarrays
-                # so there are 3 columns
-                pesgeo[frozenset({s})] = [{
-                    'id': entry[0], 'energies': entry[1:-geo_length],
-                    'geo': np.split(np.array(entry[-geo_length:]), geo_length//3)
-                } for entry in res]
+            where = ' OR '.join(f'{quote(name)} BETWEEN ? AND ?' for name in state_names)
+            params = [emin, emax]*nroot
+            def match(energies):
+                return (energies >= emin) & (energies <= emax)
         else:
-            # task is find matching energies
-            s1 = self.ddpesgeo_state.value()
-            tol = self.ddpesgeo_tol.value()
+            s1, tol = values
             description = (f'Finding database entries in {table} where '
                            f'energies match state {s1} (abs. tol. {tol})')
             if s1 > nroot:
                 raise ValueError(f'State {s1} cannot be greater than number of '
                                  f'states {nroot}')
-            for s2 in range(1, nroot+1):
-                if s2 == s1:
+            others = [name for name in state_names if name != state_names[s1-1]]
+            where = ' OR '.join(f'ABS({quote(name)} - {quote(state_names[s1-1])}) <= ?'
+                                for name in others) or '0'
+            params = [tol]*len(others)
+            def match(energies):
+                mask = np.abs(energies - energies[:, [s1-1]]) <= tol
+                mask[:, s1-1] = False
+                return mask
+
+        # the matching rows for each state, as lists of blocks
+        found = [([], [], []) for _ in range(nroot)]
+        cur.execute(f'SELECT * FROM {quote(table)} LEFT JOIN geo USING(id) '
+                    f'WHERE {where};', params)
+        while True:
+            self.checkCancelled()
+            rows = cur.fetchmany(self.FETCH_ROWS)
+            if not rows:
+                break
+            # (NULLs, eg. a missing geometry, become NaN)
+            block = np.array(rows, dtype=float)
+            ids = block[:, 0].astype(int)
+            energies = block[:, 1:1+len(col_names)]
+            geos = block[:, 1+len(col_names):].reshape(len(block), geo_length//3, 3)
+            mask = match(energies[:, state_cols])
+            for s in np.nonzero(mask.any(axis=0))[0]:
+                for arrays, arr in zip(found[s], (ids, energies, geos)):
+                    arrays.append(arr[mask[:, s]])
+
+        pesgeo = {}
+        for s, arrays in enumerate(found, start=1):
+            if task == 'match':
+                if s == s1:
                     continue
-                else:
-                    query = (f'SELECT * FROM {table} LEFT JOIN geo USING(id)'
-                             f'WHERE ABS({state_name(s2)} - {state_name(s1)}) <= {tol};')
-                res = cur.execute(query).fetchall()
-                # add id, energies, geo. split geo into geo_length subarrays
-                # so there are 3 columns
-                pesgeo[frozenset({s1, s2})] = [{
-                    'id': entry[0], 'energies': entry[1:-geo_length],
-                    'geo': np.split(np.array(entry[-geo_length:]), geo_length//3)
-                } for entry in res]
-
-        # format result and set text
-        self.window().text.clear()
-        # column names in the pes/apes table, but don't include id
+                states = (s1, s)
+            else:
+                states = (s,)
+            shapes = [(0,), (0, len(col_names)), (0, geo_length//3, 3)]
+            pesgeo[states] = tuple(np.concatenate(blocks) if blocks else np.empty(shape)
+                                   for blocks, shape in zip(arrays, shapes))
+        return description, col_names, atom_names, state_cols, pesgeo
+
+    @staticmethod
+    def _stateNames(table:str, nroot:int, col_names:list) -> list:
+        '''
+        Returns the names of the columns of the energy of each of the nroot
+        states in table ('pes' or 'apes') of a version 4 database, whose
+        columns are col_names. Raises ValueError if any are missing.
+        '''
+        if table == 'pes':
+            state_names = [f'eng_{s}_{s}' for s in range(1, nroot+1)]
+        else:
+            state_names = [f'eng_{s}' for s in range(1, nroot+1)]
+        missing = set(state_names) - set(col_names)
+        if missing:
+            raise ValueError(f'Columns {", ".join(sorted(missing))} not found in '
+                             f'table {table}')
+        return state_names
+
+    def _writePesGeo(self, description:str, col_names:list, atom_names:list,
+                     state_cols:np.ndarray, pesgeo:dict):
+        '''
+        Shows the result of ddpesgeo (see _ddpesgeoV4) in the table tab, as
+        the arrays found rather than formatting every match.
+        '''
+        groups = list(pesgeo.items())
+        sizes = [len(ids) for _, (ids, _, _) in groups]
+        n_cols = len(col_names)
+        if sum(sizes) == 0:
+            ids = np.empty(0, dtype=int)
+            energies = np.empty((0, n_cols))
+            geos = np.empty((0, len(atom_names), 3))
+        else:
+            ids, energies, geos = (np.concatenate(arrays) for arrays in
+                                   zip(*(arrays for _, arrays in groups)))
+        labels = np.repeat([' & '.join(map(str, states)) for states, _ in groups],
+                           sizes)
+        # the energies of the relevant states of each row are in bold
+        bold = np.zeros((len(ids), n_cols + 2), dtype=bool)
+        start = 0
+        for (states, _), size in zip(groups, sizes):
+            bold[start:start+size, 2 + state_cols[np.array(states) - 1]] = True
+            start += size
+
+        def detail(row:int) -> str:
+            lines = [f'ID: {ids[row]}  (states {labels[row]})']
+            lines += [f'{name:>3} ' + ' '.join(f'{x: .8e}' for x in xyz)
+                      for name, xyz in zip(atom_names, geos[row])]
+            return '\n'.join(lines)
+
+        model = ResultTableModel(
+            ['States', 'ID'] + col_names, [labels, ids] + list(energies.T),
+            bold=bold, detail=detail,
+            extra_header=[f'{name} {c}' for name in atom_names for c in 'xyz'],
+            extra=geos.reshape(len(geos), -1)
+        )
+        self.window().table.setModel(model, f'{description} ({len(ids)} matches)')
+        self.window().tab_widget.setCurrentIndex(2)
+
+    def seams(self):
+        '''
+        Finds the entries in the pes or apes table of the database where two
+        states are closest in energy (near-degeneracies, eg. near a seam of
+        intersection between the states). The smallest gap between any two
+        states of each entry is found from the differences of its sorted
+        energies (see minimumGaps), so every pair of states is compared in
+        one pass over the energies.
+
+        The entries are ranked by gap and shown a page at a time in the text
+        view with their geometries (see seamsPage), and a histogram of the
+        gaps is plotted. The ranking is kept until the database changes, so
+        showing another page doesn't read the energies again.
+        '''
+        filepath = self.window().dir.cwd/'database.sql'
+        timeout = self.window().timeout.value()
+        table = 'pes' if self.seam_type.currentIndex() == 0 else 'apes'
+        bins = self.seam_bins.value()
+        cached = self._seams
+
+        def compute():
+            key = (DirectoryCache.fileStamp(filepath), table)
+            if cached is not None and cached[0] == key:
+                return cached
+            con = sqlite3.connect(f'file:{filepath}?mode=ro', uri=True,
+                                  timeout=timeout)
+            try:
+                cur = con.cursor()
+                version = cur.execute('SELECT dbversion FROM versions;').fetchone()[0]
+                if version != 4:
+                    raise NotImplementedError('Finding near-degeneracies not '
+                                              f'implemented for DB version {version}')
+                atom_names = [col[0] for col in cur.execute(
+                    'SELECT name FROM refdbrefgeom;'
+                ).fetchall()]
+                ids, energies = self._readEnergiesV4(cur, table)
+            finally:
+                con.close()
+            gaps, pairs = self.minimumGaps(energies)
+            # smallest gap first, leaving out entries without two energies
+            order = np.argsort(gaps, kind='stable')
+            order = order[np.isfinite(gaps[order])]
+            ranked = np.empty(len(order), dtype=[
+                ('id', 'i8'), ('gap', 'f8'), ('state_1', 'i8'), ('state_2', 'i8'),
+                ('energy_1', 'f8'), ('energy_2', 'f8')
+            ])
+            ranked['id'] = ids[order]
+            ranked['gap'] = gaps[order]
+            ranked['state_1'], ranked['state_2'] = pairs[order].T + 1
+            ranked['energy_1'] = energies[order, pairs[order, 0]]
+            ranked['energy_2'] = energies[order, pairs[order, 1]]
+            return key, filepath, atom_names, ranked
+
+        def plot(result):
+            self._seams = result
+            self.window().data = ranked = result[3]
+            # histogram of the gaps
+            counts, edges = np.histogram(ranked['gap'], bins=bins)
+            self.window().plot.reset()
+            self.window().plot.setLabels(title='Smallest energy gap between states',
+                                         bottom='Gap', left='Entries')
+            self.window().plot.plot(edges, counts, stepMode='center', fillLevel=0,
+                                    brush=(255, 0, 0, 80), pen='r')
+            self.seamsPage()
+
+        self.runInThread(compute, plot)
+
+    def _readEnergiesV4(self, cur:sqlite3.Cursor, table:str) -> tuple:
+        '''
+        Reads the energy of every state of every entry in table ('pes' or
+        'apes') of a version 4 database, FETCH_ROWS rows at a time. Returns
+        the (entries,) array of ids and the (entries, nroot) array of
+        energies (NaN if NULL).
+        '''
+        quote = lambda name: '"' + name.replace('"', '""') + '"'
+        nroot = cur.execute('SELECT Nroot FROM refdb;').fetchone()[0]
         col_names = [col[0] for col in cur.execute(
-            f'SELECT name FROM pragma_table_info("{table}");'
-        ).fetchall() if col[0] != 'id']
-        # html to add to self.window().text
-        html = f'<pre>{description}</pre><br/>'
-        for states, entries in pesgeo.items():
-            html += (f'<pre>STATE <b>{" & ".join(str(state) for state in states)}</b> '
-                     '{</pre><br/>')
-            for id_, energies, geo in [entry.values() for entry in entries]:
-                header = []
-                values = []
-                # format col_names and energies into a table
-                # if relevant state, make energy header and value bold
-                for i, name in enumerate(col_names):
-                    if name in [state_name(state) for state in states]:
-                        header.append(f'<b>{name:>15}</b>')
-                        values.append('<b>' + '{: .8e}'.format(energies[i]) + '</b>')
-                    else:
-                        header.append('{:>15}'.format(name))
-                        values.append('{: .8e}'.format(energies[i]))
-                html += (f'<pre>    ID: {id_}</pre>'
-                         f'<pre>    {"-"*16*len(header)}</pre>'
-                         f'<pre>    {" ".join(header)}</pre>'
-                         f'<pre>    {" ".join(values)}</pre>'
-                         f'<pre>    {"-"*16*len(header)}</pre>')
-                # format the geometries
-                for atom_name, xyz in zip(atom_names, geo):
-                    # format array, remove brackets at start and end
-                    xyz = np.array2string(xyz, formatter={
-                        'float': lambda x: '{: .8e}'.format(x)
-                    })[1:-1]
-                    html += f'<pre>    {atom_name:>3} {xyz}</pre>'
-                html += '<br/>'
-            html += '<pre>}</pre><br/>'
-        con.close()
+            'SELECT name FROM pragma_table_info(?);', (table,)
+        ).fetchall()]
+        state_names = self._stateNames(table, nroot, col_names)
+        n_rows = cur.execute(f'SELECT COUNT(*) FROM {quote(table)};').fetchone()[0]
+        block = np.empty((n_rows, nroot + 1))
+        cur.execute(f'SELECT id, {", ".join(map(quote, state_names))} '
+                    f'FROM {quote(table)};')
+        start = 0
+        while True:
+            self.checkCancelled()
+            rows = cur.fetchmany(self.FETCH_ROWS)
+            if not rows:
+                break
+            # (in case rows were added since counting)
+            if start + len(rows) > len(block):
+                block.resize((start + len(rows), nroot + 1), refcheck=False)
+            block[start:start+len(rows)] = rows
+            start += len(rows)
+        return block[:start, 0].astype(int), block[:start, 1:]
+
+    @staticmethod
+    def minimumGaps(energies:np.ndarray) -> tuple:
+        '''
+        Given an (entries, states) array of energies, returns the smallest
+        difference in energy between any two states of each entry, and the
+        (entries, 2) array of the indices of the two states, lower energy
+        first. Since the closest two states are next to each other once the
+        energies are sorted, this is O(entries*states) after the sort. The
+        gap is infinite for entries with fewer than two energies that aren't
+        NaN.
+        '''
+        if energies.shape[1] < 2:
+            raise ValueError('At least two states are needed to find energy gaps')
+        # (NaNs are sorted last)
+        order = np.argsort(energies, axis=1)
+        diffs = np.diff(np.take_along_axis(energies, order, axis=1), axis=1)
+        diffs[np.isnan(diffs)] = np.inf
+        rows = np.arange(len(energies))
+        lower = np.argmin(diffs, axis=1)
+        pairs = np.column_stack([order[rows, lower], order[rows, lower + 1]])
+        return diffs[rows, lower], pairs
+
+    def seamsPage(self):
+        '''
+        Shows the page chosen of the near-degeneracies found by seams in the
+        text view, with the geometry of each entry read from the database.
+        '''
+        _, filepath, atom_names, ranked = self._seams
+        rows = self.seam_rows.value()
+        n_pages = max(-(-len(ranked)//rows), 1)
+        page = min(self.seam_page.value(), n_pages)
+        start = (page - 1)*rows
+        entries = ranked[start:start+rows]
+        # geometries of the entries on the page, by id
+        geos = {}
+        con = sqlite3.connect(f'file:{filepath}?mode=ro', uri=True,
+                              timeout=self.window().timeout.value())
+        try:
+            cur = con.cursor()
+            ids = entries['id'].tolist()
+            # (sqlite limits the number of parameters of a query)
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i+500]
+                for row in cur.execute(f'SELECT * FROM geo WHERE id IN '
+                                       f'({", ".join("?"*len(chunk))});', chunk):
+                    geos[row[0]] = row[1:]
+        finally:
+            con.close()
+        header = ['Rank', 'ID', 'States', 'Gap', 'Energy 1', 'Energy 2'] \
+                 + [f'{name} {c}' for name in atom_names for c in 'xyz']
+        table = [[start + i + 1, int(entry['id']),
+                  f'{entry["state_1"]} & {entry["state_2"]}', float(entry['gap']),
+                  float(entry['energy_1']), float(entry['energy_2'])]
+                 + list(geos.get(int(entry['id']), ()))
+                 for i, entry in enumerate(entries)]
         self.window().tab_widget.setCurrentIndex(0)
-        self.window().text.appendHtml(html)
+        self.window().text.writeTable(
+            table, header=header,
+            pre=f'Entries with the smallest energy gap between any two states '
+                f'({len(ranked)} entries)',
+            post=f'Page {page} of {n_pages}'
+        )
 
     def checkdb(self):
         '''
@@ -389,7 +744,10 @@ class AnalysisDirectDynamics(AnalysisTab):
             clean_options.append('-c')
         # switch to text view to see output
         self.window().tab_widget.setCurrentIndex(0)
-        self.runCmd(['checkdb'] + clean_options)
+        cwd = self.window().dir.cwd
+        # nothing to plot, output is shown in text view by runCmd
+        self.runInThread(lambda: self.runCmd(['checkdb'] + clean_options, cwd=cwd),
+                         lambda _: None)
 
     def querydb(self):
         '''
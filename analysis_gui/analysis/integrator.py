@@ -8,8 +8,11 @@ Integrator' tab of the analysis GUI.
 
 from pathlib import Path
 import re
+import numpy as np
 from pyqtgraph import BarGraphItem
 from ..ui.analysis_tab import AnalysisTab
+from ..ui.file_follower import FileFollower
+from ..ui.schemas import SCHEMAS
 
 class AnalysisIntegrator(AnalysisTab):
     '''
@@ -80,36 +83,32 @@ class AnalysisIntegrator(AnalysisTab):
         splits = re.split(r'(?<=Clock)\n|\n(?=Total)', txt, flags=re.IGNORECASE)
         if len(splits) != 3:
             raise ValueError('Invalid timing file')
-        pre, txt, post = splits
-
-        arr = []
-        for line in txt.split('\n'):
-            # should find one name and five floats per line (name, a, b, c, d,
-            # e). after splitting by whitespace, floats should take up the last
-            # 5 entries, and the name take up the rest
-            row = re.findall(r'\S+', line)
-            if len(row) >= 5:
-                name = ' '.join(row[:-5])
-                floats = row[-5:]
-                # floats are still strings, need to convert. the last entry is
-                # the line itself, which is already formatted in a nice way.
-                # this saves manually formatting the data
-                arr.append(tuple([name] + list(map(float, floats)) + [line]))
-        if len(arr) == 0:
+        pre, _, post = splits
+
+        # should find one name and five numbers per line (name, a, b, c, d,
+        # e). the line itself is also kept, which is already formatted in a
+        # nice way. this saves manually formatting the data
+        try:
+            arr = self.readCached(filepath, SCHEMAS['timing'].read,
+                                  ('schema', 'timing'))
+        except ValueError:
             # nothing found?
-            raise ValueError('Invalid timing file')
+            raise ValueError('Invalid timing file') from None
 
-        # sort by column chosen by user
+        # sort by column chosen by user (stable, so that equal values stay in
+        # file order)
+        fields = ['name', 'calls', 'cpu_per_call', 'cpu', 'cpu_percent', 'clock']
         if self.timing_sort.currentIndex() == 0:
             # sort by name
-            arr.sort(key=lambda x: x[0])
+            order = np.argsort(arr['name'], kind='stable')
         else:
             # sort by number (largest first)
-            arr.sort(key=lambda x: -x[self.timing_sort.currentIndex()])
-        self.window().data = arr
+            order = np.argsort(-arr[fields[self.timing_sort.currentIndex()]],
+                               kind='stable')
+        self.window().data = arr[order]
 
         # display sorted text
-        txt = "\n".join([line[-1] for line in self.window().data])
+        txt = "\n".join(self.window().data['line'])
         self.window().text.setPlainText(f'{pre}\n{txt}\n\n{post}')
         self.window().plot.reset()
 
@@ -119,12 +118,12 @@ class AnalysisIntegrator(AnalysisTab):
         # do a normal vertical one as pyqtgraph can't rotate tick names (yet)
         if self.timing_sort.currentIndex() == 0:
             # plot cpu if 'name' is selected (names don't have values)
-            values = [row[3] for row in self.window().data]
+            values = self.window().data['cpu']
             self.window().plot.setLabels(bottom='CPU')
         else:
-            values = [row[self.timing_sort.currentIndex()] for row in self.window().data]
+            values = self.window().data[fields[self.timing_sort.currentIndex()]]
             self.window().plot.setLabels(bottom=self.timing_sort.currentText())
-        names = [row[0] for row in self.window().data]
+        names = self.window().data['name'].tolist()
         positions = list(range(1, len(values)+1))
         bar = BarGraphItem(x0=0, y=positions, height=0.6, width=values)
         self.window().plot.addItem(bar)
@@ -155,24 +154,23 @@ class AnalysisIntegrator(AnalysisTab):
         # assemble data matrix
         with open(filepath, mode='r', encoding='utf-8') as f:
             txt = f.read()
-            self.window().text.setPlainText(txt)
-            # for readFloats to work the date column in the file needs to be
-            # removed. match any dates and replace them with nothing
-            date_regex = r'\w{3}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2}'
-            lines = re.sub(date_regex, '', txt).split('\n')
-            try:
-                self.window().data = self.readFloats(lines, 5, ignore_regex=r'^#')
-            except ValueError:
-                raise ValueError('Invalid speed file') from None
+        self.window().text.setPlainText(txt)
+        try:
+            self.window().data = self.readCached(filepath, SCHEMAS['speed'].read,
+                                                 ('schema', 'speed'))
+        except ValueError:
+            raise ValueError('Invalid speed file') from None
 
         # start plotting
         self.window().plot.reset(switch_to_plot=True)
         self.window().plot.setLabels(title='Speed file',
                                      bottom='Propagation time (fs)', left='Time (s)')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 1],
+        self.window().plot.plot(self.window().data['time'], self.window().data['cpu'],
                                 name='CPU time', pen='r')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 3],
+        self.window().plot.plot(self.window().data['time'], self.window().data['real'],
                                 name='Real time', pen='b')
+        self.followSchema(filepath, SCHEMAS['speed'], 'time', ['cpu', 'real'],
+                          FileFollower.lineEnd(txt))
 
     def rdupdate(self):
         '''
@@ -195,24 +193,29 @@ class AnalysisIntegrator(AnalysisTab):
         filepath = self.window().dir.cwd/'update'
         # assemble data matrix
         with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().text.setPlainText(f.read())
-            f.seek(0)
-            try:
-                self.window().data = self.readFloats(f, 5, ignore_regex=r'^#')
-            except ValueError:
-                raise ValueError('Invalid update file') from None
+            txt = f.read()
+        self.window().text.setPlainText(txt)
+        try:
+            self.window().data = self.readCached(filepath, SCHEMAS['update'].read,
+                                                 ('schema', 'update'))
+        except ValueError:
+            raise ValueError('Invalid update file') from None
 
         # start plotting, depending on options
         self.window().plot.reset(switch_to_plot=True)
         if self.update_task.currentIndex() == 0:
             self.window().plot.setLabels(title='Update file errors',
                                          bottom='Time (fs)', left='Error')
-            self.window().plot.plot(self.window().data[:, 4], self.window().data[:, 2],
+            self.window().plot.plot(self.window().data['time'], self.window().data['error_a'],
                                     name='Error of A-vector', pen='r')
-            self.window().plot.plot(self.window().data[:, 4], self.window().data[:, 3],
+            self.window().plot.plot(self.window().data['time'], self.window().data['error_spf'],
                                     name='Error of SPFs', pen='b')
+            curves = ['error_a', 'error_spf']
         else:
             self.window().plot.setLabels(title='Update file step size',
                                          bottom='Time (fs)', left='Step size (fs)')
-            self.window().plot.plot(self.window().data[:, 4], self.window().data[:, 1],
+            self.window().plot.plot(self.window().data['time'], self.window().data['step_size'],
                                     name='Step size', pen='r')
+            curves = ['step_size']
+        self.followSchema(filepath, SCHEMAS['update'], 'time', curves,
+                          FileFollower.lineEnd(txt))
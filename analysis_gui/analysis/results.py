@@ -9,6 +9,8 @@ Results' tab of the analysis GUI.
 from pathlib import Path
 from PyQt5 import QtCore
 from ..ui.analysis_tab import AnalysisTab
+from ..ui.file_follower import FileFollower
+from ..ui.schemas import SCHEMAS
 
 class AnalysisResults(AnalysisTab):
     '''
@@ -72,23 +74,26 @@ class AnalysisResults(AnalysisTab):
         filepath = self.window().dir.cwd/'auto'
         # assemble data matrix
         with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().text.setPlainText(f.read())
-            f.seek(0)
-            try:
-                self.window().data = self.readFloats(f, 4, ignore_regex=r'^#')
-            except ValueError:
-                raise ValueError('Invalid auto file') from None
+            txt = f.read()
+        self.window().text.setPlainText(txt)
+        try:
+            self.window().data = self.readCached(filepath, SCHEMAS['auto'].read,
+                                                 ('schema', 'auto'))
+        except ValueError:
+            raise ValueError('Invalid auto file') from None
 
         # start plotting
         self.window().plot.reset(switch_to_plot=True)
         self.window().plot.setLabels(title='Autocorrelation function',
                                      bottom='Time (fs)', left='C(t)')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 1],
+        self.window().plot.plot(self.window().data['time'], self.window().data['re'],
                                 name='Real autocorrelation', pen='r')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 2],
+        self.window().plot.plot(self.window().data['time'], self.window().data['im'],
                                 name='Imag. autocorrelation', pen='b')
-        self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 3],
+        self.window().plot.plot(self.window().data['time'], self.window().data['abs'],
                                 name='Abs. autocorrelation', pen='g')
+        self.followSchema(filepath, SCHEMAS['auto'], 'time', ['re', 'im', 'abs'],
+                          FileFollower.lineEnd(txt))
 
     def autospec(self):
         '''
@@ -123,23 +128,31 @@ class AnalysisResults(AnalysisTab):
         # choose prefactor
         match self.autocol_prefac.currentIndex():
             case 0:
-                self.runCmd(['autospec', '-FT'] + autocol_options)
+                args = ['autospec', '-FT'] + autocol_options
             case 1:
-                self.runCmd(['autospec', '-EP'] + autocol_options)
-
-        filepath = self.window().dir.cwd/'spectrum.pl'
-        # assemble data matrix
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().data = self.readFloats(f, 4, ignore_regex=r'^#')
-
-        # start plotting
-        self.window().plot.reset(switch_to_plot=True)
-        self.window().plot.setLabels(title='Autocorrelation spectrum',
-                                      bottom=f'Energy ({self.autocol_unit.currentText()})',
-                                      left='Spectrum')
-        self.window().plot.plot(self.window().data[:, 0],
-                                 self.window().data[:, self.autocol_func.currentIndex()%3+1],
-                                 name='Autocorrelation spectrum', pen='r')
+                args = ['autospec', '-EP'] + autocol_options
+        unit = self.autocol_unit.currentText()
+        column = self.autocol_func.currentIndex()%3 + 1
+        cwd = self.window().dir.cwd
+
+        def compute():
+            self.runCmd(args, cwd=cwd, inputs=['auto'], outputs=['spectrum.pl'])
+            filepath = cwd/'spectrum.pl'
+            # assemble data matrix
+            return self.readFloatsCached(filepath, 4, ignore_regex=r'^#')
+
+        def plot(data):
+            self.window().data = data
+            # start plotting
+            self.window().plot.reset(switch_to_plot=True)
+            self.window().plot.setLabels(title='Autocorrelation spectrum',
+                                         bottom=f'Energy ({unit})',
+                                         left='Spectrum')
+            self.window().plot.plot(self.window().data[:, 0],
+                                    self.window().data[:, column],
+                                    name='Autocorrelation spectrum', pen='r')
+
+        self.runInThread(compute, plot)
 
     def rdeigval(self):
         '''
@@ -161,24 +174,27 @@ class AnalysisResults(AnalysisTab):
         # assemble data matrix
         with open(filepath, mode='r', encoding='utf-8') as f:
             self.window().text.setPlainText(f.read())
-            f.seek(0)
-            try:
-                self.window().data = self.readFloats(f, 6)
-            except ValueError:
-                raise ValueError('Invalid eigval file') from None
+        try:
+            self.window().data = self.readCached(filepath, SCHEMAS['eigval'].read,
+                                                 ('schema', 'eigval'))
+        except ValueError:
+            raise ValueError('Invalid eigval file') from None
 
         # start plotting
         self.window().plot.reset(switch_to_plot=True)
         self.window().plot.setLabels(title='Eigval file', bottom='Eigenvalue (eV)')
         if self.eigval_task.currentIndex() == 0:
             self.window().plot.setLabels(left='Intensity')
-            self.window().plot.plot(self.window().data[:, 1], self.window().data[:, 2],
+            self.window().plot.plot(self.window().data['eigenvalue'],
+                                    self.window().data['intensity'],
                                     name='Intensities', pen='r')
         elif self.eigval_task.currentIndex() == 1:
             self.window().plot.setLabels(left='Eigenerror (eV)')
-            self.window().plot.plot(self.window().data[:, 1], self.window().data[:, 3],
+            self.window().plot.plot(self.window().data['eigenvalue'],
+                                    self.window().data['error'],
                                     name='Eigenerrors', pen='r')
         else:
             self.window().plot.setLabels(left='Excitations (cm\u207B\u00B9)')
-            self.window().plot.plot(self.window().data[:, 1], self.window().data[:, 5],
+            self.window().plot.plot(self.window().data['eigenvalue'],
+                                    self.window().data['excitation'],
                                     name='Excitation', pen='r')
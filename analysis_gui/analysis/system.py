@@ -6,23 +6,44 @@ Consists of the single class that provides functionality for the 'Analyse
 System' tab of the analysis GUI.
 '''
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import re
+import os
+import shutil
+import tempfile
+import threading
 import numpy as np
 from PyQt5 import QtWidgets, QtCore
 from pyqtgraph import intColor as colr
 from ..ui.analysis_tab import AnalysisTab
+from ..ui.analysis_worker import AnalysisCancelled
+from ..ui.contours import ContourCache
+from ..ui.directory_cache import DirectoryCache
+from ..ui.frame_file import FrameFile
+from ..ui.schemas import SCHEMAS
 
 class AnalysisSystem(AnalysisTab):
     '''
     Promoted widget that defines functionality for the 'Analyse System' tab of
     the analysis GUI.
     '''
+    # number of frames of the 1D density to read ahead while it is playing
+    READ_AHEAD = 8
+    # size in bytes up to which the 1D density file is read all at once
+    DEN1D_WHOLE_SIZE = 16*1024**2
+
     def __init__(self):
         '''
         Constructor method. Loads the UI file.
         '''
         super().__init__(Path(__file__).parent/'system.ui')
+        # the image and contour lines of a 2D plot drawn as a heatmap, and the
+        # contours of each frame computed in the background, see plotField
+        self._image = None
+        self._contours = None
+        self._contour_cache = None
+        # the sweep coordinate and its values, see showpesSweep
+        self._sweep = None
 
     def activate(self):
         '''
@@ -66,6 +87,11 @@ class AnalysisSystem(AnalysisTab):
             self.showpes_coord_box.setFixedHeight(
                 2 + min(self.showpes_coord.height(), 130)
             )
+            # the coordinates that can be swept over
+            dof = self.showpes_sweep_dof.currentText()
+            self.showpes_sweep_dof.clear()
+            self.showpes_sweep_dof.addItems(self.showpes_coord.mode_labels or [])
+            self.showpes_sweep_dof.setCurrentIndex(max(self.showpes_sweep_dof.findText(dof), 0))
 
     def showd1d(self):
         '''
@@ -89,52 +115,115 @@ class AnalysisSystem(AnalysisTab):
         t.1 ... t.m are expected to increase linearly upwards.
 
         Plots the density over position with a scroll bar to scroll through
-        time.
+        time. Small files (or ones already parsed into the directory cache)
+        are read all at once into a (times, points, 4) array, see den1dFrames.
+        Larger files are not: each time interval is read when it is shown, see
+        FrameFile.
         '''
         den1d_options = [
             'f' + str(self.den1d_dof.value()),
             's' + str(self.den1d_state.value())
         ]
-        self.runCmd(['showd1d', '-T', '-w'] + den1d_options)
-
+        cwd = self.window().dir.cwd
         # find filename of command output
         if self.den1d_state.value() == 1:
-            filepath = self.window().dir.cwd/f'den1d_{den1d_options[0]}'
+            filepath = cwd/f'den1d_{den1d_options[0]}'
         else:
-            filepath = self.window().dir.cwd/f'den1d_{"_".join(den1d_options)}'
-        # assemble data matrix
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().data = self.readFloats(f, 4, ignore_regex=r'^plot|^set')
-            # split the matrix into chunks depending on its time column
-            n_interval = np.unique(self.window().data[:, 1]).size
-            self.window().data = np.split(self.window().data, n_interval)
-
-        # add contents of showd1d.log to text view
-        filepath = self.window().dir.cwd/'showd1d.log'
-        if filepath.is_file():
-            with open(filepath, mode='r', encoding='utf-8') as f:
-                self.window().text.appendPlainText(f'{"-"*80}\n{f.read()}')
-
-        # adjust scrubber properties, connect to showd1dChangePlot slot
-        self.window().media.scrubber.setMaximum(len(self.window().data)-1)
-        self.window().media.scrubber.setSliderPosition(0)
-        try:
-            self.window().media.scrubber.valueChanged.disconnect()
-        except TypeError:
-            # happens if scrubber has no connections
-            pass
-        finally:
-            self.window().media.scrubber.valueChanged.connect(self.showd1dChangePlot)
-        # start plotting
-        self.window().plot.reset(switch_to_plot=True, animated=True)
-        self.window().plot.setLabels(title='1D density evolution',
-                                      bottom=f'DOF {den1d_options[0]} (au)',
-                                      left='Density',
-                                      top=f't={self.window().data[0][0][1]}')
-        self.window().plot.plot(self.window().data[0][:, 0], self.window().data[0][:, 2],
-                                 name='Re(phi)', pen='r')
-        self.window().plot.plot(self.window().data[0][:, 0], self.window().data[0][:, 3],
-                                 name='Im(phi)', pen='b')
+            filepath = cwd/f'den1d_{"_".join(den1d_options)}'
+
+        cache = self.directoryCache(cwd)
+
+        def compute():
+            self.runCmd(['showd1d', '-T', '-w'] + den1d_options, cwd=cwd,
+                        inputs=['dvr', 'gridpop'],
+                        outputs=[filepath.name, 'showd1d.log'])
+            whole = filepath.stat().st_size <= self.DEN1D_WHOLE_SIZE
+            data = self.readFloatsCached(filepath, 4, ignore_regex=r'^plot|^set',
+                                         chunked=True, cached_only=not whole)
+            # the last time interval may still be being written
+            frames = None if data is None else self.den1dFrames(data, partial=True)
+            # index the time intervals in the file, which are views of frames
+            # if it was read
+            data = FrameFile(filepath, key_column=1, grid_column=0,
+                             floats_per_line=4, ignore_regex=r'^plot|^set',
+                             cache=cache, frames=frames)
+            log = self.readLog(cwd/'showd1d.log')
+            return data, log
+
+        def plot(result):
+            if isinstance(self.window().data, FrameFile):
+                # stop reading ahead in the previous file
+                self.window().data.close()
+            self.window().data, log = result
+            # add contents of showd1d.log to text view
+            if log is not None:
+                self.window().text.appendPlainText(log)
+
+            # adjust scrubber properties, connect to showd1dChangePlot slot
+            self.window().media.scrubber.setMaximum(len(self.window().data)-1)
+            self.window().media.scrubber.setSliderPosition(0)
+            try:
+                self.window().media.scrubber.valueChanged.disconnect()
+            except TypeError:
+                # happens if scrubber has no connections
+                pass
+            finally:
+                self.window().media.scrubber.valueChanged.connect(self.showd1dChangePlot)
+            # start plotting
+            frame = self.window().data[0]
+            self.window().plot.reset(switch_to_plot=True, animated=True)
+            self.window().plot.setLabels(title='1D density evolution',
+                                         bottom=f'DOF {den1d_options[0]} (au)',
+                                         left='Density',
+                                         top=f't={frame[0, 1]}')
+            self.window().plot.plot(frame[:, 0], frame[:, 2], name='Re(phi)', pen='r')
+            self.window().plot.plot(frame[:, 0], frame[:, 3], name='Im(phi)', pen='b')
+            self.followFile(filepath, self.showd1dRefresh)
+
+        self.runInThread(compute, plot)
+
+    @staticmethod
+    def den1dFrames(data:np.ndarray, partial:bool=False) -> np.ndarray:
+        '''
+        Reshapes the (rows, 4) array read from a showd1d -T file (columns x, t,
+        Re(phi), Im(phi)) into a (times, points, 4) array with one frame for
+        each time interval, without copying. The x grid is then data[0, :, 0]
+        and the times data[:, 0, 1].
+
+        Raises ValueError if the time intervals do not all have the same x
+        grid (and hence the same number of points). If partial is True, a last
+        time interval with fewer points (eg. still being written) is left out
+        instead.
+        '''
+        if data.ndim != 2 or data.shape[0] == 0:
+            raise ValueError('No data found in showd1d output')
+        # number of points in the first time interval, ie. up to the first row
+        # where the time changes
+        changes = np.flatnonzero(data[1:, 1] != data[:-1, 1])
+        n_points = changes[0] + 1 if len(changes) else data.shape[0]
+        n_rows = data.shape[0]
+        if partial:
+            n_rows -= n_rows % n_points
+        if n_rows % n_points:
+            raise ValueError(f'showd1d output has {data.shape[0]} rows, which '
+                             f'is not a whole number of time intervals of '
+                             f'{n_points} points')
+        frames = data[:n_rows].reshape(-1, n_points, data.shape[1])
+        if np.any(frames[:, :, 1] != frames[:, :1, 1]):
+            raise ValueError('Time intervals in showd1d output have different '
+                             'numbers of points')
+        if np.any(frames[:, :, 0] != frames[:1, :, 0]):
+            raise ValueError('Time intervals in showd1d output have different '
+                             'x grids')
+        return frames
+
+    def showd1dRefresh(self, txt:str):
+        '''
+        Adds any new time intervals written to the end of the showd1d output
+        to the scrubber, when following the file (see AnalysisTab.followFile).
+        '''
+        if self.window().data.refresh():
+            self.window().media.scrubber.setMaximum(len(self.window().data)-1)
 
     @QtCore.pyqtSlot()
     def showd1dChangePlot(self):
@@ -144,13 +233,14 @@ class AnalysisSystem(AnalysisTab):
         '''
         re, im = self.window().plot.listDataItems()
         scrubber_pos = int(self.window().media.scrubber.value())
-        self.window().plot.setLabels(
-            top=f't={self.window().data[scrubber_pos][0][1]} fs'
-        )
-        re.setData(self.window().data[scrubber_pos][:, 0],
-                   self.window().data[scrubber_pos][:, 2])
-        im.setData(self.window().data[scrubber_pos][:, 0],
-                   self.window().data[scrubber_pos][:, 3])
+        frame = self.window().data[scrubber_pos]
+        if self.window().media.timer.isActive():
+            # playing, so read the next few frames before they are needed
+            self.window().data.prefetch(range(scrubber_pos + 1,
+                                              scrubber_pos + 1 + self.READ_AHEAD))
+        self.window().plot.setLabels(top=f't={frame[0, 1]} fs')
+        re.setData(frame[:, 0], frame[:, 2])
+        im.setData(frame[:, 0], frame[:, 3])
 
     def showd2d(self):
         '''
@@ -179,12 +269,6 @@ class AnalysisSystem(AnalysisTab):
         1D density, so it will have to be gathered from the input file -- not
         implemented yet.
         '''
-        filepath = self.window().dir.cwd/'den2d.xyz'
-        # if a plot file already exists, this won't work as we can't type
-        # the option to overwrite.
-        if not self.window().no_command.isChecked():
-            filepath.unlink(missing_ok=True)
-
         coords = str(self.den2d_coord)
         if not coords:
             # error in coordinate selection, use popup to get information.
@@ -205,58 +289,176 @@ class AnalysisSystem(AnalysisTab):
         inp += f'60\n1\n{self.den2d_state.value()}\n'
         # choose coordinates (20)
         inp += f'20\n{coords}\n'
-        # save data to xyz file (5), enter name, then exit (0)
-        inp += '5\nden2d.xyz\n0'
-        # run the command
-        self.runCmd(['showsys', '-nopes'], input=inp)
-
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            # this file essentially has xyz data for each time interval. there
-            # are two empty lines between the data for each time interval.
-            # annoyingly, one of the empty lines has whitespace in it, so we
-            # can't simply match \n{3} -- have to match newline and possible
-            # whitespace
-            intervals = [self.readFloats(i.split('\n')) for i \
-                         in re.split(r'(?:\n\s*){3}', f.read()) if i != '']
-            # create list of 2d matrices for z, one for each time interval
-            zt = []
-            # for each interval, convert from list xyz coordinate data to grid
-            # data
-            for i, interval in enumerate(intervals):
-                # assume x, y are same for each interval, so shape of z can be
-                # inferred from the first pass
-                if i == 0:
-                    x = np.unique(interval[:, 0])
-                    y = np.unique(interval[:, 1])
-                zt.append(np.array(interval[:, 2]).reshape(y.shape[0], x.shape[0]).T)
-        self.window().data = np.array(zt)
-
-        # set contents of showsys.log to text view
-        filepath = self.window().dir.cwd/'showsys.log'
-        if filepath.is_file():
-            with open(filepath, mode='r', encoding='utf-8') as f:
-                self.window().text.setPlainText(f'{"-"*80}\n{f.read()}')
-
-        # adjust scrubber properties, connect to showd2dChangePlot slot
-        self.window().media.scrubber.setMaximum(len(self.window().data)-1)
-        self.window().media.scrubber.setSliderPosition(0)
-        try:
-            self.window().media.scrubber.valueChanged.disconnect()
-        except TypeError:
-            # happens if scrubber has no connections
-            pass
-        finally:
-            self.window().media.scrubber.valueChanged.connect(self.showd2dChangePlot)
-        # start plotting
         xlabel = 'x' if self.den2d_coord.xcoord is None else self.den2d_coord.xcoord
         ylabel = 'y' if self.den2d_coord.ycoord is None else self.den2d_coord.ycoord
-        self.window().plot.reset(switch_to_plot=True, animated=True)
-        self.window().plot.setLabels(title='2D Density',
-                                     bottom=f'DOF {xlabel} (au)',
-                                     left=f'DOF {ylabel} (au)',
-                                     colourbar='Density')
-        levels = np.linspace(self.window().data.min(), self.window().data.max(), 21)
-        self.window().plot.plotContours(x, y, self.window().data[0], levels)
+        dtype = np.float32 if self.den2d_float32.isChecked() else np.float64
+        render = self.den2d_render.currentIndex()
+        cwd = self.window().dir.cwd
+
+        def compute():
+            # run the command
+            filepath, log = self.runShowsys('-nopes', inp, 'den2d', ['dvr', 'psi'], cwd)
+            x, y, z = self.readXyzFrames(filepath, dtype)
+            return x, y, z, log
+
+        def plot(result):
+            x, y, self.window().data, log = result
+            # set contents of showsys.log to text view
+            if log is not None:
+                self.window().text.setPlainText(log)
+
+            # adjust scrubber properties, connect to showd2dChangePlot slot
+            self.window().media.scrubber.setMaximum(len(self.window().data)-1)
+            self.window().media.scrubber.setSliderPosition(0)
+            try:
+                self.window().media.scrubber.valueChanged.disconnect()
+            except TypeError:
+                # happens if scrubber has no connections
+                pass
+            finally:
+                self.window().media.scrubber.valueChanged.connect(self.showd2dChangePlot)
+            # start plotting
+            self.window().plot.reset(switch_to_plot=True, animated=True)
+            self.window().plot.setLabels(title='2D Density',
+                                         bottom=f'DOF {xlabel} (au)',
+                                         left=f'DOF {ylabel} (au)',
+                                         colourbar='Density')
+            levels = np.linspace(self.window().data.min(), self.window().data.max(), 21)
+            self.plotField(x, y, self.window().data, levels, render)
+
+        self.runInThread(compute, plot)
+
+    def runShowsys(self, flag:str, inp:str, name:str, inputs:list, cwd:Path,
+                   store:DirectoryCache=None, show:bool=True,
+                   evict:bool=True) -> tuple:
+        '''
+        Runs showsys in cwd with flag (-pes or -nopes) and the menu input inp,
+        then saves the plot to an xyz file, returning its path and the
+        contents of showsys.log (see readLog). If show is False, the output of
+        showsys is not shown in the text tab.
+
+        The xyz file is kept in store (by default the directory cache of cwd,
+        see DirectoryCache), named by a key made from inp and the files in
+        inputs (filenames relative to cwd), so the same plot (eg. the same cut
+        through the PES) is loaded from there instead of running showsys
+        again, until it is evicted or the 'Force refresh' option is used. If
+        the cache is disabled, or in no command mode, the file is
+        cwd/name.xyz. If evict is False, files are not removed from store to
+        make room for the new one (eg. while other runs are still to read
+        theirs), and the caller should call store.evict() later.
+        '''
+        args = ['showsys', flag]
+        settings = self.runSettings()
+        if store is None:
+            store = self.directoryCache(cwd)
+        if settings['no_command'] or not store.enabled:
+            filepath = cwd/f'{name}.xyz'
+            if not settings['no_command']:
+                # if a plot file already exists, this won't work as we can't
+                # type the option to overwrite.
+                filepath.unlink(missing_ok=True)
+            # save data to xyz file (5), enter name, then exit (0)
+            self.runCmd(args, input=inp + f'5\n{filepath.name}\n0', cwd=cwd, show=show)
+            return filepath, self.readLog(cwd/'showsys.log')
+
+        key = store.makeKey('showsys', self.addFlags(args), inp,
+                            self._fileStamps(cwd, inputs))
+        filename = f'{name}_{key[:16]}.xyz'
+        filepath = store.get(filename)
+        if filepath is not None and not settings['force_refresh']:
+            self.cached.emit(f'Using stored output of showsys (same {name} '
+                             'plot, input files unchanged since last run)')
+            return filepath, self.readLog(store.path/f'{filename}.log')
+        # write into a temporary file first so another analysis can never read
+        # a half-written file
+        filepath = store.path/filename
+        temp = store.path/f'{filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+        store.path.mkdir(exist_ok=True)
+        if store.path.parent == Path(cwd):
+            output = temp
+            output_name = f'{DirectoryCache.DIRNAME}/{temp.name}'
+        else:
+            # running in a scratch directory (see showpesSweep), so write
+            # there then move it into the store
+            output = Path(cwd)/f'{name}.xyz'
+            output_name = output.name
+        output.unlink(missing_ok=True)
+        self.runCmd(args, input=inp + f'5\n{output_name}\n0', cwd=cwd, show=show)
+        if not output.is_file():
+            raise FileNotFoundError(f'showsys did not write {name}.xyz, check '
+                                    'its output in the text tab')
+        if output != temp:
+            shutil.move(output, temp)
+        os.replace(temp, filepath)
+        if (Path(cwd)/'showsys.log').is_file():
+            shutil.copyfile(Path(cwd)/'showsys.log', store.path/f'{filename}.log')
+        if evict:
+            # don't remove the plot just made, even if it is larger than the
+            # cache
+            store.evict(keep=[filename, f'{filename}.log'])
+        return filepath, self.readLog(Path(cwd)/'showsys.log')
+
+    @staticmethod
+    def readXyzFrames(filepath:Path, dtype:type=np.float64) -> tuple:
+        '''
+        Reads an xyz file with a grid of z values for each time interval, as
+        written by showsys (see showd2d), in a single pass. Returns the x
+        values, the y values, and the z values in a (times, x, y) array of
+        the given dtype. Only one time interval is held as text at a time.
+
+        Raises ValueError if a time interval does not have the same x and y
+        grid as the first.
+        '''
+        x = y = z = grid = None
+        n_times = 0
+
+        def addInterval(lines:list, size:int):
+            nonlocal x, y, z, grid, n_times
+            interval = AnalysisTab.readFloats(lines, 3)
+            if grid is None:
+                # the first interval sets the grid for all of them
+                grid = interval[:, :2]
+                x = np.unique(grid[:, 0])
+                y = np.unique(grid[:, 1])
+                if len(interval) != len(x)*len(y):
+                    raise ValueError(f'{filepath} does not have a z value for '
+                                     f'each x and y')
+                # estimate the number of time intervals from the file size
+                n_est = max(-(-filepath.stat().st_size // size), 1)
+                z = np.empty((n_est, len(x), len(y)), dtype=dtype)
+            elif not np.array_equal(interval[:, :2], grid):
+                raise ValueError(f'Time interval {n_times+1} of {filepath} does '
+                                 f'not have the same x and y grid as the first')
+            if n_times == len(z):
+                # underestimated, make room for more
+                z = np.concatenate([z, np.empty_like(z)])
+            z[n_times] = interval[:, 2].reshape(len(y), len(x)).T
+            n_times += 1
+
+        with open(filepath, mode='r', encoding='utf-8') as f:
+            # there are two empty lines between the data for each time
+            # interval. annoyingly, one of the empty lines has whitespace in
+            # it, so count lines with only whitespace as empty
+            lines = []
+            size = blank = 0
+            for line in f:
+                if not line.strip():
+                    blank += 1
+                elif blank >= 2 and lines:
+                    addInterval(lines, size)
+                    lines = [line]
+                    size = len(line)
+                    blank = 0
+                    continue
+                else:
+                    blank = 0
+                    lines.append(line)
+                size += len(line)
+            if lines:
+                addInterval(lines, size)
+        if n_times == 0:
+            raise ValueError(f'No data found in {filepath}')
+        return x, y, z[:n_times]
 
     @QtCore.pyqtSlot()
     def showd2dChangePlot(self):
@@ -265,8 +467,67 @@ class AnalysisSystem(AnalysisTab):
         showd2d analysis.
         '''
         scrubber_pos = int(self.window().media.scrubber.value())
-        for isocurve in self.window().plot.getPlotItem().items:
-            isocurve.setData(self.window().data[scrubber_pos])
+        if self._image is None:
+            # contours only, so wait for them
+            self._contours.setSegments(self._contour_cache[scrubber_pos])
+        else:
+            self._image.setImage(self.window().data[scrubber_pos], autoLevels=False)
+        if self._contour_cache is not None:
+            if self._image is not None:
+                self.showContours(scrubber_pos)
+            if self.window().media.timer.isActive():
+                # playing, so compute the next few frames before they are needed
+                self._contour_cache.prefetch(range(scrubber_pos + 1,
+                                                   scrubber_pos + 1 + self.READ_AHEAD))
+        return None
+
+    def plotField(self, x:np.ndarray, y:np.ndarray, frames:np.ndarray,
+                  levels:np.ndarray, render:int):
+        '''
+        Plots the first of frames, a (frames, x, y) array of z, as contours
+        (render is 0), as a heatmap (1), or as a heatmap with contour lines
+        over it (2) which are computed on a background thread. The contours of
+        each frame are kept by a ContourCache. Used by showd2d and showpes.
+        '''
+        if self._contour_cache is not None:
+            self._contour_cache.close()
+            self._contour_cache.deleteLater()
+        self._image = self._contours = self._contour_cache = None
+        if render == 0:
+            self._contours = self.window().plot.plotContours(x, y, frames[0], levels)
+            self._contour_cache = ContourCache(x, y, frames, levels, parent=self)
+            return None
+        # fixed levels, so that the frames can be compared
+        self._image = self.window().plot.plotImage(x, y, frames[0],
+                                                   (levels[0], levels[-1]))
+        if render == 2:
+            self._contours = self.window().plot.plotContourLines(levels)
+            self._contour_cache = ContourCache(x, y, frames, levels, parent=self)
+            self._contour_cache.ready.connect(self.contoursReady)
+            self.showContours(0)
+        return None
+
+    def showContours(self, i:int):
+        '''
+        Shows the contour lines of frame i over the heatmap if they have been
+        computed, otherwise hides them until they are (see contoursReady).
+        '''
+        segments = self._contour_cache.get(i)
+        self._contours.setSegments([] if segments is None else segments)
+
+    @QtCore.pyqtSlot(int)
+    def contoursReady(self, i:int):
+        '''
+        Shows the contour lines of frame i once they have been computed in the
+        background, if it is still the frame being shown.
+        '''
+        if self.sender() is not self._contour_cache:
+            # from a previous plot
+            return None
+        if len(self._contour_cache.frames) == 1 or \
+        i == int(self.window().media.scrubber.value()):
+            self.showContours(i)
+        return None
 
     def statepop(self):
         '''
@@ -281,20 +542,29 @@ class AnalysisSystem(AnalysisTab):
         where t is time and s1 ... sn are the populations for that time for
         state n. Plots time and population for each state.
         '''
-        self.runCmd(['statepop', '-w'])
-        filepath = self.window().dir.cwd/'spops'
-        # assemble data matrix
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().data = self.readFloats(f, ignore_regex=r'^#')
+        cwd = self.window().dir.cwd
 
-        # start plotting
-        self.window().plot.reset(switch_to_plot=True)
-        self.window().plot.setLabels(title='State population',
-                                     bottom='Time (fs)', left='Population')
-        n_states = self.window().data.shape[1] - 1 # minus time column
-        for i in range(1, n_states + 1):
-            self.window().plot.plot(self.window().data[:, 0], self.window().data[:, i],
-                                    name=f'State {i}', pen=colr(i-1, n_states, maxValue=200))
+        def compute():
+            self.runCmd(['statepop', '-w'], cwd=cwd, inputs=['check'],
+                        outputs=['spops'])
+            filepath = cwd/'spops'
+            # assemble data matrix
+            return self.readCached(filepath, SCHEMAS['spops'].read,
+                                   ('schema', 'spops'))
+
+        def plot(data):
+            self.window().data = data
+            # start plotting
+            self.window().plot.reset(switch_to_plot=True)
+            self.window().plot.setLabels(title='State population',
+                                         bottom='Time (fs)', left='Population')
+            n_states = self.window().data['population'].shape[1]
+            for i in range(1, n_states + 1):
+                self.window().plot.plot(self.window().data['time'],
+                                        self.window().data['population'][:, i-1],
+                                        name=f'State {i}', pen=colr(i-1, n_states, maxValue=200))
+
+        self.runInThread(compute, plot)
 
     def showpes(self):
         '''
@@ -317,12 +587,8 @@ class AnalysisSystem(AnalysisTab):
         shown. x.1 < x.2 < ... x.m and for contour plots, the same for y,
         otherwise it won't work.
         '''
-        filepath = self.window().dir.cwd/'pes.xyz'
-        # if a plot file already exists, this won't work as we can't type
-        # the option to overwrite.
-        if not self.window().no_command.isChecked():
-            filepath.unlink(missing_ok=True)
-
+        if self.showpes_sweep.isChecked():
+            return self.showpesSweep()
         coords = str(self.showpes_coord)
         if not coords:
             # error in coordinate selection, use popup to get information.
@@ -334,46 +600,184 @@ class AnalysisSystem(AnalysisTab):
             )
             if not ok:
                 raise ValueError('User cancelled operation')
+        inp = self.showpesMenu()
+        # choose coordinates (20)
+        inp += f'20\n{coords}\n'
+        xlabel = 'x' if self.den2d_coord.xcoord is None else self.den2d_coord.xcoord
+        ylabel = 'y' if self.den2d_coord.ycoord is None else self.den2d_coord.ycoord
+        title = self.showpes_type.currentText()
+        render = self.showpes_render.currentIndex()
+        cwd = self.window().dir.cwd
+
+        def compute():
+            # run the command
+            filepath, log = self.runShowsys('-pes', inp, 'pes', ['dvr', 'oper'], cwd)
+            # assemble data matrix
+            return self.readFloatsCached(filepath), log
+
+        def plot(result):
+            self.window().data, log = result
+            # set contents of showsys.log to text view
+            if log is not None:
+                self.window().text.setPlainText(log)
+
+            # start plotting
+            self.window().plot.reset(switch_to_plot=True)
+            if self.window().data.shape[1] == 3:
+                # contour plot
+                # convert from list xyz coordinate data to grid data
+                x = np.unique(self.window().data[:, 0])
+                y = np.unique(self.window().data[:, 1])
+                z = np.array(self.window().data[:, 2]).reshape(y.shape[0], x.shape[0]).T
+                self.window().plot.setLabels(title=title,
+                                             bottom=f'DOF {xlabel} (au)',
+                                             left=f'DOF {ylabel} (au)',
+                                             colourbar='PES')
+                self.plotField(x, y, z[np.newaxis], np.linspace(z.min(), z.max(), 21),
+                               render)
+            else:
+                # line plot
+                self.window().plot.setLabels(title=title,
+                                             bottom=f'DOF {xlabel} (au)',
+                                             left='PES')
+                self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 1],
+                                        name='PES', pen='r')
+
+        self.runInThread(compute, plot)
+
+    def showpesMenu(self) -> str:
+        '''
+        Returns the menu input of showsys -pes that chooses the task and state
+        selected in the PES options, see showpes.
+        '''
         inp = ''
         # choose task (10)
         inp += {0: '10\n2\n', 1: '10\n1\n'}[self.showpes_type.currentIndex()]
         # choose state (60), plot one state only (1)
         inp += f'60\n1\n{self.showpes_state.value()}\n'
-        # choose coordinates (20)
-        inp += f'20\n{coords}\n'
-        # save data to xyz file (5), enter name, then exit (0)
-        inp += '5\npes.xyz\n0'
-        # run the command
-        self.runCmd(['showsys', '-pes'], input=inp)
+        return inp
 
-        # assemble data matrix
-        with open(filepath, mode='r', encoding='utf-8') as f:
-            self.window().data = self.readFloats(f)
-        # set contents of showsys.log to text view
-        filepath = self.window().dir.cwd/'showsys.log'
-        if filepath.is_file():
-            with open(filepath, mode='r', encoding='utf-8') as f:
-                self.window().text.setPlainText(f'{"-"*80}\n{f.read()}')
-
-        # start plotting
-        xlabel = 'x' if self.den2d_coord.xcoord is None else self.den2d_coord.xcoord
-        ylabel = 'y' if self.den2d_coord.ycoord is None else self.den2d_coord.ycoord
-        self.window().plot.reset(switch_to_plot=True)
-        if self.window().data.shape[1] == 3:
-            # contour plot
-            # convert from list xyz coordinate data to grid data
-            x = np.unique(self.window().data[:, 0])
-            y = np.unique(self.window().data[:, 1])
-            z = np.array(self.window().data[:, 2]).reshape(y.shape[0], x.shape[0]).T
-            self.window().plot.setLabels(title=self.showpes_type.currentText(),
+    def showpesSweep(self):
+        '''
+        Runs showsys -pes (see showpes) for each of a range of values of the
+        sweep coordinate, keeping the other coordinates as selected,
+        concurrently in a pool of threads. Each run is in its own scratch
+        directory containing links to the dvr and oper files, so that runs
+        can't overwrite each other's files, and each cut is kept in the
+        directory cache (see runShowsys). The cache is only made to fit its
+        maximum size once every cut has been read, so that a run can't remove
+        a cut before it is read.
+
+        The cuts are stacked into one array with shape (values, x, y), NaN for
+        any that failed, which is saved in self.window().data and shown one
+        cut at a time using the scrubber.
+        '''
+        dof = self.showpes_sweep_dof.currentText()
+        if not dof or not str(self.showpes_coord):
+            raise ValueError('Cannot find the modes in the input file to '
+                             'sweep over')
+        if self.window().no_command.isChecked():
+            raise ValueError('A sweep runs showsys, so cannot be used in no '
+                             'command mode')
+        xlabel, ylabel = self.showpes_coord.xcoord, self.showpes_coord.ycoord
+        if ylabel is None:
+            raise ValueError('A y coordinate was not selected')
+        if dof in (xlabel, ylabel):
+            raise ValueError(f'The sweep coordinate {dof} is the x or y coordinate')
+        values = np.linspace(self.showpes_sweep_start.value(),
+                             self.showpes_sweep_stop.value(),
+                             self.showpes_sweep_steps.value())
+        inps = [self.showpesMenu() + f'20\n{self.showpes_coord.cut({dof: value})}\n'
+                for value in values]
+        title = f'{self.showpes_type.currentText()} sweep'
+        render = self.showpes_render.currentIndex()
+        cwd = self.window().dir.cwd
+        store = self.directoryCache(cwd)
+        inputs = ['dvr', 'oper']
+
+        def run(inp):
+            self.checkCancelled()
+            with tempfile.TemporaryDirectory(prefix='showsys_') as scratch:
+                scratch = Path(scratch)
+                for name in inputs:
+                    (scratch/name).symlink_to((cwd/name).resolve())
+                filepath, _ = self.runShowsys('-pes', inp, 'pes', inputs, scratch,
+                                              store, show=False, evict=False)
+                # (the file is in scratch if the cache is disabled). the cut is
+                # already stored as text, so don't keep another copy as .npy
+                with open(filepath, mode='r', encoding='utf-8') as f:
+                    return self.readFloats(f, 3)
+
+        def compute():
+            # showsys is limited by the cpu, so use one thread for each
+            try:
+                with ThreadPoolExecutor(max_workers=min(len(inps), os.cpu_count() or 1)) as pool:
+                    futures = [pool.submit(run, inp) for inp in inps]
+            finally:
+                if store.enabled:
+                    store.evict()
+            results = {}
+            errors = []
+            for i, future in enumerate(futures):
+                try:
+                    results[i] = future.result()
+                except AnalysisCancelled:
+                    raise
+                except Exception as e:
+                    errors.append(f'{dof} = {values[i]:g}: {type(e).__name__}: {e}')
+            if not results:
+                raise ValueError(f'showsys failed for every value of {dof}:\n' +
+                                 '\n'.join(errors[:10]))
+            # stack into one array, on the grid of the first cut
+            grid = next(iter(results.values()))[:, :2]
+            x = np.unique(grid[:, 0])
+            y = np.unique(grid[:, 1])
+            data = np.full((len(values), len(x), len(y)), np.nan)
+            for i, result in results.items():
+                if len(result) != len(x)*len(y) or not np.array_equal(result[:, :2], grid):
+                    errors.append(f'{dof} = {values[i]:g}: the x and y grid is '
+                                  'different to the other cuts')
+                    continue
+                data[i] = result[:, 2].reshape(len(y), len(x)).T
+            return x, y, data, errors
+
+        def plot(result):
+            x, y, self.window().data, errors = result
+            self._sweep = (dof, values)
+            self.window().text.setPlainText(
+                f'Ran showsys -pes for {len(values)-len(errors)} of {len(values)} '
+                f'values of {dof}.\n' + '\n'.join(errors)
+            )
+            # adjust scrubber properties, connect to showpesSweepChangePlot slot
+            self.window().media.scrubber.setMaximum(len(values)-1)
+            self.window().media.scrubber.setSliderPosition(0)
+            try:
+                self.window().media.scrubber.valueChanged.disconnect()
+            except TypeError:
+                # happens if scrubber has no connections
+                pass
+            finally:
+                self.window().media.scrubber.valueChanged.connect(self.showpesSweepChangePlot)
+            # start plotting
+            self.window().plot.reset(switch_to_plot=True, animated=True)
+            self.window().plot.setLabels(title=title,
                                          bottom=f'DOF {xlabel} (au)',
                                          left=f'DOF {ylabel} (au)',
+                                         top=f'{dof} = {values[0]:g}',
                                          colourbar='PES')
-            self.window().plot.plotContours(x, y, z, 21)
-        else:
-            # line plot
-            self.window().plot.setLabels(title=self.showpes_type.currentText(),
-                                         bottom=f'DOF {xlabel} (au)',
-                                         left='PES')
-            self.window().plot.plot(self.window().data[:, 0], self.window().data[:, 1],
-                                    name='PES', pen='r')
+            levels = np.linspace(np.nanmin(self.window().data),
+                                 np.nanmax(self.window().data), 21)
+            self.plotField(x, y, self.window().data, levels, render)
+
+        self.runInThread(compute, plot)
+
+    @QtCore.pyqtSlot()
+    def showpesSweepChangePlot(self):
+        '''
+        Allows the user to move the scrubber to change the value of the sweep
+        coordinate when using the sweep of showpes.
+        '''
+        dof, values = self._sweep
+        scrubber_pos = int(self.window().media.scrubber.value())
+        self.window().plot.setLabels(top=f'{dof} = {values[scrubber_pos]:g}')
+        self.showd2dChangePlot()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Benchmarks computing the contour lines of a 2D plot with contourSegments
+(every level at once) against pyqtgraph's isocurve (one level at a time, as
+done by each IsocurveItem). Not run by run_tests.py (the file doesn't start
+with 'test_'), run it from the directory above analysis_gui using
+
+    python3 -m analysis_gui.tests.benchmark_contours [n_points] [n_levels]
+'''
+
+from time import perf_counter
+import sys
+import numpy as np
+import pyqtgraph as pg
+from ..ui.contours import contourSegments, cachedContourSegments
+
+def benchmark(n_points:int=500, n_levels:int=21, repeats:int=3):
+    '''
+    Makes an n_points*n_points grid of a smooth 2D field (a sum of
+    gaussians, like a density), then prints the best time out of `repeats` to
+    compute its contour lines at n_levels levels with isocurve, with
+    contourSegments, and with cachedContourSegments once they are cached.
+    '''
+    x = np.linspace(-4, 4, n_points)
+    y = np.linspace(-3, 3, n_points)
+    z = np.exp(-(x[:, np.newaxis] - 1)**2 - y**2) \
+        + 0.6*np.exp(-(x[:, np.newaxis] + 1.5)**2 - (y - 1)**2/2)
+    levels = np.linspace(z.min(), z.max(), n_levels)
+    print(f'[INFO] {n_points}*{n_points} grid, {n_levels} levels')
+
+    def best(function):
+        times = []
+        for _ in range(repeats):
+            time = perf_counter()
+            result = function()
+            times.append(perf_counter() - time)
+        return min(times), result
+
+    isocurve, lines = best(lambda: [pg.functions.isocurve(z, level) for level in levels])
+    vectorized, segments = best(lambda: contourSegments(x, y, z, levels))
+    assert [len(line) for line in lines] == [len(lines) for lines in segments]
+    cachedContourSegments(x, y, z, levels)
+    cached, _ = best(lambda: cachedContourSegments(x, y, z, levels))
+    print(f'[INFO] isocurve:              {isocurve:8.3f} s')
+    print(f'[INFO] contourSegments:       {vectorized:8.3f} s '
+          f'(speedup {isocurve/vectorized:7.1f}x)')
+    print(f'[INFO] cachedContourSegments: {cached:8.3f} s '
+          f'(speedup {isocurve/cached:7.1f}x)')
+
+if __name__ == '__main__':
+    benchmark(*map(int, sys.argv[1:3]))
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Benchmarks how AnalysisTab.readFloatsParallel scales with the number of worker
+processes. Not run by run_tests.py (the file doesn't start with 'test_'), run
+it from the directory above analysis_gui using
+
+    python3 -m analysis_gui.tests.benchmark_readfloats [n_rows] [n_columns]
+'''
+
+from pathlib import Path
+from time import perf_counter
+import os
+import sys
+import tempfile
+import numpy as np
+from ..ui.analysis_tab import AnalysisTab
+
+def benchmark(n_rows:int=2000000, n_columns:int=5, repeats:int=3):
+    '''
+    Writes a file with a grid of random floats of size n_rows*n_columns, then
+    prints the best time out of `repeats` to read the grid serially and with
+    1, 2, 4, ... workers up to the number of CPUs.
+    '''
+    grid = np.ldexp(np.random.uniform(-1, 1, (n_rows, n_columns)),
+                    np.random.randint(-32, 32, (n_rows, n_columns)))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = Path(temp_dir)/'grid.txt'
+        np.savetxt(filename, grid, fmt='%.16e', delimiter='     ')
+        size = filename.stat().st_size / 1024**2
+        print(f'[INFO] {n_rows}*{n_columns} grid, {size:.1f} MB, '
+              f'{os.cpu_count()} CPUs')
+
+        workers = [1]
+        while workers[-1]*2 <= (os.cpu_count() or 1):
+            workers.append(workers[-1]*2)
+        serial = None
+        for n in workers:
+            times = []
+            for _ in range(repeats):
+                time = perf_counter()
+                read_grid = AnalysisTab.readFloatsParallel(filename, n_columns,
+                                                           workers=n)
+                times.append(perf_counter() - time)
+            assert np.array_equal(read_grid, grid)
+            if serial is None:
+                serial = min(times)
+            print(f'[INFO] {n:>3} worker(s): {min(times):8.3f} s '
+                  f'(speedup {serial/min(times):5.2f}x)')
+
+if __name__ == '__main__':
+    benchmark(*map(int, sys.argv[1:3]))
@@ -7,22 +7,36 @@ See run_tests.py for more info.
 '''
 
 from pathlib import Path
+import os
 import sys
 import re
+import sqlite3
+import tempfile
 import unittest
 import numpy as np
 from ..ui import main_window
+from ..ui.directory_cache import DirectoryCache
+from ..ui.result_table import ResultTableModel
 
 class TestAnalyses(unittest.TestCase):
     '''
     Tests various python-implemented analysis methods.
     '''
 
+    @classmethod
+    def setUpClass(cls):
+        '''
+        The method to execute before running the tests in this class.
+        '''
+        # one application shared by all tests, since creating and deleting an
+        # application for each test can crash pyqtgraph
+        cls.app = main_window.QtWidgets.QApplication.instance() \
+                  or main_window.QtWidgets.QApplication(sys.argv)
+
     def setUp(self):
         '''
         The method to execute before running a test procedure.
         '''
-        self.app = main_window.QtWidgets.QApplication(sys.argv)
         self.window = main_window.AnalysisMain()
         self.fixtures_dir = Path(__file__).parent/'fixtures'
 
@@ -81,25 +95,461 @@ class TestAnalyses(unittest.TestCase):
         self.window.dir.edit.setText(str(self.fixtures_dir.resolve()))
         self.window.analdd.radio[0].click()
         self.window.analdd.analyse.click()
+        while self.window.analdd.worker is not None:
+            self.app.processEvents()
         # only testing a fraction of the total data for now
         # numpy array of the 'y' data up to the 39th data
         obtained = self.window.plot.listDataItems()[0].getData()[1][:39]
         expected = [0, 1, 2, 3, 2, 0, 0, 2, 2, 3, 3, 4, 2, 3, 2, 5, 3, 5, 5, 3,
                     8, 1, 5, 10, 3, 5, 10, 3, 3, 3, 6, 4, 5, 6, 3, 6, 9, 4, 7]
         self.assertTrue(np.array_equal(obtained, expected))
+        # open the log at the time step 1.7 fs is in
+        self.window.analdd.calcrate_goto.setChecked(True)
+        self.window.analdd.calcrate_time.setValue(1.7)
+        self.window.analdd.analyse.click()
+        while self.window.analdd.worker is not None:
+            self.app.processEvents()
+        self.assertTrue(self.window.text.toPlainText().startswith(' time[fs]        1.500\n'))
+
+    def testfindModes(self):
+        '''
+        Tests that AnalysisConvergence.findModes finds the number of modes,
+        sets of SPFs, DOFs and states in an input file (used by the natpop and
+        qdq batch modes).
+        '''
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(Path(temp_dir)/'input', mode='w', encoding='utf-8') as s:
+                s.write('SPF-BASIS-SECTION\nmulti-set\n'
+                        '     Q_5,Q_14     = 8,8\n'
+                        '     Q_12,Q_15    = 7,6\n'
+                        '     Q_8          = 6,6\n'
+                        'end-spf-basis-section\n'
+                        'PRIMITIVE-BASIS-SECTION\n'
+                        '     el    el      2\n' +
+                        ''.join(f'     Q_{i}    HO     10   0.0     1.0    1.0\n'
+                                for i in (5, 8, 12, 14, 15)) +
+                        'end-primitive-basis-section\n')
+            self.assertEqual(self.window.analconv.findModes(Path(temp_dir)),
+                             (3, 2, 6, 2))
+
+    def testden1dFrames(self):
+        '''
+        Tests that AnalysisSystem.den1dFrames reshapes showd1d output into one
+        frame for each time interval without copying, and rejects output whose
+        time intervals have different grids.
+        '''
+        x = np.linspace(-1, 1, 7)
+        t = np.arange(5)*0.5
+        data = np.column_stack([np.tile(x, 5), np.repeat(t, 7),
+                                np.random.rand(35), np.random.rand(35)])
+        frames = self.window.analsys.den1dFrames(data)
+        self.assertEqual(frames.shape, (5, 7, 4))
+        self.assertTrue(np.shares_memory(frames, data))
+        self.assertTrue(np.array_equal(frames[:, 0, 1], t))
+        self.assertTrue(np.array_equal(frames[3, :, 2], data[21:28, 2]))
+        with self.assertRaises(ValueError):
+            self.window.analsys.den1dFrames(data[:-1])
+        # unless the last time interval is still being written
+        self.assertEqual(self.window.analsys.den1dFrames(data[:-1], partial=True).shape,
+                         (4, 7, 4))
+        data[9, 0] = 5
+        with self.assertRaisesRegex(ValueError, 'x grids'):
+            self.window.analsys.den1dFrames(data, partial=True)
+
+    def testrdcheckAll(self):
+        '''
+        Tests that AnalysisConvergence.rdcheckAll runs rdcheck natpop for
+        every mode and state (using a fake rdcheck program), pads the results
+        into one (modes, states, times, 1 + SPFs) array, and lists the pairs
+        that failed.
+        '''
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            (temp_dir/'bin').mkdir()
+            # mode m, state s has m + s time steps and s SPFs, mode 2 state 1
+            # fails
+            rdcheck = temp_dir/'bin'/'rdcheck'
+            rdcheck.write_text(f'''#!{sys.executable}
+import pathlib, sys
+task, mode, state = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+assert pathlib.Path('check').read_text() == 'check'
+if (mode, state) == (2, 1):
+    sys.exit('cannot read check file')
+pathlib.Path(f'{{task}}_{{mode}}_{{state}}.pl').write_text(''.join(
+    ' '.join([str(t)] + [str(10*mode + spf + t/100) for spf in range(state)]) + '\\n'
+    for t in range(mode + state)))
+''', encoding='utf-8')
+            rdcheck.chmod(0o755)
+            (temp_dir/'check').write_text('check', encoding='utf-8')
+            path = os.environ['PATH']
+            os.environ['PATH'] = f'{temp_dir/"bin"}{os.pathsep}{path}'
+            self.addCleanup(os.environ.__setitem__, 'PATH', path)
+            self.window.dir.edit.setText(str(temp_dir))
+            tab = self.window.analconv
+            plotted = []
+            tab.rdcheckAll('natpop', 3, 2, 'Mode', tab.natpop_mode,
+                           tab.natpop_state, lambda *cell: plotted.append(cell))
+            while tab.worker is not None:
+                self.app.processEvents()
+            for widget in self.app.topLevelWidgets():
+                if isinstance(widget, main_window.QtWidgets.QDialog):
+                    widget.close()
+
+        data = self.window.data
+        self.assertEqual(data.shape, (3, 2, 5, 3))
+        for mode in range(1, 4):
+            for state in range(1, 3):
+                cell = data[mode-1, state-1]
+                if (mode, state) == (2, 1):
+                    self.assertTrue(np.all(np.isnan(cell)))
+                    continue
+                n_times = mode + state
+                self.assertTrue(np.array_equal(cell[:n_times, 0], np.arange(n_times)))
+                self.assertTrue(np.allclose(
+                    cell[:n_times, 1:1+state],
+                    10*mode + np.arange(state) + np.arange(n_times)[:, None]/100
+                ))
+                # padding for fewer time steps and SPFs
+                self.assertTrue(np.all(np.isnan(cell[n_times:])))
+                self.assertTrue(np.all(np.isnan(cell[:, 1+state:])))
+        text = self.window.text.toPlainText()
+        self.assertIn('for 5 of 6 mode/state pairs', text)
+        self.assertIn('Mode 2, state 1:', text)
+        # the selected cell (mode 1, state 1) is plotted without padding
+        time, weights = plotted[0]
+        self.assertTrue(np.array_equal(time, [0, 1]))
+        self.assertEqual(weights.shape, (1, 2))
+
+    def testreadXyzFrames(self):
+        '''
+        Tests that AnalysisSystem.readXyzFrames reads each time interval of an
+        xyz file (as written for showd2d) into a (times, x, y) array, and
+        raises ValueError if the grids of the time intervals differ.
+        '''
+        x, y = np.array([0.0, 1.0, 2.0]), np.array([-1.0, 1.0])
+        z = np.arange(4*3*2, dtype=float).reshape(4, 3, 2)
+        def interval(t, x_values=x):
+            return ''.join(f' {x_values[i]:.3f} {y[j]:.3f} {z[t, i, j]:.6E}\n'
+                           for j in range(len(y)) for i in range(len(x)))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = Path(temp_dir)/'den2d.xyz'
+            # one of the two empty lines between intervals has whitespace
+            filepath.write_text('\n   \n'.join(interval(t) for t in range(4)),
+                                encoding='utf-8')
+            x_obtained, y_obtained, z_obtained = \
+                self.window.analsys.readXyzFrames(filepath, np.float32)
+            self.assertTrue(np.array_equal(x_obtained, x))
+            self.assertTrue(np.array_equal(y_obtained, y))
+            self.assertEqual(z_obtained.dtype, np.float32)
+            self.assertTrue(np.array_equal(z_obtained, z))
+
+            filepath.write_text(interval(0) + '\n   \n' + interval(1, x + 0.5),
+                                encoding='utf-8')
+            with self.assertRaises(ValueError):
+                self.window.analsys.readXyzFrames(filepath)
+
+    def fakeShowsys(self, directory:Path):
+        '''
+        Writes a fake showsys program in directory/bin and puts it first in
+        PATH (restored at the end of the test). It writes a 3*2 grid of
+        z = x + 10*y + q_3 (0 unless q_3 has a value in the menu input) to the
+        file named in the menu input, and adds a line to directory/runs each
+        time it is run.
+        '''
+        (directory/'bin').mkdir()
+        showsys = directory/'bin'/'showsys'
+        showsys.write_text(f'''#!{sys.executable}
+import pathlib, re, sys
+inp = sys.stdin.read()
+value = re.search(r'^q_3 (\\S+)$', inp, re.MULTILINE)
+value = float(value[1]) if value and value[1] not in 'xy' else 0
+pathlib.Path(inp.split('\\n')[-2]).write_text(
+    ''.join(f'{{x}} {{y}} {{x + 10*y + value}}\\n' for y in range(2) for x in range(3)))
+pathlib.Path('showsys.log').write_text('log')
+with open({str(directory/'runs')!r}, 'a') as f:
+    f.write('x\\n')
+''', encoding='utf-8')
+        showsys.chmod(0o755)
+        for name in ('dvr', 'oper'):
+            (directory/name).write_text(name, encoding='utf-8')
+        path = os.environ['PATH']
+        os.environ['PATH'] = f'{directory/"bin"}{os.pathsep}{path}'
+        self.addCleanup(os.environ.__setitem__, 'PATH', path)
+        return lambda: len((directory/'runs').read_text(encoding='utf-8').split())
+
+    def testrunShowsys(self):
+        '''
+        Tests that AnalysisSystem.runShowsys keeps the xyz file of each plot in
+        the directory cache, and only runs showsys again for a different menu
+        input or if the input files have changed. A plot larger than the whole
+        cache is kept until it is replaced.
+        '''
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            runs = self.fakeShowsys(temp_dir)
+            tab = self.window.analsys
+            run = lambda inp: tab.runShowsys('-pes', inp, 'pes', ['dvr', 'oper'], temp_dir)
+            filepath, log = run('20\nq_1 x\n')
+            self.assertEqual(filepath.parent.name, '.analysis_cache')
+            self.assertTrue(log.endswith('log'))
+            self.assertEqual(run('20\nq_1 x\n'), (filepath, log))
+            self.assertEqual(runs(), 1)
+            # parsing the stored file uses the same cache, not one inside it
+            self.assertEqual(tab.readFloatsCached(filepath).shape, (6, 3))
+            self.assertFalse((filepath.parent/filepath.parent.name).exists())
+            # a different cut is stored separately
+            self.assertNotEqual(run('20\nq_2 x\n')[0], filepath)
+            self.assertEqual(runs(), 2)
+            (temp_dir/'oper').write_text('changed', encoding='utf-8')
+            run('20\nq_1 x\n')
+            self.assertEqual(runs(), 3)
+            self.assertFalse((temp_dir/'pes.xyz').exists())
+            # every other file is evicted from a cache smaller than one plot
+            store = DirectoryCache(temp_dir, 10)
+            filepath, _ = tab.runShowsys('-pes', '20\nq_3 x\n', 'pes',
+                                         ['dvr', 'oper'], temp_dir, store)
+            self.assertEqual(sorted(f.name for f in store.path.iterdir()),
+                             [filepath.name, f'{filepath.name}.log'])
+            with open(filepath, mode='r', encoding='utf-8') as f:
+                self.assertEqual(tab.readFloats(f).shape, (6, 3))
+            # and so is an array stored in it
+            store.saveArray('key', np.zeros(10))
+            self.assertEqual([f.name for f in store.path.iterdir()], ['key.npy'])
+
+    def testshowpesSweep(self):
+        '''
+        Tests that AnalysisSystem.showpesSweep runs showsys for each value of
+        the sweep coordinate and stacks the cuts into one array, and that
+        running the sweep again uses the stored cuts. With a cache too small
+        for every cut, every cut is still read before any is evicted.
+        '''
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            runs = self.fakeShowsys(temp_dir)
+            (temp_dir/'input').write_text('SPF-BASIS-SECTION\n'
+                                          '    q_1, q_2 = 5\n'
+                                          '    q_3 = 5\n'
+                                          'end-spf-basis-section\n', encoding='utf-8')
+            self.window.dir.edit.setText(str(temp_dir))
+            tab = self.window.analsys
+            tab.radio[3].click()
+            tab.showpes_sweep.setChecked(True)
+            tab.showpes_sweep_dof.setCurrentText('q_3')
+            tab.showpes_sweep_start.setValue(0)
+            tab.showpes_sweep_stop.setValue(1)
+            tab.showpes_sweep_steps.setValue(5)
+            tab.showpes_render.setCurrentIndex(1)
+            expected = np.array([[[x + 10*y + value for y in range(2)] for x in range(3)]
+                                 for value in np.linspace(0, 1, 5)])
+            for n_runs in (5, 5):
+                tab.analysePushed()
+                while tab.worker is not None:
+                    self.app.processEvents()
+                self.assertTrue(np.allclose(self.window.data, expected))
+                self.assertEqual(runs(), n_runs)
+            # the cuts are only stored as xyz files
+            self.assertFalse(list((temp_dir/DirectoryCache.DIRNAME).glob('*.npy')))
+            tab.showpes_sweep_stop.setValue(2)
+            tab.directoryCache = lambda directory: DirectoryCache(directory, 100)
+            tab.analysePushed()
+            while tab.worker is not None:
+                self.app.processEvents()
+            self.assertTrue(np.allclose(self.window.data, np.array(
+                [[[x + 10*y + value for y in range(2)] for x in range(3)]
+                 for value in np.linspace(0, 2, 5)]
+            )))
+            self.assertLessEqual(sum(f.stat().st_size for f in
+                                     (temp_dir/DirectoryCache.DIRNAME).iterdir()), 100)
+            del tab.directoryCache
+            tab.showpes_sweep_stop.setValue(1)
+            tab.analysePushed()
+            while tab.worker is not None:
+                self.app.processEvents()
+            # browse the cuts as a heatmap with the scrubber
+            self.window.media.scrubber.setValue(3)
+            self.assertTrue(np.allclose(tab._image.image, expected[3]))
+
+    def testgwptraj(self):
+        '''
+        Tests that AnalysisDirectDynamics.gwptraj reads the trajectory file
+        into a (times, 2, ngwp, nmode) view, and that changing the options
+        redraws it as one item without reading it again.
+        '''
+        times, ngwp, nmode = np.arange(6)*0.5, 3, 2
+        tensor = np.random.rand(len(times), 2, ngwp, nmode)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            (temp_dir/'input').write_text('ngwp = 3\n', encoding='utf-8')
+            (temp_dir/'psi').write_text('psi', encoding='utf-8')
+            np.savetxt(temp_dir/'trajectory',
+                       np.column_stack([times, tensor.reshape(len(times), -1)]))
+            self.window.dir.edit.setText(str(temp_dir))
+            self.window.no_command.setChecked(True)
+            tab = self.window.analdd
+            tab.radio[1].click()
+            tab.gwptraj_mode.setValue(2)
+            tab.analysePushed()
+            while tab.worker is not None:
+                self.app.processEvents()
+            data = self.window.data
+            self.assertTrue(np.shares_memory(tab._gwptraj[2], data))
+            self.assertTrue(np.allclose(tab._gwptraj[2], tensor))
+            items = self.window.plot.getPlotItem().items
+            self.assertEqual(len(items), 1)
+            # one path for each gwp (colour), each with a line of every time
+            self.assertEqual([path.elementCount() for _, path in items[0].paths],
+                             [len(times)]*ngwp)
+            # a phase portrait of all modes, drawn without analysing again
+            tab.gwptraj_allmodes.setChecked(True)
+            tab.gwptraj_task.setCurrentIndex(2)
+            self.assertIsNone(tab.worker)
+            self.assertIs(self.window.data, data)
+            item = self.window.plot.getPlotItem().items[0]
+            self.assertEqual([path.elementCount() for _, path in item.paths],
+                             [len(times)*nmode]*ngwp)
+            rect = item.boundingRect()
+            self.assertAlmostEqual(rect.left(), tensor[:, 0].min())
+            self.assertAlmostEqual(rect.bottom(), tensor[:, 1].max())
+
+    def makeDatabase(self, filepath:Path, n_rows:int, nroot:int=3) -> tuple:
+        '''
+        Writes a direct dynamics database (version 4) with n_rows entries of
+        random energies and geometries of two atoms to filepath. Returns the
+        (n_rows, nroot) array of the energies in the pes table (in the columns
+        eng_1_1, eng_2_2, ..., with an off-diagonal column eng_1_2 between the
+        first two) and the (n_rows, 2, 3) array of the geometries.
+        '''
+        rng = np.random.default_rng(0)
+        energies = rng.uniform(0, 1, (n_rows, nroot))
+        coupling = rng.uniform(0, 1, n_rows)
+        geos = rng.uniform(-1, 1, (n_rows, 2, 3))
+        con = sqlite3.connect(filepath)
+        pes_names = ['eng_1_1', 'eng_1_2'] + [f'eng_{s}_{s}' for s in range(2, nroot+1)]
+        geo_names = [f'{c}{i}' for i in (1, 2) for c in 'xyz']
+        con.execute('CREATE TABLE versions (dbversion INTEGER);')
+        con.execute('INSERT INTO versions VALUES (4);')
+        con.execute('CREATE TABLE refdb (Nroot INTEGER);')
+        con.execute('INSERT INTO refdb VALUES (?);', (nroot,))
+        con.execute('CREATE TABLE refdbrefgeom (name TEXT);')
+        con.executemany('INSERT INTO refdbrefgeom VALUES (?);', [('C',), ('H',)])
+        con.execute(f'CREATE TABLE pes (id INTEGER PRIMARY KEY, {", ".join(pes_names)});')
+        con.execute(f'CREATE TABLE apes (id INTEGER PRIMARY KEY, '
+                    f'{", ".join(f"eng_{s}" for s in range(1, nroot+1))});')
+        con.execute(f'CREATE TABLE geo (id INTEGER PRIMARY KEY, {", ".join(geo_names)});')
+        ids = np.arange(1, n_rows+1)
+        con.executemany(f'INSERT INTO pes VALUES ({", ".join("?"*(nroot+2))});',
+                        np.column_stack([ids, energies[:, 0], coupling, energies[:, 1:]]).tolist())
+        con.executemany(f'INSERT INTO apes VALUES ({", ".join("?"*(nroot+1))});',
+                        np.column_stack([ids, energies]).tolist())
+        con.executemany('INSERT INTO geo VALUES (?, ?, ?, ?, ?, ?, ?);',
+                        np.column_stack([ids, geos.reshape(n_rows, -1)]).tolist())
+        con.commit()
+        con.close()
+        return energies, geos
 
-    @unittest.skip('Not yet implemented')
     def testddpesgeo(self):
         '''
-        Tests the AnalysisDirectDynamics.ddpesgeo method.
+        Tests that AnalysisDirectDynamics.ddpesgeo finds the database entries
+        with energies in an interval or matching another state, for each
+        state, when reading the database in several blocks.
+        '''
+        tab = self.window.analdd
+        tab.FETCH_ROWS = 7
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = Path(temp_dir)/'database.sql'
+            energies, geos = self.makeDatabase(filepath, 50)
+            con = sqlite3.connect(filepath)
+            cur = con.cursor()
+            try:
+                *_, state_cols, pesgeo = tab._ddpesgeoV4(cur, 'pes', ('interval', 0.2, 0.4))
+                self.assertEqual(list(pesgeo), [(1,), (2,), (3,)])
+                self.assertTrue(np.array_equal(state_cols, [0, 2, 3]))
+                for (s,), (ids, found_energies, found_geos) in pesgeo.items():
+                    expected = np.nonzero((energies[:, s-1] >= 0.2) & (energies[:, s-1] <= 0.4))[0]
+                    self.assertTrue(np.array_equal(ids, expected + 1))
+                    self.assertTrue(np.allclose(found_energies[:, state_cols], energies[expected]))
+                    self.assertTrue(np.allclose(found_geos, geos[expected]))
+                *_, pesgeo = tab._ddpesgeoV4(cur, 'apes', ('match', 2, 0.1))
+                self.assertEqual(list(pesgeo), [(2, 1), (2, 3)])
+                for (_, s), (ids, *_) in pesgeo.items():
+                    expected = np.nonzero(np.abs(energies[:, s-1] - energies[:, 1]) <= 0.1)[0]
+                    self.assertTrue(np.array_equal(ids, expected + 1))
+            finally:
+                con.close()
+            # and shown in the table, a page of rows at a time
+            self.window.dir.edit.setText(temp_dir)
+            tab.radio[2].click()
+            tab.ddpesgeo_emin.setValue(0.2)
+            tab.ddpesgeo_emax.setValue(0.9)
+            self.addCleanup(setattr, ResultTableModel, 'PAGE_ROWS', ResultTableModel.PAGE_ROWS)
+            ResultTableModel.PAGE_ROWS = 10
+            tab.analysePushed()
+            while tab.worker is not None:
+                self.app.processEvents()
+            model = self.window.table.view.model()
+            *_, pesgeo = tab._ddpesgeoV4(sqlite3.connect(filepath).cursor(), 'pes',
+                                         ('interval', 0.2, 0.9))
+            n_matches = sum(len(ids) for ids, _, _ in pesgeo.values())
+            self.assertEqual(model.n_rows, n_matches)
+            self.assertLess(model.rowCount(), n_matches)
+            while model.canFetchMore(main_window.QtCore.QModelIndex()):
+                model.fetchMore(main_window.QtCore.QModelIndex())
+            self.assertEqual(model.rowCount(), n_matches)
+            # the last row is of state 3, with its energy (column eng_3_3) bold
+            last = n_matches - 1
+            self.assertEqual(model.data(model.index(last, 0)), '3')
+            self.assertEqual(model.data(model.index(last, 1)), str(pesgeo[(3,)][0][-1]))
+            self.assertTrue(model.bold[last, 5])
+            self.assertFalse(model.bold[last, 2])
+            self.assertIn('H ', model.detail(last))
+            # exported in chunks, with the geometries
+            export = Path(temp_dir)/'export.txt'
+            model.export(export, chunk_rows=7)
+            exported = np.loadtxt(export, usecols=range(1, 2 + 4 + 6))
+            self.assertEqual(len(exported), n_matches)
+            self.assertTrue(np.allclose(exported[-1, -6:], pesgeo[(3,)][2][-1].ravel()))
+
+    def testseams(self):
+        '''
+        Tests that AnalysisDirectDynamics.seams ranks the database entries by
+        the smallest energy gap between any two states, and shows another
+        page of them without finding them again.
         '''
-        raise NotImplementedError
+        tab = self.window.analdd
+        with tempfile.TemporaryDirectory() as temp_dir:
+            energies, geos = self.makeDatabase(Path(temp_dir)/'database.sql', 40, 4)
+            # the smallest gap of each entry, comparing every pair of states
+            gaps = np.abs(energies[:, :, np.newaxis] - energies[:, np.newaxis, :])
+            gaps[:, np.arange(4), np.arange(4)] = np.inf
+            expected = np.sort(gaps.min(axis=(1, 2)))
+            self.window.dir.edit.setText(temp_dir)
+            tab.radio[5].click()
+            tab.seam_rows.setValue(15)
+            tab.analysePushed()
+            while tab.worker is not None:
+                self.app.processEvents()
+            ranked = self.window.data
+            self.assertTrue(np.allclose(ranked['gap'], expected))
+            self.assertTrue(np.allclose(np.abs(ranked['energy_1'] - ranked['energy_2']),
+                                        ranked['gap']))
+            first = ranked['id'][0]
+            state = ranked['state_1'][0]
+            self.assertAlmostEqual(ranked['energy_1'][0], energies[first-1, state-1])
+            self.assertIn('Page 1 of 3', self.window.text.toPlainText())
+            self.assertEqual(self.window.plot.listDataItems()[0].getData()[1].sum(), 40)
+            # the last page, with the geometry of the last entry
+            tab.seam_page.setValue(3)
+            self.assertIsNone(tab.worker)
+            output = self.window.text.toPlainText()
+            self.assertIn('Page 3 of 3', output)
+            last = output.split('\n')[-3].split()
+            self.assertEqual(last[:2], ['40', str(ranked['id'][-1])])
+            self.assertTrue(np.allclose(np.array(last[-6:], dtype=float),
+                                        geos[ranked['id'][-1]-1].ravel()))
 
     def tearDown(self):
         '''
         The method to execute after executing a test procedure.
         '''
         self.window.close()
-        self.app.quit()
-        del self.app
 
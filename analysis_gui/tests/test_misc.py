@@ -6,29 +6,52 @@ Consists of the class that provides unit testing for miscellaneous methods
 (ones that are not performing analyses). See run_tests.py for more info.
 '''
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import json
+import os
 from time import perf_counter
+import shutil
 import sys
+import threading
 import unittest
+import weakref
 import numpy as np
+import pyqtgraph as pg
 from ..ui import main_window
+from ..ui.analysis_tab import AnalysisTab
+from ..ui.contours import contourSegments
+from ..ui.directory_cache import DirectoryCache
+from ..ui.frame_file import FrameFile
+from ..ui.lod_curve import LODPyramid
+from ..ui.log_index import LogIndex
+from ..ui.schemas import SCHEMAS
 
 class TestConvenienceMethods(unittest.TestCase):
     '''
     Tests the AnalysisTab.readFloats and CustomTextWidget.writeTable methods.
-    AnalysisTab.runCmd not tested since that would essentially be a test of the
-    subprocess module.
+    AnalysisTab.runCmd is only tested for cancelling, since otherwise that
+    would essentially be a test of the subprocess module.
     '''
     # parameters to generate a file with a grid of random numbers
     N_COLUMNS = 5
     N_ROWS = 20000
 
+    @classmethod
+    def setUpClass(cls):
+        '''
+        The method to execute before running the tests in this class.
+        '''
+        # one application shared by all tests, since creating and deleting an
+        # application for each test can crash pyqtgraph
+        cls.app = main_window.QtWidgets.QApplication.instance() \
+                  or main_window.QtWidgets.QApplication(sys.argv)
+
     def setUp(self):
         '''
         The method to execute before running a test procedure.
         '''
         # open a main window, no need to show it though
-        self.app = main_window.QtWidgets.QApplication(sys.argv)
         self.window = main_window.AnalysisMain()
         # generate random floats with mantissa between -1 and 1, exponent
         # (base 2) between -32 and 32. this way some will numbers will be
@@ -56,6 +79,600 @@ class TestConvenienceMethods(unittest.TestCase):
             print(f'[INFO] Reading {self.N_ROWS}*{self.N_COLUMNS} grid '
                   f'took {perf_counter() - time} s')
         self.assertTrue(np.array_equal(read_grid, self.grid))
+        # the least time it could take: converting the cells alone, without
+        # checking the lines (see AnalysisTab._loadFloats)
+        with open(self.filename, mode='r', encoding='utf-8') as f:
+            time = perf_counter()
+            np.fromstring(f.read(), sep=' ')
+            print(f'[INFO] Converting the cells alone took {perf_counter() - time} s')
+
+    def testReadFloatsFallback(self):
+        '''
+        Tests that readFloats still ignores lines with the wrong number of
+        floats, lines that can't be converted and lines matching ignore_regex
+        when the grid is not clean.
+        '''
+        lines = [f'{row[0]} {row[1]} {row[2]}' for row in self.grid]
+        # header, comment, incomplete row, non-numeric row
+        lines[0:0] = ['# a b c', 'set xlabel "x"']
+        lines[100:100] = ['1.0 2.0', '1.0 2.0 abc', '']
+        read_grid = self.window.analconv.readFloats(lines, 3, ignore_regex=r'^#')
+        self.assertTrue(np.array_equal(read_grid, self.grid[:, :3]))
+        with self.assertRaises(ValueError):
+            self.window.analconv.readFloats(lines[:5], 4)
+
+    def testReadFloatsChunked(self):
+        '''
+        Tests that the readFloatsChunked method reproduces the original grid
+        when chunked by number of lines, and when chunked by a key column.
+        '''
+        with open(self.filename, mode='r', encoding='utf-8') as f:
+            blocks = list(self.window.analconv.readFloatsChunked(
+                f, floats_per_line=self.N_COLUMNS, chunk_lines=3000
+            ))
+        self.assertTrue(np.array_equal(np.concatenate(blocks), self.grid))
+        # key column with 7 rows per key, which doesn't divide chunk_lines
+        keyed = np.column_stack([np.arange(self.N_ROWS)//7, self.grid])
+        blocks = list(self.window.analconv.readFloatsChunked(
+            [' '.join(map(str, row)) for row in keyed], chunk_lines=1000,
+            key_column=0
+        ))
+        self.assertEqual(len(blocks), -(-self.N_ROWS//7))
+        self.assertTrue(all(np.all(block[:, 0] == i) for i, block in enumerate(blocks)))
+        self.assertTrue(np.array_equal(np.concatenate(blocks), keyed))
+
+    def testStackFloats(self):
+        '''
+        Tests that the stackFloats method joins the blocks of readFloatsChunked
+        into the original grid without keeping the blocks already copied,
+        whether it has to grow the array or cut it down.
+        '''
+        self.assertEqual(AnalysisTab._countLines(self.filename), self.N_ROWS)
+        for n_rows in (10, self.N_ROWS, 2*self.N_ROWS):
+            previous = []
+            def blocks():
+                with open(self.filename, mode='r', encoding='utf-8') as f:
+                    for block in self.window.analconv.readFloatsChunked(
+                        f, floats_per_line=self.N_COLUMNS, chunk_lines=3000
+                    ):
+                        # only the last block yielded is still held
+                        self.assertTrue(all(ref() is None for ref in previous[:-1]))
+                        previous.append(weakref.ref(block))
+                        yield block
+            read_grid = AnalysisTab.stackFloats(blocks(), n_rows)
+            self.assertEqual(len(previous), -(-self.N_ROWS//3000))
+            self.assertTrue(np.array_equal(read_grid, self.grid))
+        with self.assertRaises(ValueError):
+            AnalysisTab.stackFloats([np.zeros((2, 3)), np.zeros((2, 4))])
+
+    def testReadFloatsParallel(self):
+        '''
+        Tests that the readFloatsParallel method reproduces the original grid
+        when the file is split between several worker processes.
+        '''
+        read_grid = self.window.analconv.readFloatsParallel(
+            self.filename, floats_per_line=self.N_COLUMNS, workers=3
+        )
+        self.assertTrue(np.array_equal(read_grid, self.grid))
+
+    def testReadFloatsCachedChunked(self):
+        '''
+        Tests that the readFloatsCached method reads a large file using
+        readFloatsChunked when chunked is True and there is only one worker
+        for readFloatsParallel, rather than reading the whole file at once.
+        '''
+        self.window.dir.edit.setText(str(self.filename.parent.resolve()))
+        cache_dir = self.filename.parent/DirectoryCache.DIRNAME
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        # the file is large enough to be read in parallel, but there is one cpu
+        self.addCleanup(setattr, AnalysisTab, 'PARALLEL_MIN_SIZE', AnalysisTab.PARALLEL_MIN_SIZE)
+        AnalysisTab.PARALLEL_MIN_SIZE = 1
+        self.addCleanup(setattr, os, 'cpu_count', os.cpu_count)
+        os.cpu_count = lambda: 1
+        calls = []
+        def readFloatsChunked(*args, **kwargs):
+            calls.append('readFloatsChunked')
+            yield from chunked(*args, **kwargs)
+        def readFloats(*args, **kwargs):
+            calls.append('readFloats')
+            return whole(*args, **kwargs)
+        chunked, whole = AnalysisTab.readFloatsChunked, AnalysisTab.readFloats
+        # (the staticmethods themselves, not the functions they wrap)
+        self.addCleanup(setattr, AnalysisTab, 'readFloatsChunked',
+                        AnalysisTab.__dict__['readFloatsChunked'])
+        self.addCleanup(setattr, AnalysisTab, 'readFloats', AnalysisTab.__dict__['readFloats'])
+        AnalysisTab.readFloatsChunked = staticmethod(readFloatsChunked)
+        AnalysisTab.readFloats = staticmethod(readFloats)
+        read_grid = self.window.analconv.readFloatsCached(self.filename, self.N_COLUMNS,
+                                                          chunked=True)
+        self.assertEqual(calls, ['readFloatsChunked'])
+        self.assertTrue(np.array_equal(read_grid, self.grid))
+
+    def testReadFloatsCached(self):
+        '''
+        Tests that the readFloatsCached method stores the parsed grid in the
+        directory cache, returns it memory-mapped when the file is unchanged
+        and parses the file again when it changes.
+        '''
+        self.window.dir.edit.setText(str(self.filename.parent.resolve()))
+        cache_dir = self.filename.parent/DirectoryCache.DIRNAME
+        try:
+            read_grid = self.window.analconv.readFloatsCached(self.filename, self.N_COLUMNS)
+            self.assertNotIsInstance(read_grid, np.memmap)
+            read_grid = self.window.analconv.readFloatsCached(self.filename, self.N_COLUMNS)
+            self.assertIsInstance(read_grid, np.memmap)
+            self.assertTrue(np.array_equal(read_grid, self.grid))
+            # a different parser argument is a different cache entry
+            with self.assertRaises(ValueError):
+                self.window.analconv.readFloatsCached(self.filename, self.N_COLUMNS+1)
+            # changing the file invalidates the cache
+            with open(self.filename, mode='a', encoding='utf-8') as s:
+                s.write('1 2 3 4 5\n')
+            read_grid = self.window.analconv.readFloatsCached(self.filename, self.N_COLUMNS)
+            self.assertEqual(read_grid.shape[0], self.N_ROWS+1)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def testSchema(self):
+        '''
+        Tests that a Schema reads a speed file into a structured array with the
+        right dtypes, including dates across a change of year.
+        '''
+        with open(self.filename, mode='w', encoding='utf-8') as s:
+            s.write('#    Start: ------ Host: "x" ----------Sun Dec 31 23:59:58 2023\n'
+                    '#        0.00    0.1                  Dec 31 23:59:58     0     0.00\n'
+                    '         0.50    0.4       0.310      Dec 31 23:59:59     1     0.00\n'
+                    '         1.00    0.5       0.110      Jan  1 00:00:01     3     0.00\n')
+        speed = SCHEMAS['speed'].read(self.filename)
+        self.assertEqual(speed.shape, (2,))
+        self.assertTrue(np.array_equal(speed['time'], [0.5, 1.0]))
+        self.assertTrue(np.array_equal(speed['real'], [1, 3]))
+        self.assertTrue(np.array_equal(
+            speed['date'], np.array(['2023-12-31T23:59:59', '2024-01-01T00:00:01'],
+                                    dtype='M8[s]')
+        ))
+
+    def testFrameFile(self):
+        '''
+        Tests that a FrameFile indexes the frames of a showd1d-like file, reads
+        each frame on demand (keeping only a few in memory) or hands out views
+        of frames already read, and rejects a frame with a different grid.
+        '''
+        x = np.linspace(-1, 1, 7)
+        frames = [np.column_stack([x, np.full(7, t), np.random.rand(7, 2)])
+                  for t in np.arange(5)*0.5]
+        with open(self.filename, mode='w', encoding='utf-8') as s:
+            s.write('set xlabel "x"\n')
+            for frame in frames:
+                s.write('\n'.join(' '.join(map(str, row)) for row in frame) + '\n\n')
+            s.write('plot "den1d" using 1:3\n')
+        cache = DirectoryCache(self.filename.parent, 1024**2)
+        try:
+            frame_file = FrameFile(self.filename, floats_per_line=4,
+                                   ignore_regex=r'^plot|^set', cache=cache,
+                                   max_bytes=2*frames[0].nbytes)
+            self.assertEqual(len(frame_file), 5)
+            self.assertTrue(np.array_equal(frame_file.times, np.arange(5)*0.5))
+            self.assertTrue(np.array_equal(frame_file[3], frames[3]))
+            self.assertTrue(np.array_equal(frame_file[-1], frames[-1]))
+            frame_file.prefetch(range(1, 3))
+            self.assertTrue(np.array_equal(frame_file[2], frames[2]))
+            frame_file.close()
+            self.assertLessEqual(len(frame_file._frames), 2)
+            self.assertTrue(np.array_equal(np.asarray(frame_file), np.stack(frames)))
+            # the index is loaded from the cache the second time
+            self.assertTrue(np.array_equal(
+                FrameFile(self.filename, floats_per_line=4, ignore_regex=r'^plot|^set',
+                          cache=cache).index['offset'],
+                frame_file.index['offset']
+            ))
+            self.assertEqual(len(list(cache.path.iterdir())), 1)
+            # a frame still being written is not included until it is complete
+            frame = np.column_stack([x + 1, np.full(7, 2.5), np.random.rand(7, 2)])
+            lines = [' '.join(map(str, row)) + '\n' for row in frame]
+            with open(self.filename, mode='a', encoding='utf-8') as s:
+                s.write(''.join(lines[:3]) + lines[3][:5])
+            self.assertEqual(frame_file.refresh(), 0)
+            self.assertEqual(len(frame_file), 5)
+            with open(self.filename, mode='a', encoding='utf-8') as s:
+                s.write(lines[3][5:] + ''.join(lines[4:]))
+            self.assertEqual(frame_file.refresh(), 1)
+            # which has a different grid
+            with self.assertRaisesRegex(ValueError, 'different grid'):
+                frame_file[5]
+            # frames of the whole file read beforehand are handed out as views,
+            # and only frames added since are read from the file
+            whole = np.stack(frames)
+            frame_file = FrameFile(self.filename, floats_per_line=4,
+                                   ignore_regex=r'^plot|^set', frames=whole)
+            self.assertEqual(len(frame_file), 6)
+            self.assertEqual(len(frame_file._frames), 0)
+            self.assertTrue(np.shares_memory(frame_file[3], whole))
+            self.assertTrue(np.array_equal(frame_file[3], frames[3]))
+            with self.assertRaisesRegex(ValueError, 'different grid'):
+                frame_file[5]
+        finally:
+            shutil.rmtree(cache.path, ignore_errors=True)
+
+    def testLogIndex(self):
+        '''
+        Tests that a LogIndex finds the time steps of a direct dynamics log and
+        counts what happens in each, reads the log from a time step, is stored
+        in the cache, and only scans the part of the log added since.
+        '''
+        lines = [' time[fs]        0.000\n',
+                 'No. QC calculations :     2\n',
+                 ' time[fs]        0.500\n',
+                 'No. QC calculations :     1\n',
+                 'Generating DB Point for GWP :    17\n',
+                 'WARNING in subroutine Chkprop:\n',
+                 'No. QC calculations :    12\n',
+                 ' time[fs]        1.000\n',
+                 'No. QC calculations :     3\n']
+        # the start of the log identifies it, so should be complete
+        header = '-'*LogIndex.HEAD_SIZE + '\nWARNING at the start\n'
+        with open(self.filename, mode='w', encoding='utf-8') as s:
+            s.write(header + ''.join(lines[:7]) + lines[7][:5])
+        cache = DirectoryCache(self.filename.parent, 1024**2)
+        try:
+            log_index = LogIndex(self.filename, cache)
+            self.assertTrue(np.array_equal(log_index.times, [0, 0.5]))
+            self.assertTrue(np.array_equal(log_index.counts('qc_calcs'), [2, 13]))
+            self.assertTrue(np.array_equal(log_index.counts('warnings'), [0, 1]))
+            self.assertTrue(np.array_equal(log_index.counts('db_points'), [0, 1]))
+            self.assertEqual(log_index.before('warnings'), 1)
+            self.assertEqual(log_index.find(0.7), 1)
+            self.assertEqual(log_index.read(1), (''.join(lines[2:7]), 0))
+            self.assertEqual(log_index.read(1, 30), (lines[2], len(''.join(lines[3:7]))))
+            # the rest of the log is written, and only the last time step is
+            # scanned again, by refresh or when the index is loaded from cache
+            with open(self.filename, mode='a', encoding='utf-8') as s:
+                s.write(lines[7][5:] + lines[8])
+            scanned = []
+            scan = LogIndex._scan
+            def logScan(self, start=0):
+                scanned.append(start)
+                return scan(self, start)
+            LogIndex._scan = logScan
+            try:
+                loaded = LogIndex(self.filename, cache)
+                self.assertEqual(log_index.refresh(), 1)
+            finally:
+                LogIndex._scan = scan
+            self.assertEqual(scanned, [len(header + lines[0] + lines[1])]*2)
+            for field in ('offset', 'qc_calcs'):
+                self.assertTrue(np.array_equal(loaded.index[field], log_index.index[field]))
+            self.assertTrue(np.array_equal(log_index.times, [0, 0.5, 1]))
+            self.assertTrue(np.array_equal(log_index.counts('qc_calcs'), [2, 13, 3]))
+            self.assertEqual(len(list(cache.path.iterdir())), 1)
+        finally:
+            shutil.rmtree(cache.path, ignore_errors=True)
+
+    def testLogIndexCountSteps(self):
+        '''
+        Tests that LogIndex.countSteps sums the counters into the time step
+        they are in, and counts those before the first time step separately,
+        and that scanning a log in blocks gives the same index.
+        '''
+        log = (b'No. QC calculations :     2\n'
+               b' time[fs]        0.000\n'
+               b' time[fs]        0.500\n'
+               b'No. QC calculations :     1\n'
+               b'WARNING in subroutine Chkprop:\n'
+               b'No. QC calculations :    12\n'
+               b' time[fs]        1.000\n'
+               b'No. QC calculations :     3\n')
+        time_starts, times, counts = LogIndex.countSteps(log)
+        self.assertTrue(np.array_equal(time_starts, [
+            log.index(b' time[fs]        ' + time) for time in (b'0.000', b'0.500', b'1.000')
+        ]))
+        self.assertTrue(np.array_equal(times, [0, 0.5, 1]))
+        self.assertTrue(np.array_equal(counts['qc_calcs'], [2, 0, 13, 3]))
+        self.assertTrue(np.array_equal(counts['warnings'], [0, 0, 1, 0]))
+        time_starts, times, counts = LogIndex.countSteps(log, 0, 28)
+        self.assertEqual((len(time_starts), len(times)), (0, 0))
+        self.assertTrue(np.array_equal(counts['qc_calcs'], [2]))
+        # blocks of a line or two
+        with open(self.filename, mode='wb') as s:
+            s.write(log)
+        whole = LogIndex(self.filename).index
+        block_size = LogIndex.BLOCK_SIZE
+        LogIndex.BLOCK_SIZE = 40
+        try:
+            blocks = LogIndex(self.filename).index
+        finally:
+            LogIndex.BLOCK_SIZE = block_size
+        for field in ('offset', 'qc_calcs', 'warnings'):
+            self.assertTrue(np.array_equal(blocks[field], whole[field]))
+        self.assertTrue(np.array_equal(blocks['qc_calcs'], [2, 0, 13, 3, 0]))
+
+    def testFollow(self):
+        '''
+        Tests that following a file (here, the auto file plotted by rdauto)
+        adds only the complete lines written since it was read to the plot.
+        '''
+        directory = self.filename.parent
+        self.window.dir.edit.setText(str(directory.resolve()))
+        self.window.follow.setChecked(True)
+        tab = self.window.analres
+        rows = [f'{t:.1f}  {np.cos(t):.6f}  {np.sin(t):.6f}  1.000000\n'
+                for t in np.arange(10)*0.5]
+        with open(directory/'auto', mode='w', encoding='utf-8') as s:
+            s.write('#    time[fs]         Re(Auto)        Im(Auto)       Abs(Auto)\n')
+            s.write(''.join(rows[:5]) + rows[5][:8])
+        try:
+            tab.rdauto()
+            self.assertEqual(len(self.window.data), 5)
+            with open(directory/'auto', mode='a', encoding='utf-8') as s:
+                s.write(rows[5][8:] + rows[6] + rows[7][:3])
+            tab.checkFollowed()
+            self.assertTrue(np.array_equal(self.window.data['time'], np.arange(7)*0.5))
+            x, y = self.window.plot.listDataItems()[1].getData()
+            self.assertTrue(np.array_equal(x, np.arange(7)*0.5))
+            self.assertTrue(np.array_equal(y, self.window.data['im']))
+            # nothing new
+            tab.checkFollowed()
+            self.assertEqual(len(self.window.data), 7)
+            # overwriting the file stops following it
+            (directory/'auto').write_text(rows[0])
+            tab.checkFollowed()
+            self.assertFalse(tab.follow_timer.isActive())
+        finally:
+            tab.stopFollowing()
+            (directory/'auto').unlink(missing_ok=True)
+            shutil.rmtree(directory/DirectoryCache.DIRNAME, ignore_errors=True)
+
+    def testFollowNewYear(self):
+        '''
+        Tests that following a file with dates (here, the speed file plotted by
+        rdspeed) gives the lines added the next year if the month goes back
+        between the last row read and the first row added.
+        '''
+        directory = self.filename.parent
+        self.window.dir.edit.setText(str(directory.resolve()))
+        self.window.follow.setChecked(True)
+        tab = self.window.analint
+        with open(directory/'speed', mode='w', encoding='utf-8') as s:
+            s.write('#    Start: ------ Host: "x" ----------Sun Dec 31 23:59:58 2023\n'
+                    '         0.50    0.4       0.310      Dec 31 23:59:59     1     0.00\n')
+        try:
+            tab.rdspeed()
+            self.assertEqual(len(self.window.data), 1)
+            with open(directory/'speed', mode='a', encoding='utf-8') as s:
+                s.write('         1.00    0.5       0.110      Jan  1 00:00:01     3     0.00\n')
+            tab.checkFollowed()
+            self.assertTrue(np.array_equal(
+                self.window.data['date'],
+                np.array(['2023-12-31T23:59:59', '2024-01-01T00:00:01'], dtype='M8[s]')
+            ))
+        finally:
+            tab.stopFollowing()
+            (directory/'speed').unlink(missing_ok=True)
+            shutil.rmtree(directory/DirectoryCache.DIRNAME, ignore_errors=True)
+
+    def testLODCurve(self):
+        '''
+        Tests that a large curve is drawn decimated, keeping its peaks, and in
+        full once zoomed in far enough.
+        '''
+        x = np.linspace(0, 100, 1000003)
+        y = np.random.rand(len(x))
+        y[[1234, 777777]] = [-5, 5]
+        pyramid = LODPyramid(x, y)
+        level, indices = pyramid.select(0, 100, 2000)
+        self.assertGreater(level, 0)
+        self.assertLessEqual(len(indices), 2000)
+        self.assertTrue(np.all(np.diff(indices) >= 0))
+        self.assertTrue({1234, 777777} <= set(indices))
+        # the points in the range and one either side
+        zoomed = np.arange(np.searchsorted(x, 50) - 1, np.searchsorted(x, 50.01, 'right') + 1)
+        level, indices = pyramid.select(50, 50.01, 2000)
+        self.assertEqual(level, 0)
+        self.assertTrue(np.array_equal(indices, zoomed))
+
+        item = self.window.plot.plot(x, y)
+        self.assertIsNotNone(item.lod)
+        shown_x, shown_y = item.curve.getData()
+        self.assertLess(len(shown_x), len(x)//100)
+        self.assertEqual((shown_y.min(), shown_y.max()), (-5, 5))
+        self.window.plot.setXRange(50, 50.01, padding=0)
+        shown_x, shown_y = item.curve.getData()
+        self.assertTrue(np.array_equal(shown_x, x[zoomed]))
+        # the data of the item is still the full curve
+        for data in (item.getData(), item.getOriginalDataset()):
+            self.assertTrue(np.array_equal(data[0], x))
+            self.assertTrue(np.array_equal(data[1], y))
+        # changing the style keeps the points drawn
+        item.setPen('r')
+        self.assertTrue(np.array_equal(item.curve.getData()[0], x[zoomed]))
+        # a histogram has one more x than y, and is drawn in full
+        histogram = self.window.plot.plot(x, y[:-1], stepMode='center')
+        self.assertIsNone(histogram.lod)
+        self.assertEqual(len(histogram.curve.getData()[0]), len(x))
+
+    def testContourSegments(self):
+        '''
+        Tests that contourSegments finds the same contour lines as pyqtgraph's
+        isocurve for each level, on a grid that is not evenly spaced, and
+        that plotContours draws them all with a single item.
+        '''
+        x = np.linspace(-2, 2, 60)**3
+        y = np.linspace(-2, 2, 50)
+        z = np.exp(-x[:, np.newaxis]**2 - y**2) \
+            + 0.5*np.exp(-(x[:, np.newaxis] - 1)**2 - (y - 1)**2)
+        levels = np.linspace(z.min(), z.max(), 11)
+        segments = contourSegments(x, y, z, levels)
+        self.assertEqual(len(segments), len(levels))
+        for level, lines in zip(levels, segments):
+            expected = np.array(pg.functions.isocurve(z, level), dtype=float).reshape(-1, 2, 2)
+            # isocurve puts z[i, j] at (i + 0.5, j + 0.5)
+            expected[..., 0] = np.interp(expected[..., 0] - 0.5, np.arange(len(x)), x)
+            expected[..., 1] = np.interp(expected[..., 1] - 0.5, np.arange(len(y)), y)
+            # compare the segments whichever way round they are
+            self.assertEqual({tuple(sorted(map(tuple, np.round(line, 9)))) for line in lines},
+                             {tuple(sorted(map(tuple, np.round(line, 9)))) for line in expected})
+        item = self.window.plot.plotContours(x, y, z, levels)
+        self.assertEqual(self.window.plot.getPlotItem().items, [item])
+        self.assertEqual(len(item.paths), sum(len(lines) > 0 for lines in segments))
+
+    def testHeatmap(self):
+        '''
+        Tests that a 2D plot drawn as a heatmap with contours shows each frame
+        with the same levels, and that the contours of each frame are computed
+        in the background at the right positions.
+        '''
+        x = np.linspace(-2, 2, 41)
+        y = np.linspace(-1, 1, 21)
+        # circles of radius 1 (at level 1) shrinking over time
+        frames = np.array([(x[:, np.newaxis]**2 + y**2)*t for t in (1, 2, 4)])
+        segments = contourSegments(x, y, frames[0], [1.0])
+        radii = np.hypot(segments[0][..., 0], segments[0][..., 1])
+        self.assertGreater(len(radii), 10)
+        self.assertTrue(np.allclose(radii, 1, atol=0.02))
+
+        tab = self.window.analsys
+        self.window.data = frames
+        self.window.plot.reset(animated=True)
+        self.window.media.scrubber.setMaximum(len(frames) - 1)
+        self.window.media.scrubber.valueChanged.connect(tab.showd2dChangePlot)
+        tab.plotField(x, y, frames, np.linspace(0, 5, 6), render=2)
+        self.window.media.scrubber.setValue(2)
+        self.assertTrue(np.array_equal(tab._image.image, frames[2]))
+        self.assertEqual(tuple(tab._image.levels), (0, 5))
+        time = perf_counter()
+        while tab._contour_cache.get(2) is None and perf_counter() - time < 10:
+            self.app.processEvents()
+        self.app.processEvents()
+        # levels 1 to 5 are in the last frame, level 0 only at a point
+        self.assertEqual(len(tab._contours.paths), 5)
+        self.assertIsNotNone(tab._contour_cache.get(0))
+
+    def testRunInThread(self):
+        '''
+        Tests that the AnalysisTab.runInThread method passes the result of the
+        compute function to the plot function, and that cancelling kills the
+        command being run so that the plot function is never called.
+        '''
+        tab = self.window.analconv
+        results = []
+        tab.runInThread(lambda: 42, results.append)
+        while tab.worker is not None:
+            self.app.processEvents()
+        self.assertEqual(results, [42])
+
+        tab.runInThread(lambda: tab.runCmd(['sleep', '30']), results.append)
+        time = perf_counter()
+        # wait for the command to start, then push the (cancel) button
+        while not tab._processes and perf_counter() - time < 5:
+            self.app.processEvents()
+        tab.analyse.click()
+        while tab.worker is not None:
+            self.app.processEvents()
+        self.assertLess(perf_counter() - time, 5)
+        self.assertEqual(results, [42])
+        self.assertNotEqual(tab.analyse.text(), 'Cancel')
+
+    def testRunSettings(self):
+        '''
+        Tests that the compute function given to AnalysisTab.runInThread (and
+        any threads it starts) gets the options of the main window as they
+        were when the analysis was started, without reading the widgets.
+        '''
+        tab = self.window.analconv
+        self.window.timeout.setValue(12)
+        started, changed = threading.Event(), threading.Event()
+        def compute():
+            started.set()
+            changed.wait(5)
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                return tab.runSettings(), pool.submit(tab.runSettings).result()
+        results = []
+        tab.runInThread(compute, results.append)
+        started.wait(5)
+        # changed on the GUI thread while the analysis is running
+        self.window.timeout.setValue(34)
+        changed.set()
+        while tab.worker is not None:
+            self.app.processEvents()
+        self.assertEqual([settings['timeout'] for settings in results[0]], [12, 12])
+        self.assertEqual(results[0][0]['cwd'], self.window.dir.cwd)
+        self.assertEqual(tab.runSettings()['timeout'], 34)
+
+    def testRunCmdIter(self):
+        '''
+        Tests that the AnalysisTab.runCmdIter method yields lines while the
+        command is still running, shows them in the text view, and kills the
+        command after the timeout.
+        '''
+        self.window.timeout.setValue(2)
+        script = 'import time\nfor i in range(3): print(i, flush=True)\ntime.sleep(30)'
+        lines = self.window.analconv.runCmdIter([sys.executable, '-c', script])
+        time = perf_counter()
+        self.assertEqual([next(lines) for _ in range(3)], ['0\n', '1\n', '2\n'])
+        self.assertLess(perf_counter() - time, 2)
+        with self.assertRaisesRegex(main_window.subprocess.SubprocessError, 'timed out'):
+            list(lines)
+        self.assertLess(perf_counter() - time, 10)
+        self.assertEqual(self.window.text.toPlainText(), '0\n1\n2')
+
+    def testRunCmdCached(self):
+        '''
+        Tests that AnalysisTab.runCmd only runs a command again if its input
+        or output files have changed, or if force refresh is checked.
+        '''
+        directory = self.filename.parent
+        self.window.dir.edit.setText(str(directory.resolve()))
+        # command that appends a line to the output file for each run
+        script = ('import pathlib\nf = pathlib.Path("out")\n'
+                  'f.write_text(f.read_text() + "x" if f.exists() else "x")\n'
+                  'print(len(f.read_text()))')
+        args = [sys.executable, '-c', script]
+        run = lambda: self.window.analconv.runCmd(args, inputs=[self.filename.name],
+                                                  outputs=['out'])
+        try:
+            self.assertEqual(run(), '1\n')
+            self.assertEqual(run(), '1\n')
+            self.assertEqual(self.window.text.toPlainText(), '1')
+            # changing the input file runs the command again
+            with open(self.filename, mode='a', encoding='utf-8') as s:
+                s.write('1 2 3 4 5\n')
+            self.assertEqual(run(), '2\n')
+            self.assertEqual(run(), '2\n')
+            self.window.force_refresh.setChecked(True)
+            self.assertEqual(run(), '3\n')
+        finally:
+            (directory/'out').unlink(missing_ok=True)
+            shutil.rmtree(directory/DirectoryCache.DIRNAME, ignore_errors=True)
+
+    def testInstrumentation(self):
+        '''
+        Tests that an analysis run with performance instrumentation records
+        the phases run on the GUI and worker threads, and logs them as JSON.
+        '''
+        tab = self.window.analconv
+        log = self.filename.parent/'profile.jsonl'
+        self.window.instrument.setChecked(True)
+        self.window.toggleInstrumentation()
+        self.window.instrument_log_path = str(log)
+        def method():
+            compute = lambda: tab.readFloats(self.filename.read_text().split('\n'))
+            tab.runInThread(compute, lambda result: self.window.plot.plot(result[:, 0]))
+        tab.methods = [method]
+        try:
+            tab.analysePushed()
+            while tab.worker is not None:
+                self.app.processEvents()
+            self.assertTrue(self.window.profile_label.text().startswith(f'{type(tab).__name__}.method'))
+            with open(log, encoding='utf-8') as f:
+                profile = json.loads(f.readline())
+            phases = {phase['name'] for phase in profile['phases']}
+            self.assertLessEqual({'method', 'compute', 'readFloats', 'plot',
+                                  'pyqtgraph'}, phases)
+            self.assertTrue(all(phase['peak'] is not None for phase in profile['phases']))
+        finally:
+            self.window.instrument.setChecked(False)
+            self.window.toggleInstrumentation()
+            log.unlink(missing_ok=True)
 
     def testWriteTable(self):
         '''
@@ -79,6 +696,3 @@ class TestConvenienceMethods(unittest.TestCase):
         '''
         self.filename.unlink()
         self.window.close()
-        self.app.quit()
-        # required to prevent some errors with python's auto garbage collection
-        del self.app
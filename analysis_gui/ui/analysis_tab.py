@@ -5,14 +5,26 @@
 Consists of the abstract class for the analysis tabs in the main UI.
 '''
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
 from shlex import split as shsplit
+import multiprocessing
+import os
 import re
 import subprocess
 import sys
+import threading
 import traceback
+import warnings
 
 import numpy as np
 from PyQt5 import QtWidgets, QtCore, uic
+from . import instrumentation
+from .analysis_worker import AnalysisCancelled, AnalysisWorker
+from .directory_cache import DirectoryCache
+from .file_follower import FileFollower
 
 class AnalysisTab(QtWidgets.QWidget):
     '''
@@ -27,7 +39,25 @@ class AnalysisTab(QtWidgets.QWidget):
 
     Also consists of a couple convenience functions which may aid with writing
     analysis functions.
+
+    Analysis methods that take a while (eg. running a command or reading a
+    large file) should do the slow part on a worker thread using
+    self.runInThread, so that the GUI stays responsive and the analysis can be
+    cancelled.
     '''
+    # minimum file size (bytes) for readFloatsParallel to use each process
+    PARALLEL_MIN_SIZE = 64 * 1024**2
+    # interval (ms) between updates of the text view with the console output
+    # of a command run by runCmdIter
+    OUTPUT_INTERVAL = 100
+    # number of lines of console output to show in the error message if a
+    # command fails
+    ERROR_LINES = 200
+    # interval (ms) between checks for new output in a followed file
+    FOLLOW_INTERVAL = 1000
+    # emitted with a message when runCmd uses the output of a previous run of
+    # a command instead of running it again
+    cached = QtCore.pyqtSignal(str)
 
     def __init__(self, ui_file:str, *args, **kwargs):
         '''
@@ -36,6 +66,35 @@ class AnalysisTab(QtWidgets.QWidget):
         '''
         super().__init__(*args, **kwargs)
         uic.loadUi(ui_file, self)
+        # the AnalysisWorker running the current analysis (None if no analysis
+        # is running in the background), the function to call with its result,
+        # and the processes started by runCmd, so that they can be killed
+        self.worker = None
+        self._plot = None
+        self._processes = set()
+        self._cancelled = False
+        # instrumentation.Profile of the running analysis, if enabled
+        self._profile = None
+        # the options of the main window when the running analysis was started,
+        # for its worker threads (see runSettings)
+        self._settings = None
+        # console output of commands not yet added to the text view. commands
+        # may run on a worker thread, but widgets can only be modified on the
+        # GUI thread, so the output is added by a timer (which also limits how
+        # often the text view is updated). None means clear the text view
+        self._output = []
+        self._output_lock = threading.Lock()
+        self.output_timer = QtCore.QTimer(self)
+        self.output_timer.setInterval(self.OUTPUT_INTERVAL)
+        self.output_timer.timeout.connect(self.flushOutput)
+        # FileFollower of the file plotted by the last analysis, if the user
+        # wants plots to follow files that are still being written, and the
+        # function to call with the new lines (see self.followFile)
+        self._follower = None
+        self._follow_update = None
+        self.follow_timer = QtCore.QTimer(self)
+        self.follow_timer.setInterval(self.FOLLOW_INTERVAL)
+        self.follow_timer.timeout.connect(self.checkFollowed)
 
     def activate(self, methods:dict, options:dict, required_files:dict):
         '''
@@ -78,6 +137,8 @@ class AnalysisTab(QtWidgets.QWidget):
         self.window().dir.edit.textChanged.connect(self.optionSelected)
         self.window().allow_add_flags.triggered.connect(self.optionSelected)
         self.window().no_command.triggered.connect(self.optionSelected)
+        # show a message when command output is cached
+        self.cached.connect(self.showCached)
 
         # should automatically hide the boxes that correspond to an option
         # that isn't selected
@@ -107,8 +168,16 @@ class AnalysisTab(QtWidgets.QWidget):
     def analysePushed(self):
         '''
         Action to perform when the tab's analyse button is pushed, which is to
-        call the associated method given in self.methods.
+        call the associated method given in self.methods. If the method is
+        still running on a worker thread, the button is a cancel button
+        instead.
         '''
+        if self.worker is not None:
+            self.cancel()
+            return None
+        # the plot is about to be replaced, stop updating it
+        for tab in self.window().tabs:
+            tab.stopFollowing()
         # get index of checked radio button (there should only be 1)
         radio_index = [index for index, radio in enumerate(self.radio)
                        if radio.isChecked()][0]
@@ -120,22 +189,276 @@ class AnalysisTab(QtWidgets.QWidget):
         # force pyqt to update button immediately (otherwise pyqt leaves
         # this until the next event loop and nothing happens)
         self.analyse.repaint()
+        self._cancelled = False
+        method = self.methods[radio_index]
+        # record how long each phase of the analysis takes, if enabled
+        self._profile = None
+        if self.window().instrument.isChecked():
+            self._profile = instrumentation.Profile(
+                f'{type(self).__name__}.{method.__name__}', self.window().dir.cwd
+            )
         try:
             # call method associated with index
-            self.methods[radio_index]()
+            with instrumentation.activate(self._profile), \
+                 instrumentation.phase('method'):
+                method()
         except Exception as e:
             # any exceptions raised by the method would not allow continue to
             # be restored, softlocking the program -- need to catch all
-            # exceptions. print the full traceback to stderr for developer,
-            # show an error message for the user
-            print(traceback.format_exc(), file=sys.stderr)
-            # switch to text tab to see if there are any other explanatory errors
-            self.window().tab_widget.setCurrentIndex(0)
-            QtWidgets.QMessageBox.critical(self.window(), 'Error', f'{type(e).__name__}: {e}')
-        # method executed, now can unfreeze
+            # exceptions
+            self.showError(e, traceback.format_exc())
         QtWidgets.QApplication.restoreOverrideCursor()
+        if self.worker is None:
+            # method executed, now can unfreeze (otherwise the method continues
+            # on a worker thread, and the button cancels it)
+            self.analyse.setEnabled(True)
+            self.analyse.setText('Analyse')
+            self.finishProfile()
+        return None
+
+    def finishProfile(self):
+        '''
+        Shows the instrumentation results of the analysis that has just
+        finished (if instrumentation is enabled) in the main window.
+        '''
+        if self._profile is not None:
+            self._profile.finish(self.window().data)
+            self.window().showProfile(self._profile)
+            self._profile = None
+
+    def runInThread(self, compute:callable, plot:callable, *args):
+        '''
+        Runs compute(*args) on a worker thread from the global QThreadPool,
+        then calls plot(result) on the GUI thread with what it returns. Call
+        this at the end of an analysis method, after reading any options from
+        widgets and asking the user for any input.
+
+        compute should do the slow part of the analysis, eg. running commands
+        with self.runCmd and reading files, and must not modify any widgets.
+        It can call self.checkCancelled between steps so that it stops early
+        when the user cancels the analysis. plot should set self.window().data
+        and plot it.
+        '''
+        profile = instrumentation.current()
+        def instrumented(*args):
+            # record the compute phase in the profile of the analysis
+            with instrumentation.activate(profile), instrumentation.phase('compute'):
+                return compute(*args)
+        # widgets can only be used on the GUI thread, so read the options the
+        # compute function needs now
+        self._settings = self.runSettings()
+        self.worker = AnalysisWorker(instrumented, *args)
+        # keep ownership on the python side, so the worker isn't deleted by qt
+        # before its signals are delivered
+        self.worker.setAutoDelete(False)
+        self.worker.signals.finished.connect(self.workerFinished)
+        self.worker.signals.error.connect(self.workerError)
+        self._plot = plot
+        self.window().analysisStarted()
+        self.output_timer.start()
+        # analyse button now cancels the analysis
+        self.analyse.setEnabled(True)
+        self.analyse.setText('Cancel')
+        QtCore.QThreadPool.globalInstance().start(self.worker)
+
+    def runSettings(self) -> dict:
+        '''
+        Returns the options of the main window used to run commands and to
+        cache their results, as a dict with the keys cwd (the directory),
+        cache_size (in bytes), no_command, force_refresh, timeout (in
+        seconds) and add_flags (the additional flags to add to commands, a
+        list).
+
+        Widgets can only be used on the GUI thread, so on any other thread (eg.
+        in the compute function of runInThread, or threads it starts) the
+        options read by runInThread when it started the analysis are returned
+        instead.
+        '''
+        if QtCore.QThread.currentThread() != self.thread():
+            if self._settings is None:
+                raise RuntimeError('The options of the main window can only be '
+                                   'read on a thread started by runInThread')
+            return self._settings
+        window = self.window()
+        return {
+            'cwd': window.dir.cwd,
+            'cache_size': window.cache_size.value()*1024**2,
+            'no_command': window.no_command.isChecked(),
+            'force_refresh': window.force_refresh.isChecked(),
+            'timeout': window.timeout.value(),
+            'add_flags': shsplit(window.add_flags.text())
+                         if window.allow_add_flags.isChecked() else [],
+        }
+
+    def directoryCache(self, directory:Path) -> DirectoryCache:
+        '''
+        Returns the directory cache (see DirectoryCache) of directory, with the
+        maximum size set in the main window.
+        '''
+        return DirectoryCache(directory, self.runSettings()['cache_size'])
+
+    @QtCore.pyqtSlot()
+    def cancel(self):
+        '''
+        Cancels the analysis running on a worker thread, killing the commands
+        it is running (if any).
+        '''
+        self._cancelled = True
+        self.analyse.setEnabled(False)
+        self.analyse.setText('Cancelling')
+        # copy, since the set may change on the worker thread
+        for process in list(self._processes):
+            process.kill()
+
+    def checkCancelled(self):
+        '''
+        Raises AnalysisCancelled if the user has cancelled the analysis. Call
+        this between the steps of a compute function given to runInThread.
+        '''
+        if self._cancelled:
+            raise AnalysisCancelled('Analysis cancelled')
+
+    @QtCore.pyqtSlot(object)
+    def workerFinished(self, result):
+        '''
+        Called on the GUI thread when the compute function given to
+        runInThread returns. Plots the result.
+        '''
+        with instrumentation.activate(self._profile):
+            # command output should be shown before anything added by plot
+            self.flushOutput()
+            try:
+                with instrumentation.phase('plot'):
+                    self._plot(result)
+            except Exception as e:
+                self.showError(e, traceback.format_exc())
+        self.workerDone()
+
+    @QtCore.pyqtSlot(object, str)
+    def workerError(self, e:Exception, tb:str):
+        '''
+        Called on the GUI thread when the compute function given to
+        runInThread raises an exception.
+        '''
+        if isinstance(e, AnalysisCancelled):
+            self.window().statusbar.showMessage('Analysis cancelled', 5000)
+        else:
+            self.showError(e, tb)
+        self.workerDone()
+
+    def workerDone(self):
+        '''
+        Restores the analyse button once the worker thread has finished.
+        '''
+        self.worker = None
+        self._plot = None
+        self.output_timer.stop()
+        self.flushOutput()
+        self.window().analysisFinished()
+        # check the required files again, the directory may have changed
         self.analyse.setEnabled(True)
         self.analyse.setText('Analyse')
+        self.optionSelected()
+        self.finishProfile()
+
+    @QtCore.pyqtSlot(str)
+    def showCached(self, msg:str):
+        '''
+        Shows the message emitted by self.cached in the status bar.
+        '''
+        self.window().statusbar.showMessage(msg, 10000)
+
+    def followFile(self, filepath:Path, update:callable, offset:int=None):
+        '''
+        If the user has turned on following files, calls update(text) on the
+        GUI thread with the complete lines added to the end of filepath
+        whenever there are any (eg. by a Quantics propagation that is still
+        running). Call this at the end of an analysis method once the file has
+        been plotted, with update adding the new lines to the plot.
+
+        offset is the byte offset in the file up to which it has been read (see
+        FileFollower.lineEnd), by default the end of its last complete line.
+        Stops when another analysis is run, the user turns following off, or
+        the file is overwritten.
+        '''
+        self.stopFollowing()
+        if not self.window().follow.isChecked():
+            return None
+        self._follower = FileFollower(filepath, offset)
+        self._follow_update = update
+        self.follow_timer.start()
+        self.window().statusbar.showMessage(f'Following {Path(filepath).name} '
+                                            f'for new output', 5000)
+        return None
+
+    def followSchema(self, filepath:Path, schema, x:str, ys:list, offset:int=None):
+        '''
+        Follows filepath (see followFile) for a plot of self.window().data, a
+        structured array read from the file using schema (a schemas.Schema).
+        New rows are read using the schema and added to self.window().data
+        and the text view, and the curves of the plot are extended, where
+        curve i is field ys[i] against field x. Rows with x not greater than
+        the last row already read are ignored. See followFile for offset.
+        '''
+        def update(txt:str):
+            data = self.window().data
+            after = None
+            if 'date' in data.dtype.names:
+                # the lines added may not include a full date with the year
+                after = data['date'][-1]
+            try:
+                new = schema.readText(txt, after)
+            except ValueError:
+                # no complete rows yet
+                return None
+            new = new[new[x] > data[x][-1]]
+            self.window().text.appendPlainText(txt.rstrip('\n'))
+            if len(new) == 0:
+                return None
+            self.window().data = np.concatenate([data, new])
+            for item, y in zip(self.window().plot.listDataItems(), ys):
+                item.setData(self.window().data[x], self.window().data[y])
+            return None
+        self.followFile(filepath, update, offset)
+
+    @QtCore.pyqtSlot()
+    def checkFollowed(self):
+        '''
+        Checks the followed file for new lines, see followFile.
+        '''
+        try:
+            txt = self._follower.read()
+        except (OSError, ValueError) as e:
+            self.stopFollowing()
+            self.window().statusbar.showMessage(f'Stopped following: {e}', 10000)
+            return None
+        if not txt:
+            return None
+        try:
+            self._follow_update(txt)
+        except Exception as e:
+            self.stopFollowing()
+            self.showError(e, traceback.format_exc())
+        return None
+
+    @QtCore.pyqtSlot()
+    def stopFollowing(self):
+        '''
+        Stops following the file followed using followFile.
+        '''
+        self.follow_timer.stop()
+        self._follower = None
+        self._follow_update = None
+
+    def showError(self, e:Exception, tb:str):
+        '''
+        Prints the full traceback tb of an exception e raised by an analysis to
+        stderr for the developer, and shows an error message for the user.
+        '''
+        print(tb, file=sys.stderr)
+        # switch to text tab to see if there are any other explanatory errors
+        self.window().tab_widget.setCurrentIndex(0)
+        QtWidgets.QMessageBox.critical(self.window(), 'Error', f'{type(e).__name__}: {e}')
 
     def checkFileExists(self, index:int):
         '''
@@ -145,6 +468,9 @@ class AnalysisTab(QtWidgets.QWidget):
         This functionality is disabled if the user has checked the 'Allow
         additional flags' or the 'No command mode' options.
         '''
+        if self.worker is not None:
+            # button is the cancel button while an analysis is running
+            return None
         ignore = (self.window().allow_add_flags.isChecked() or
                   self.window().no_command.isChecked() or
                   index not in self.required_files)
@@ -196,73 +522,603 @@ class AnalysisTab(QtWidgets.QWidget):
 
         If ignore_regex is set, the function ignores lines that match the
         regex.
+
+        The whole buffer is first converted in bulk with np.loadtxt. Only if
+        that fails (eg. there are header lines or incomplete rows) are the
+        lines with the wrong number of cells discarded, and the remaining
+        lines converted in blocks, falling back to converting line by line
+        only for blocks containing a line that can't be converted.
         '''
-        data = []
-        for line in iterable:
-            # ignore finding floats on this line if matches regex
-            if ignore_regex and re.search(ignore_regex, line):
+        with instrumentation.phase('readFloats'):
+            if hasattr(iterable, 'read'):
+                # file object: reading the whole file at once is much faster
+                # than iterating over it line by line
+                lines = iterable.read().split('\n')
+            else:
+                lines = list(iterable)
+            data = AnalysisTab._parseFloats(lines, floats_per_line, ignore_regex)
+        if data is None:
+            # nothing found
+            raise ValueError('No floats found in iterable. Check console '
+                             'output to see what went wrong?')
+        return data
+
+    @staticmethod
+    def readFloatsChunked(iterable:list, floats_per_line:int=None,
+                          ignore_regex:re.Pattern|str=None,
+                          chunk_lines:int=100000, key_column:int=None):
+        '''
+        Generator version of readFloats (see its docstring for the arguments),
+        which reads at most chunk_lines lines of iterable at a time and yields
+        the floats found in them as 2D arrays, so the whole file never needs
+        to be in memory at once. Use this for files that may be very large,
+        either by consuming the arrays one at a time, by reducing over them,
+        eg.
+
+        vmax = max(block.max() for block in self.readFloatsChunked(f))
+
+        or by joining them together with self.stackFloats (rather than
+        np.concatenate, which needs every block in memory at once).
+
+        If key_column is given, instead of arrays of (at most) chunk_lines
+        rows, yields one array for each run of consecutive rows that have the
+        same value in column key_column, eg. each time interval in a file
+        where that column is the time.
+
+        Raises ValueError once iterable is exhausted if no floats were found.
+        '''
+        iterator = iter(iterable)
+        found = False
+        # rows at the end of the last chunk that may continue into the next
+        leftover = None
+        while True:
+            lines = list(islice(iterator, chunk_lines))
+            if not lines:
+                break
+            block = AnalysisTab._parseFloats(lines, floats_per_line, ignore_regex)
+            if block is None:
+                continue
+            found = True
+            if key_column is None:
+                yield block
                 continue
-            # should find this number of floats per line, if not, ignore
-            # that line
-            matches = re.findall(r'\S+', line)
+            if leftover is not None:
+                block = np.concatenate([leftover, block])
+            # the rows where the value in the key column changes
+            splits = np.flatnonzero(np.diff(block[:, key_column])) + 1
+            if splits.size:
+                yield from np.split(block[:splits[-1]], splits[:-1])
+                leftover = block[splits[-1]:]
+            else:
+                leftover = block
+        if leftover is not None:
+            yield leftover
+        if not found:
+            raise ValueError('No floats found in iterable. Check console '
+                             'output to see what went wrong?')
+
+    @staticmethod
+    def stackFloats(blocks, n_rows:int=1024) -> np.ndarray:
+        '''
+        Joins the 2D arrays of floats yielded by readFloatsChunked into one
+        array, copying each block into place as soon as it is yielded. Unlike
+        np.concatenate(list(blocks)), only one block is held at a time besides
+        the result, so the memory used is about the size of the result.
+
+        n_rows is the number of rows to make room for at first (eg. the number
+        of lines in the file), the array grows if it is too small and is cut
+        down to the rows found at the end. Raises ValueError if the blocks
+        don't all have the same number of columns.
+        '''
+        data = None
+        row = 0
+        for block in blocks:
+            if data is None:
+                data = np.empty((max(n_rows, len(block)), block.shape[1]))
+            elif block.shape[1] != data.shape[1]:
+                raise ValueError('Rows have different numbers of floats')
+            if row + len(block) > len(data):
+                # (in place where possible, nothing else refers to data)
+                data.resize((max(2*len(data), row + len(block)), data.shape[1]),
+                            refcheck=False)
+            data[row:row+len(block)] = block
+            row += len(block)
+        if data is None:
+            raise ValueError('No floats found in iterable. Check console '
+                             'output to see what went wrong?')
+        data.resize((row, data.shape[1]), refcheck=False)
+        return data
+
+    @staticmethod
+    def _countLines(filepath:Path, block_size:int=1024**2) -> int:
+        '''
+        Returns the number of lines in the file at filepath, reading it in
+        blocks of block_size bytes.
+        '''
+        n_lines = 0
+        with open(filepath, mode='rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                n_lines += block.count(b'\n')
+                last = block
+        # a last line without a newline
+        return n_lines + (n_lines == 0 or not last.endswith(b'\n'))
+
+    @staticmethod
+    def readFloatsParallel(filepath:Path, floats_per_line:int=None,
+                           ignore_regex:re.Pattern|str=None,
+                           workers:int=None) -> np.ndarray:
+        '''
+        Reads the floats in the file at filepath like readFloats (see its
+        docstring for the arguments), but splits the file into newline-aligned
+        byte ranges which are parsed in parallel by a pool of `workers`
+        processes. The blocks of floats are copied in order into one array.
+
+        If workers is None, the file is parsed serially if it is smaller than
+        AnalysisTab.PARALLEL_MIN_SIZE bytes, otherwise using one process per
+        CPU (but no more than one per PARALLEL_MIN_SIZE bytes).
+        '''
+        with instrumentation.phase('readFloats'):
+            return AnalysisTab._readFloatsParallel(filepath, floats_per_line,
+                                                   ignore_regex, workers)
+
+    @staticmethod
+    def _readFloatsParallel(filepath:Path, floats_per_line:int=None,
+                            ignore_regex:re.Pattern|str=None,
+                            workers:int=None) -> np.ndarray:
+        '''
+        Does the work for readFloatsParallel.
+        '''
+        size = Path(filepath).stat().st_size
+        if workers is None:
+            workers = AnalysisTab._parallelWorkers(size)
+        if workers <= 1:
+            with open(filepath, mode='r', encoding='utf-8') as f:
+                return AnalysisTab.readFloats(f, floats_per_line, ignore_regex)
+
+        # split into byte ranges of about the same size. the end of each range
+        # is moved forward to just after the next newline
+        bounds = [0]
+        with open(filepath, mode='rb') as f:
+            for i in range(1, workers):
+                f.seek(max(size * i // workers, bounds[-1]))
+                f.readline()
+                bounds.append(f.tell())
+        bounds.append(size)
+        ranges = [(filepath, start, end, floats_per_line, ignore_regex)
+                  for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+        # spawn rather than fork: forking a process running Qt (which has its
+        # own threads) is not safe
+        with ProcessPoolExecutor(max_workers=len(ranges),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            blocks = [block for block in pool.map(AnalysisTab._parseRange, ranges)
+                      if block is not None]
+        if len(blocks) == 0:
+            raise ValueError('No floats found in file. Check console output '
+                             'to see what went wrong?')
+        if len({block.shape[1] for block in blocks}) != 1:
+            raise ValueError('Rows in file have different numbers of floats')
+        data = np.empty((sum(len(block) for block in blocks), blocks[0].shape[1]))
+        row = 0
+        for block in blocks:
+            data[row:row+len(block)] = block
+            row += len(block)
+        return data
+
+    @staticmethod
+    def _parallelWorkers(size:int) -> int:
+        '''
+        Returns the number of processes readFloatsParallel uses by default for
+        a file of size bytes, one per CPU but no more than one per
+        PARALLEL_MIN_SIZE bytes.
+        '''
+        return min(os.cpu_count() or 1, size // AnalysisTab.PARALLEL_MIN_SIZE)
+
+    @staticmethod
+    def _parseRange(args:tuple) -> np.ndarray:
+        '''
+        Worker function for readFloatsParallel. args is a tuple of (filepath,
+        start, end, floats_per_line, ignore_regex); parses the bytes from
+        start to end of the file. Returns None if no floats are found.
+        '''
+        filepath, start, end, floats_per_line, ignore_regex = args
+        with open(filepath, mode='rb') as f:
+            f.seek(start)
+            lines = f.read(end - start).decode('utf-8').split('\n')
+        return AnalysisTab._parseFloats(lines, floats_per_line, ignore_regex)
+
+    def readCached(self, filepath:Path, parse:callable, key:tuple=(),
+                   cached_only:bool=False) -> np.ndarray:
+        '''
+        Returns parse(filepath), which should be a numeric numpy array, using
+        the directory cache (see DirectoryCache) so that the file is only
+        parsed again if it has changed. key should be a tuple of anything
+        else (eg. parser arguments) that the result depends on.
+
+        If the result is in the cache, it is returned as a read-only memory-
+        mapped array rather than being parsed again. The cache used is the one
+        in the directory of filepath (or the one filepath is in). If
+        cached_only is True, None is returned instead of parsing the file if
+        the result is not in the cache.
+        '''
+        directory = Path(filepath).parent
+        if directory.name == DirectoryCache.DIRNAME:
+            # a file kept in the cache itself, eg. by AnalysisSystem.runShowsys
+            directory = directory.parent
+        cache = self.directoryCache(directory)
+        with instrumentation.phase('readCached'):
+            if not cache.enabled:
+                return None if cached_only else parse(filepath)
+            key = cache.makeKey(cache.fileStamp(filepath), key)
+            data = cache.loadArray(key)
+            if data is None and not cached_only:
+                data = parse(filepath)
+                cache.saveArray(key, data)
+            return data
+
+    def readFloatsCached(self, filepath:Path, floats_per_line:int=None,
+                         ignore_regex:re.Pattern|str=None,
+                         chunked:bool=False, cached_only:bool=False) -> np.ndarray:
+        '''
+        Reads the floats in the file at filepath using readFloats, or if chunked
+        is True, readFloatsChunked and stackFloats (to limit memory use for
+        large files to about the size of the result). Files
+        large enough to be split between more than one process are read
+        using readFloatsParallel instead. The result is cached using
+        self.readCached (see there for cached_only).
+        '''
+        def parse(filepath):
+            workers = self._parallelWorkers(filepath.stat().st_size)
+            if workers > 1:
+                # large file, worth parsing in parallel
+                return self.readFloatsParallel(filepath, floats_per_line,
+                                               ignore_regex, workers)
+            if chunked:
+                # the file has at most one row per line, so the array never
+                # needs to grow
+                n_lines = self._countLines(filepath)
+                with open(filepath, mode='r', encoding='utf-8') as f:
+                    return self.stackFloats(self.readFloatsChunked(
+                        f, floats_per_line, ignore_regex
+                    ), n_lines)
+            with open(filepath, mode='r', encoding='utf-8') as f:
+                return self.readFloats(f, floats_per_line, ignore_regex)
+        if isinstance(ignore_regex, re.Pattern):
+            ignore_regex = (ignore_regex.pattern, ignore_regex.flags)
+        return self.readCached(filepath, parse,
+                               ('readFloats', floats_per_line, ignore_regex),
+                               cached_only)
+
+    @staticmethod
+    def _parseFloats(lines:list, floats_per_line:int=None,
+                     ignore_regex:re.Pattern|str=None) -> np.ndarray:
+        '''
+        Does the work for readFloats and readFloatsChunked, given a list of
+        lines. Returns None if no floats are found.
+        '''
+        if ignore_regex:
+            # ignore finding floats on lines that match regex
+            regex = re.compile(ignore_regex)
+            lines = [line for line in lines if not regex.search(line)]
+
+        # fast path: every line (other than blank lines, which loadtxt skips)
+        # is a row of floats with the same number of cells
+        data = AnalysisTab._loadFloats(lines)
+        if data is None or data.size == 0 or \
+        (floats_per_line and data.shape[1] != floats_per_line):
+            # slow path: should find this number of floats per line, if not,
+            # ignore that line. count the cells in each line and use a numpy
+            # mask to keep only the lines with the right number
+            n_cells = np.fromiter((len(line.split()) for line in lines),
+                                  dtype=int, count=len(lines))
+            if floats_per_line:
+                keep = np.flatnonzero(n_cells == floats_per_line)
+            else:
+                keep = np.flatnonzero(n_cells > 0)
+            blocks = AnalysisTab._bisectFloats([lines[i] for i in keep])
+            data = np.concatenate(blocks) if blocks else None
+        if data is None or data.size == 0:
+            return None
+        return data
+
+    @staticmethod
+    def _loadFloats(lines:list) -> np.ndarray:
+        '''
+        Converts a list of lines into a 2D array of floats in one go using
+        np.loadtxt. Returns None if any line can't be converted or the lines
+        don't all have the same number of cells.
+
+        Almost all the time taken is converting each cell from a string,
+        which costs about the same whichever way it is done (float,
+        np.fromstring, or splitting the whole buffer once with str.split and
+        converting with np.array(cells, dtype=float), which was measured to
+        be slower than this since it still has to check the number of cells
+        of each line). So readFloats can't be made much faster than the time
+        it takes to convert the cells alone, see testReadFloats.
+        '''
+        try:
+            with warnings.catch_warnings():
+                # loadtxt warns if the lines are empty, which is not an error
+                # here (readFloats raises its own error)
+                warnings.simplefilter('ignore', UserWarning)
+                # comments=None since a line like '1.0 2.0 # comment' should
+                # be ignored rather than be read as two floats
+                return np.loadtxt(lines, ndmin=2, comments=None)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _bisectFloats(lines:list, min_lines:int=16) -> list:
+        '''
+        Converts a list of lines into a list of 2D arrays of floats, skipping
+        any lines that can't be converted. The lines are converted in bulk
+        using AnalysisTab._loadFloats, and if that fails, the lines are halved
+        and each half tried again, until there are fewer than min_lines lines
+        left, which are converted one line at a time.
+        '''
+        if len(lines) == 0:
+            return []
+        data = AnalysisTab._loadFloats(lines)
+        if data is not None:
+            return [data] if data.size else []
+        if len(lines) > min_lines:
+            mid = len(lines) // 2
+            return AnalysisTab._bisectFloats(lines[:mid], min_lines) + \
+                   AnalysisTab._bisectFloats(lines[mid:], min_lines)
+        data = []
+        for line in lines:
             try:
-                # regex returns strings, need to convert into float
-                floats = list(map(float, matches))
+                # split returns strings, need to convert into float
+                data.append(np.array(list(map(float, line.split())), ndmin=2))
             except ValueError:
                 pass
+        return data
+
+    @staticmethod
+    def readLog(filepath:Path) -> str:
+        '''
+        Returns the contents of the log file at filepath (eg. showsys.log)
+        after a separator line, ready to be added to the text view, or None if
+        the file doesn't exist.
+        '''
+        if not Path(filepath).is_file():
+            return None
+        with open(filepath, mode='r', encoding='utf-8') as f:
+            return f'{"-"*80}\n{f.read()}'
+
+    @QtCore.pyqtSlot()
+    def flushOutput(self):
+        '''
+        Adds the console output of commands run by runCmdIter since the last
+        call to the text view. Called regularly by self.output_timer while an
+        analysis runs on a worker thread.
+        '''
+        with self._output_lock:
+            output, self._output = self._output, []
+        clear = False
+        lines = []
+        for line in output:
+            if line is None:
+                # start of a new command, anything before is cleared anyway
+                clear = True
+                lines = []
             else:
-                if (floats_per_line and len(floats) == floats_per_line)\
-                or (floats_per_line is None and len(floats) > 0):
-                    data.append(floats)
-        if len(data) == 0:
-            # nothing found
-            raise ValueError('No floats found in iterable. Check console '
-                             'output to see what went wrong?')
-        return np.array(data)
+                lines.append(line)
+        with instrumentation.phase('text'):
+            if clear:
+                self.window().text.clear()
+            if lines:
+                # appendPlainText adds a newline itself
+                text = ''.join(lines)
+                self.window().text.appendPlainText(text[:-1] if text.endswith('\n')
+                                                   else text)
+        return None
 
-    def runCmd(self, args:list, input:str=None) -> str:
+    def writeOutput(self, text:str):
         '''
-        Execute the shell command sent by args. Returns and shows the result in
-        the main window's output's text tab.
+        Replaces the contents of the text view with text. Can be called from a
+        worker thread, in which case the text view is updated by
+        self.output_timer.
+        '''
+        with self._output_lock:
+            self._output.append(None)
+            if text:
+                self._output.append(text)
+        if QtCore.QThread.currentThread() == self.thread():
+            self.flushOutput()
 
-        args should be a list of strings with individual items representing
-        arguments that would normally be spaced using spaces, eg. ls -A home/
-        is ['ls', '-A', '/home/']. The keyword input is the a string to feed to
-        stdin after the command execution.
+    def addFlags(self, args:list) -> list:
+        '''
+        Returns a copy of the command args with the additional flags set by
+        the user added, if the user allows additional flags.
+        '''
+        args = list(args)
+        # note: if the original command contains positional arguments
+        # appending the extra flags at the end may not work, since the
+        # analysis program stops reading input at that point. instead,
+        # insert just after the name of the program called.
+        # workaround fails if the flags generated by the gui overwrite the
+        # additional flags or cause an error -- may need to integrate this
+        # extra flag into the gui if this is the case.
+        args[1:1] = self.runSettings()['add_flags']
+        return args
+
+    def runCmdIter(self, args:list, input:str=None, cwd:Path=None,
+                   show:bool=True):
+        '''
+        Generator that executes the shell command sent by args (see runCmd
+        for the arguments), yielding each line of the console output (with its
+        newline) as soon as the command outputs it. This allows the output to
+        be parsed while the command is still running. The output is also shown
+        in the main window's text tab, which is updated regularly.
+
+        The command is killed if it runs for longer than the timeout set in
+        the main window, if the user cancels the analysis (if called from the
+        compute function of runInThread, in which case AnalysisCancelled is
+        raised once the output ends), or if the generator is closed early.
+        Yields nothing in no command mode.
+
+        If show is False, the output is not shown in the text tab (eg. when
+        running several commands at once).
         '''
-        if self.window().no_command.isChecked():
+        settings = self.runSettings()
+        if settings['no_command']:
             # don't do anything if user has set no command mode
             return None
-        if self.window().allow_add_flags.isChecked():
-            # add additional flags set by the user
-            # note: if the original command contains positional arguments
-            # appending the extra flags at the end may not work, since the
-            # analysis program stops reading input at that point. instead,
-            # insert just after the name of the program called.
-            # workaround fails if the flags generated by the gui overwrite the
-            # additional flags or cause an error -- may need to integrate this
-            # extra flag into the gui if this is the case.
-            args[1:1] = shsplit(self.window().add_flags.text())
+        args = self.addFlags(args)
+        if cwd is None:
+            cwd = settings['cwd']
+        timeout = settings['timeout']
 
+        self.checkCancelled()
         try:
-            p = subprocess.run(args, input=input, cwd=self.window().dir.cwd,
-                               timeout=self.window().timeout.value(),
-                               check=True, text=True, stdout=subprocess.PIPE,
-                               stderr=subprocess.STDOUT)
-            self.window().text.setPlainText(p.stdout)
-            return p.stdout
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError) as e:
-            # something went wrong executing the function. add the console
-            # stdout to the end of the error string, then raise error again.
-            if e.stdout:
-                msg = (f'{e} At the moment of this error, the console output '
-                       f'was:\n\n{e.stdout}')
-            # TimeoutExpired and CalledProcessError do not have an attribute
-            # for message, instead generating the message by overloading
-            # __str__. workaround by just raising the base error type
-            raise subprocess.SubprocessError(msg) from None
+            process = subprocess.Popen(
+                args, cwd=cwd, text=True, bufsize=1, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                stdin=None if input is None else subprocess.PIPE
+            )
         except FileNotFoundError as e:
             # custom message
             e.strerror = 'The program cannot be found'
             e.filename = args[0]
             raise
+        # keep a reference so self.cancel can kill it
+        self._processes.add(process)
+        # reading the output blocks, so the timeout is enforced by a timer
+        # thread that kills the process
+        timed_out = threading.Event()
+        def kill():
+            timed_out.set()
+            process.kill()
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        if show:
+            # clear the text view for the new output
+            self.writeOutput('')
+        # the last lines of output, for the error message
+        tail = deque(maxlen=self.ERROR_LINES)
+        try:
+            if self._cancelled:
+                # cancelled before the process could be killed by self.cancel
+                process.kill()
+            if input is not None:
+                # write in a separate thread, otherwise both the command and
+                # this thread can block if the command outputs a lot before
+                # reading all its input
+                def write():
+                    try:
+                        process.stdin.write(input)
+                        process.stdin.close()
+                    except OSError:
+                        # command exited without reading all its input
+                        pass
+                threading.Thread(target=write, daemon=True).start()
+            for line in process.stdout:
+                tail.append(line)
+                if show:
+                    with self._output_lock:
+                        self._output.append(line)
+                yield line
+            process.wait()
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                # generator closed before the output ended
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            self._processes.discard(process)
+            if QtCore.QThread.currentThread() == self.thread():
+                # not on a worker thread, no timer to show the output
+                self.flushOutput()
+        self.checkCancelled()
+        if timed_out.is_set():
+            error = subprocess.TimeoutExpired(args, timeout)
+        elif process.returncode:
+            error = subprocess.CalledProcessError(process.returncode, args)
+        else:
+            return None
+        # something went wrong executing the function. add the console
+        # stdout to the end of the error string, then raise error again.
+        # TimeoutExpired and CalledProcessError do not have an attribute for
+        # message, instead generating the message by overloading __str__.
+        # workaround by just raising the base error type
+        msg = str(error)
+        if tail:
+            msg += (' At the moment of this error, the (last lines of the) '
+                    f'console output was:\n\n{"".join(tail)}')
+        raise subprocess.SubprocessError(msg)
+
+    def runCmd(self, args:list, input:str=None, cwd:Path=None,
+               inputs:list=None, outputs:list=None, show:bool=True) -> str:
+        '''
+        Execute the shell command sent by args. Returns the result, which is
+        also shown in the main window's output's text tab while the command
+        runs.
+
+        args should be a list of strings with individual items representing
+        arguments that would normally be spaced using spaces, eg. ls -A home/
+        is ['ls', '-A', '/home/']. The keyword input is the a string to feed to
+        stdin after the command execution. The command is run in the directory
+        cwd, by default the directory chosen in the main window. If show is
+        False, the output is not shown in the text tab.
+
+        If outputs is given, the command is only run again if it hasn't been
+        run (with the same arguments, additional flags and input) since any of
+        the files in inputs or outputs (filenames relative to cwd) last
+        changed. Otherwise, the output of the last run is returned, and the
+        status bar shows that it was cached. This can be turned off using the
+        'Force refresh' option.
+
+        Can be called from the compute function of runInThread, in which case
+        the command is killed if the user cancels the analysis (and
+        AnalysisCancelled is raised). Use runCmdIter instead to parse the
+        output while the command is running.
+        '''
+        if self.runSettings()['no_command']:
+            # don't do anything if user has set no command mode
+            return None
+        with instrumentation.phase('runCmd'):
+            return self._runCmd(args, input, cwd, inputs, outputs, show)
+
+    def _runCmd(self, args:list, input:str, cwd:Path, inputs:list,
+                outputs:list, show:bool) -> str:
+        '''
+        Does the work for runCmd.
+        '''
+        settings = self.runSettings()
+        if cwd is None:
+            cwd = settings['cwd']
+        cache = self.directoryCache(cwd)
+        if not outputs or not cache.enabled:
+            return ''.join(self.runCmdIter(args, input, cwd, show))
+
+        key = cache.makeKey('runCmd', self.addFlags(args), input)
+        files = list(inputs or []) + list(outputs)
+        record = cache.loadJson(key)
+        if record is not None and not settings['force_refresh'] \
+        and record['files'] == self._fileStamps(cwd, files):
+            self.cached.emit(f'Using cached output of {args[0]} (input files '
+                             'unchanged since last run)')
+            if show:
+                self.writeOutput(record['stdout'])
+            return record['stdout']
+        stdout = ''.join(self.runCmdIter(args, input, cwd, show))
+        cache.saveJson(key, {'stdout': stdout,
+                             'files': self._fileStamps(cwd, files)})
+        return stdout
+
+    @staticmethod
+    def _fileStamps(cwd:Path, files:list) -> list:
+        '''
+        Returns a list of the size and modification time of each file in files
+        (relative to cwd), None for missing files, as used by runCmd.
+        '''
+        stamps = []
+        for file in files:
+            try:
+                stat = (Path(cwd)/file).stat()
+                stamps.append([file, stat.st_size, stat.st_mtime_ns])
+            except OSError:
+                stamps.append([file, None, None])
+        return stamps
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the classes that allow the compute phase of an analysis to run on
+a worker thread, so that the GUI does not freeze.
+'''
+
+import traceback
+from PyQt5 import QtCore
+
+class AnalysisCancelled(Exception):
+    '''
+    Raised inside an analysis running on a worker thread when the user cancels
+    it.
+    '''
+
+class WorkerSignals(QtCore.QObject):
+    '''
+    Signals emitted by an AnalysisWorker (QRunnable is not a QObject, so it
+    can't have signals of its own). finished carries the return value of the
+    function, error carries the exception raised and its formatted traceback.
+    '''
+    finished = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(object, str)
+
+class AnalysisWorker(QtCore.QRunnable):
+    '''
+    Runs func(*args) on a thread of a QThreadPool. Connect to self.signals to
+    get the result back on the GUI thread.
+
+    func must not modify any widgets, since widgets can only be modified on the
+    GUI thread (reading their values is fine).
+    '''
+
+    def __init__(self, func:callable, *args):
+        '''
+        Constructor method.
+        '''
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.signals = WorkerSignals()
+
+    @QtCore.pyqtSlot()
+    def run(self):
+        '''
+        Executes the function. Called by the thread pool.
+        '''
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            # exceptions can't propagate out of the thread, send to GUI thread
+            self.signals.error.emit(e, traceback.format_exc())
+        else:
+            self.signals.finished.emit(result)
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the classes that draw the contour lines of a 2D plot (eg. over a
+heatmap of the density) and compute them for each frame of an animated plot
+on a background thread, and the function that computes them.
+'''
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtCore
+
+# corners (di, dj) at each end of the four edges of a cell of the grid: the
+# bottom, right, top and left edges
+EDGE_CORNERS = np.array([[(0, 0), (1, 0)], [(1, 0), (1, 1)],
+                         [(0, 1), (1, 1)], [(0, 0), (0, 1)]])
+# the line segments (as pairs of edges, -1 if none) in a cell for each case of
+# marching squares. the case is the sum of 1, 2, 4 and 8 for each of the
+# corners (0, 0), (1, 0), (1, 1) and (0, 1) at or above the level (as in
+# pyqtgraph's isocurve). cases 16 and 17 are the saddles 5 and 10 when the
+# centre of the cell is at or above the level
+SEGMENT_EDGES = np.array([
+    [(-1, -1), (-1, -1)], [(0, 3), (-1, -1)], [(0, 1), (-1, -1)], [(1, 3), (-1, -1)],
+    [(1, 2), (-1, -1)], [(0, 3), (1, 2)], [(0, 2), (-1, -1)], [(2, 3), (-1, -1)],
+    [(2, 3), (-1, -1)], [(0, 2), (-1, -1)], [(0, 1), (2, 3)], [(1, 2), (-1, -1)],
+    [(1, 3), (-1, -1)], [(0, 1), (-1, -1)], [(0, 3), (-1, -1)], [(-1, -1), (-1, -1)],
+    [(0, 1), (2, 3)], [(0, 3), (1, 2)],
+])
+# limit on the memory used by the contours kept by cachedContourSegments
+CACHE_BYTES = 128*1024**2
+# contours computed by cachedContourSegments, least recently used first
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def contourSegments(x:np.ndarray, y:np.ndarray, z:np.ndarray, levels:list) -> list:
+    '''
+    Given numpy arrays x with shape (N,), y with shape (M,) and z with shape
+    (N, M), returns the contour lines of z at each of the levels, as a list
+    with one (segments, 2, 2) array for each level: the (x, y) of the two ends
+    of each line segment.
+
+    Uses marching squares on every cell and level at once, so the cost is a
+    few passes over a (levels, N, M) array rather than a loop in python over
+    the cells of each level (as in pyqtgraph's isocurve).
+    '''
+    z = np.asarray(z)
+    levels = np.asarray(levels, dtype=float)
+    if z.shape[0] < 2 or z.shape[1] < 2 or len(levels) == 0:
+        return [np.empty((0, 2, 2)) for _ in levels]
+    above = (z >= levels[:, np.newaxis, np.newaxis]).view(np.uint8)
+    case = above[:, :-1, :-1] + 2*above[:, 1:, :-1] + 4*above[:, 1:, 1:] \
+           + 8*above[:, :-1, 1:]
+    # only the cells the contours pass through
+    k, i, j = np.nonzero((case != 0) & (case != 15))
+    case = case[k, i, j]
+    # resolve the saddles using the value at the centre of the cell
+    saddle = np.nonzero((case == 5) | (case == 10))[0]
+    centre = (z[i[saddle], j[saddle]] + z[i[saddle]+1, j[saddle]]
+              + z[i[saddle]+1, j[saddle]+1] + z[i[saddle], j[saddle]+1]) / 4
+    saddle = saddle[centre >= levels[k[saddle]]]
+    case[saddle] = np.where(case[saddle] == 5, 16, 17)
+    edges = SEGMENT_EDGES[case]
+    level_index, lines = [], []
+    for slot in range(2):
+        cells = np.nonzero(edges[:, slot, 0] >= 0)[0]
+        ends = []
+        for end in range(2):
+            corners = EDGE_CORNERS[edges[cells, slot, end]]
+            i0, j0 = i[cells] + corners[:, 0, 0], j[cells] + corners[:, 0, 1]
+            i1, j1 = i[cells] + corners[:, 1, 0], j[cells] + corners[:, 1, 1]
+            # where the level crosses the edge, by linear interpolation
+            z0 = z[i0, j0]
+            t = (levels[k[cells]] - z0) / (z[i1, j1] - z0)
+            ends.append(np.stack([x[i0] + t*(x[i1] - x[i0]),
+                                  y[j0] + t*(y[j1] - y[j0])], axis=-1))
+        level_index.append(k[cells])
+        lines.append(np.stack(ends, axis=1))
+    level_index = np.concatenate(level_index)
+    lines = np.concatenate(lines)
+    # drop segments next to NaNs
+    keep = ~np.isnan(lines).any(axis=(1, 2))
+    level_index, lines = level_index[keep], lines[keep]
+    order = np.argsort(level_index, kind='stable')
+    splits = np.searchsorted(level_index[order], np.arange(1, len(levels)))
+    return np.split(lines[order], splits)
+
+def cachedContourSegments(x:np.ndarray, y:np.ndarray, z:np.ndarray,
+                          levels:list) -> list:
+    '''
+    Returns contourSegments(x, y, z, levels), keeping the result (up to
+    CACHE_BYTES of them in total) so that the same frame and levels (eg. the
+    same cut of a PES shown again) are only computed once.
+    '''
+    digest = hashlib.blake2b()
+    for arr in (x, y, z, levels):
+        arr = np.ascontiguousarray(arr, dtype=float)
+        digest.update(str(arr.shape).encode('utf-8'))
+        digest.update(arr.tobytes())
+    key = digest.digest()
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    segments = contourSegments(x, y, z, levels)
+    with _cache_lock:
+        _cache[key] = segments
+        while len(_cache) > 1 and sum(
+            lines.nbytes for value in _cache.values() for lines in value
+        ) > CACHE_BYTES:
+            _cache.popitem(last=False)
+    return segments
+
+class ContourItem(pg.GraphicsObject):
+    '''
+    Draws the contour lines at several levels as a single item, each level
+    with its own pen. The lines are set (eg. for each frame of an animated
+    plot) using setSegments.
+    '''
+
+    def __init__(self, pens:list):
+        '''
+        Constructor method. pens are the pens of each level (anything accepted
+        by pyqtgraph's mkPen).
+        '''
+        super().__init__()
+        self.pens = [pg.mkPen(pen) for pen in pens]
+        # QPainterPath of each level
+        self.paths = []
+        self._bounds = QtCore.QRectF()
+
+    def setSegments(self, segments:list):
+        '''
+        Sets the lines drawn, given as a list with one (segments, 2, 2) array
+        for each level (see contourSegments).
+        '''
+        self.prepareGeometryChange()
+        self.paths = []
+        self._bounds = QtCore.QRectF()
+        for pen, lines in zip(self.pens, segments):
+            if len(lines) == 0:
+                continue
+            path = pg.arrayToQPath(lines[..., 0].ravel(), lines[..., 1].ravel(),
+                                   connect='pairs')
+            self.paths.append((pen, path))
+            self._bounds = self._bounds.united(path.boundingRect())
+        self.update()
+
+    def boundingRect(self) -> QtCore.QRectF:
+        '''
+        Returns the rectangle containing all the lines.
+        '''
+        return self._bounds
+
+    def paint(self, painter, *args):
+        '''
+        Draws the lines of each level with its pen.
+        '''
+        for pen, path in self.paths:
+            painter.setPen(pen)
+            painter.drawPath(path)
+
+class ContourCache(QtCore.QObject):
+    '''
+    Computes the contour lines (see contourSegments) of each frame of an
+    animated 2D plot at a set of levels, and keeps the most recently used
+    max_frames of them so that the contours of a frame are only computed once
+    while scrubbing back and forth. They are also kept by
+    cachedContourSegments, so plotting the same frames and levels again
+    reuses them.
+
+    cache[i] returns the contours of frame i, computing them if needed. get
+    returns them only if they have been computed, otherwise it starts
+    computing them on a background thread and ready is emitted (in the GUI
+    thread) with the index of the frame once they have been.
+    '''
+    ready = QtCore.pyqtSignal(int)
+
+    def __init__(self, x:np.ndarray, y:np.ndarray, frames:np.ndarray, levels:list,
+                 max_frames:int=256, parent:QtCore.QObject=None):
+        '''
+        Constructor method. frames is a (frames, N, M) array of z, see
+        contourSegments.
+        '''
+        super().__init__(parent)
+        self.x = x
+        self.y = y
+        self.frames = frames
+        self.levels = levels
+        self.max_frames = max_frames
+        # contours computed so far, least recently used first
+        self._segments = OrderedDict()
+        # contours being computed in the background, as futures
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def __getitem__(self, i:int) -> list:
+        '''
+        Returns the contours of frame i, computing them if they have not been
+        already.
+        '''
+        with self._lock:
+            if i in self._segments:
+                self._segments.move_to_end(i)
+                return self._segments[i]
+            future = self._pending.get(i)
+        if future is not None:
+            # already being computed in the background
+            return future.result()
+        return self._compute(i)
+
+    def get(self, i:int) -> list:
+        '''
+        Returns the contours of frame i, or None if they are still being
+        computed.
+        '''
+        with self._lock:
+            if i in self._segments:
+                self._segments.move_to_end(i)
+                return self._segments[i]
+        self.prefetch([i])
+        return None
+
+    def prefetch(self, frames:range):
+        '''
+        Starts computing the contours of the frames given (eg. the next few
+        while an animation is playing), if they have not been already.
+        '''
+        if self._executor is None:
+            return None
+        for i in frames:
+            if not 0 <= i < len(self.frames):
+                continue
+            with self._lock:
+                if i in self._segments or i in self._pending:
+                    continue
+                self._pending[i] = self._executor.submit(self._compute, i, True)
+        return None
+
+    def close(self):
+        '''
+        Stops computing contours in the background.
+        '''
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _compute(self, i:int, emit:bool=False) -> list:
+        '''
+        Computes the contours of frame i and keeps them, removing the least
+        recently used if there are more than max_frames. If emit, emits ready
+        once they have been computed.
+        '''
+        try:
+            segments = cachedContourSegments(self.x, self.y, self.frames[i], self.levels)
+        finally:
+            with self._lock:
+                self._pending.pop(i, None)
+        with self._lock:
+            self._segments[i] = segments
+            self._segments.move_to_end(i)
+            while len(self._segments) > self.max_frames:
+                self._segments.popitem(last=False)
+        if emit:
+            try:
+                self.ready.emit(i)
+            except RuntimeError:
+                # the cache was deleted while computing
+                pass
+        return segments
@@ -47,6 +47,15 @@ class CoordinateSelector(QtWidgets.QWidget):
 
         Invoke using str(<this widget>).
         '''
+        return self.cut()
+
+    def cut(self, values:dict=None) -> str:
+        '''
+        Returns the same as str(), except that each DOF in values (a dict of
+        mode label: value) is given that value instead of the one selected
+        by the user, eg. to sweep over the values of one DOF.
+        '''
+        values = values or {}
         x_selected = False
         out = ''
         for i in range(self.layout().count()):
@@ -57,7 +66,9 @@ class CoordinateSelector(QtWidgets.QWidget):
                 # this means the widget only contains a label saying
                 # input/modes not found -> return empty string
                 return ''
-            if select.currentIndex() == 2:
+            if label.text() in values:
+                out += f'{label.text()} {float(values[label.text()])}\n'
+            elif select.currentIndex() == 2:
                 out += f'{label.text()} {value.value()}\n'
             else:
                 if select.currentIndex() == 0:
@@ -13,7 +13,10 @@ import subprocess
 import numpy as np
 import pyqtgraph as pg
 import pyqtgraph.exporters
-from PyQt5 import QtWidgets, QtCore, QtGui
+from PyQt5 import QtWidgets, QtCore
+from . import instrumentation
+from .contours import ContourItem, cachedContourSegments
+from .lod_curve import LODPlotDataItem
 
 class CustomPlotWidget(pg.PlotWidget):
     '''
@@ -81,6 +84,8 @@ class CustomPlotWidget(pg.PlotWidget):
         )
         # hide until a contour plot is plotted
         self.colourbar.hide()
+        # lookup table shared by every image (heatmap) plotted, see plotImage
+        self.lut = self.colourmap.getLookupTable(nPts=256)
 
     @QtCore.pyqtSlot()
     def changePlotTitle(self):
@@ -237,32 +242,83 @@ class CustomPlotWidget(pg.PlotWidget):
                     value = (value,)
                 self.setLabel(key, *value, color='k')
 
-    def plotContours(self, x:np.array, y:np.array, z:np.array, levels:int|list):
+    def plot(self, *args, **kwargs) -> pg.PlotDataItem:
+        '''
+        Plots a line, see pyqtgraph's PlotItem.plot. Overriden so that lines
+        with a large number of points are drawn at a level of detail that
+        depends on the zoom (see LODPlotDataItem), and so that the time spent
+        plotting is recorded by the instrumentation.
+        '''
+        with instrumentation.phase('pyqtgraph'):
+            item = LODPlotDataItem(*args, **kwargs)
+            self.getPlotItem().addItem(item)
+            return item
+
+    def plotContours(self, x:np.array, y:np.array, z:np.array,
+                     levels:int|list) -> ContourItem:
         '''
         Given numpy arrays x with shape (N,), y with shape (M,) and z with
-        shape (M, N), plots a contour graph. Shows a colourbar to the side.
+        shape (N, M), plots a contour graph. Shows a colourbar to the side.
 
         If levels is an integer, plots n_level contour lines with levels
         ranging from min(z) to max(z). If it is a list, the contour lines are
         plotted for the levels given in the list.
+
+        The lines of every level are computed together (see contourSegments)
+        and drawn by a single ContourItem, which is returned so that the lines
+        of each frame of an animated plot can be shown with setSegments.
+        '''
+        with instrumentation.phase('pyqtgraph'):
+            return self._plotContours(x, y, z, levels)
+
+    def _plotContours(self, x:np.array, y:np.array, z:np.array,
+                      levels:int|list) -> ContourItem:
+        '''
+        Does the work for plotContours.
         '''
         if isinstance(levels, int):
             levels = np.linspace(z.min(), z.max(), levels)
         colours = self.colourmap.getLookupTable(nPts=len(levels), mode=pg.ColorMap.QCOLOR)
-        # a single contour line is known as an isocurve in pyqtgraph. it does
-        # not accept x or y values, only the data (z). to display it properly
-        # we need to transform it using QtGui.QTransform first.
-        tr = QtGui.QTransform()
-        tr.translate(x.min(), y.min())
-        tr.scale((x.max() - x.min()) / np.shape(z)[0],
-                 (y.max() - y.min()) / np.shape(z)[1])
-        # create the isocurves, transforming each one
-        for i in range(len(levels)):
-            c = pg.IsocurveItem(data=z, level=levels[i], pen=colours[i])
-            c.setTransform(tr)
-            self.getPlotItem().addItem(c)
+        item = ContourItem(colours)
+        item.setSegments(cachedContourSegments(x, y, z, levels))
+        self.getPlotItem().addItem(item)
         # automatically set axis limits may not be correct - set manually just
         # in case
         self.setRange(xRange=[x.min(), x.max()], yRange=[y.min(), y.max()], padding=0)
         self.colourbar.setLevels((levels[0], levels[-1]))
         self.colourbar.show()
+        return item
+
+    def plotImage(self, x:np.array, y:np.array, z:np.array, levels:tuple) -> pg.ImageItem:
+        '''
+        Given numpy arrays x with shape (N,), y with shape (M,) and z with
+        shape (N, M), plots z as an image (a heatmap) using the colour map
+        between the fixed levels (min, max), and shows a colourbar to the
+        side. x and y should be evenly spaced.
+
+        Returns the ImageItem, so that each frame of an animated plot can be
+        shown with image.setImage(z, autoLevels=False), which keeps the same
+        levels and so is much faster than replotting contours.
+        '''
+        with instrumentation.phase('pyqtgraph'):
+            image = pg.ImageItem(z, levels=levels, lut=self.lut, autoLevels=False)
+            # centre each pixel on its x and y
+            dx = (x.max() - x.min()) / max(len(x) - 1, 1)
+            dy = (y.max() - y.min()) / max(len(y) - 1, 1)
+            image.setRect(QtCore.QRectF(x.min() - dx/2, y.min() - dy/2,
+                                        len(x)*dx, len(y)*dy))
+            self.getPlotItem().addItem(image)
+            self.setRange(xRange=[x.min(), x.max()], yRange=[y.min(), y.max()], padding=0)
+            self.colourbar.setLevels(levels)
+            self.colourbar.show()
+            return image
+
+    def plotContourLines(self, levels:list, pen=(0, 0, 0, 120)) -> ContourItem:
+        '''
+        Adds an empty ContourItem to the plot, for contour lines at each of the
+        levels drawn with the same pen (eg. over an image from plotImage).
+        Set the lines with ContourItem.setSegments.
+        '''
+        item = ContourItem([pen]*len(levels))
+        self.getPlotItem().addItem(item)
+        return item
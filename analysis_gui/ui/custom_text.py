@@ -8,6 +8,7 @@ widget.
 
 from math import isfinite
 from PyQt5 import QtWidgets, QtCore
+from . import instrumentation
 
 class CustomTextWidget(QtWidgets.QPlainTextEdit):
     '''
@@ -92,6 +93,14 @@ class CustomTextWidget(QtWidgets.QPlainTextEdit):
         and post are strings that are printed before and after the table,
         respectively.
         '''
+        with instrumentation.phase('text'):
+            self._writeTable(table, header, colwidth, pre, post)
+
+    def _writeTable(self, table:list, header:list, colwidth:int, pre:str,
+                    post:str):
+        '''
+        Does the work for writeTable.
+        '''
         if colwidth < 8:
             raise ValueError('colwidth cannot be lower than 8')
         # obtain border length, the number of hyphens to section off
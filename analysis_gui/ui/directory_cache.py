@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the single class that provides a cache of files in a directory of
+Quantics output files.
+'''
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+class DirectoryCache:
+    '''
+    A cache of files kept in a hidden folder (named DirectoryCache.DIRNAME)
+    inside a directory of Quantics output files. Each file in the cache is
+    named using a key, which should be made from everything the file depends
+    on using DirectoryCache.makeKey.
+
+    When the total size of the files in the cache exceeds max_size bytes, the
+    least recently used files are removed (apart from a file just stored, so
+    that it can always be read, even if it is larger than max_size on its
+    own). The modification time of a file in the cache is used to record when
+    it was last used.
+    '''
+    DIRNAME = '.analysis_cache'
+
+    def __init__(self, directory:str|Path, max_size:int):
+        '''
+        Constructor method. directory should be the directory of Quantics
+        output files (not the cache folder itself). A max_size of zero disables
+        the cache.
+        '''
+        self.path = Path(directory)/self.DIRNAME
+        self.max_size = max_size
+
+    @staticmethod
+    def makeKey(*parts) -> str:
+        '''
+        Returns a key (a hex digest) made from parts, which should have a
+        deterministic repr() (eg. strings, numbers, tuples of these).
+        '''
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def fileStamp(filepath:str|Path) -> tuple:
+        '''
+        Returns a tuple identifying the current state of a file: its absolute
+        path, size, and modification time. Include this in a key to invalidate
+        a cached file when the file it was made from changes.
+        '''
+        stat = Path(filepath).stat()
+        return (str(Path(filepath).resolve()), stat.st_size, stat.st_mtime_ns)
+
+    @property
+    def enabled(self) -> bool:
+        '''
+        Whether the cache can be used.
+        '''
+        return self.max_size > 0
+
+    def get(self, name:str) -> Path:
+        '''
+        Returns the path of the file in the cache called name, marking it as
+        recently used. Returns None if it is not in the cache.
+        '''
+        filepath = self.path/name
+        if not self.enabled or not filepath.is_file():
+            return None
+        try:
+            os.utime(filepath)
+        except OSError:
+            # read-only directory, file is still usable
+            pass
+        return filepath
+
+    def loadArray(self, key:str) -> np.ndarray:
+        '''
+        Returns the numpy array stored under key as a read-only memory-mapped
+        array, or None if it is not in the cache.
+        '''
+        filepath = self.get(f'{key}.npy')
+        if filepath is None:
+            return None
+        try:
+            return np.load(filepath, mmap_mode='r', allow_pickle=False)
+        except (OSError, ValueError):
+            # corrupted file: treat as a cache miss
+            return None
+
+    def saveArray(self, key:str, arr:np.ndarray):
+        '''
+        Stores the numeric numpy array arr under key, then removes the least
+        recently used files if the cache is too large. Does nothing if the
+        cache is disabled or cannot be written to.
+        '''
+        return self._save(f'{key}.npy', lambda s: np.save(s, arr, allow_pickle=False))
+
+    def loadJson(self, key:str):
+        '''
+        Returns the object stored under key using saveJson, or None if it is
+        not in the cache.
+        '''
+        filepath = self.get(f'{key}.json')
+        if filepath is None:
+            return None
+        try:
+            with open(filepath, mode='r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # corrupted file: treat as a cache miss
+            return None
+
+    def saveJson(self, key:str, obj):
+        '''
+        Stores obj, which must be serialisable as JSON, under key. See
+        saveArray.
+        '''
+        data = json.dumps(obj).encode('utf-8')
+        return self._save(f'{key}.json', lambda s: s.write(data))
+
+    def _save(self, name:str, write:callable):
+        '''
+        Does the work for saveArray and saveJson. Creates the file in the cache
+        called name, using write(s) where s is the file opened in binary mode.
+        '''
+        if not self.enabled:
+            return None
+        filepath = self.path/name
+        # write into a temporary file first so another instance of the GUI
+        # (or another analysis in this one) can never read a half-written file
+        temp = self.path/f'{name}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            self.path.mkdir(exist_ok=True)
+            with open(temp, mode='wb') as s:
+                write(s)
+            os.replace(temp, filepath)
+        except OSError:
+            temp.unlink(missing_ok=True)
+            return None
+        self.evict(keep=[name])
+        return None
+
+    def evict(self, keep:list=()):
+        '''
+        Removes the least recently used files in the cache until the total
+        size of the cache is at most self.max_size. The files called the names
+        in keep (eg. ones just stored, which are yet to be read) are not
+        removed, even if the cache is still too large.
+        '''
+        try:
+            files = [(f.stat(), f) for f in self.path.iterdir() if f.is_file()]
+        except OSError:
+            return None
+        # most recently used first
+        files.sort(key=lambda x: x[0].st_mtime_ns, reverse=True)
+        total = 0
+        for stat, f in files:
+            total += stat.st_size
+            if total > self.max_size and f.name not in keep:
+                f.unlink(missing_ok=True)
+        return None
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the single class that reads the lines added to the end of a file
+that is still being written, eg. by a running Quantics propagation.
+'''
+
+import os
+
+class FileFollower:
+    '''
+    Remembers how far through a file has been read (as a byte offset), so that
+    only the lines added since can be read. A partly written last line is left
+    until it is complete.
+    '''
+    # size of the blocks read backwards when looking for the last line
+    BLOCK_SIZE = 65536
+
+    def __init__(self, filepath, offset:int=None):
+        '''
+        Constructor method. offset is the byte offset to start reading from,
+        by default the end of the last complete line in the file (ie. only
+        lines added after this are read).
+        '''
+        self.filepath = filepath
+        stat = os.stat(filepath)
+        # identifies the file, to notice if it is replaced rather than added to
+        self.inode = (stat.st_dev, stat.st_ino)
+        self.offset = self._lastLineEnd(stat.st_size) if offset is None else offset
+
+    def read(self) -> str:
+        '''
+        Returns the complete lines added to the file since the last read, or an
+        empty string if there are none. Raises ValueError if the file has been
+        replaced or made shorter, since the lines read before are no longer
+        in it.
+        '''
+        stat = os.stat(self.filepath)
+        if (stat.st_dev, stat.st_ino) != self.inode or stat.st_size < self.offset:
+            raise ValueError(f'{self.filepath} has been overwritten')
+        if stat.st_size == self.offset:
+            return ''
+        with open(self.filepath, mode='rb') as f:
+            f.seek(self.offset)
+            new = f.read(stat.st_size - self.offset)
+        # leave a partly written last line for next time
+        new = new[:new.rfind(b'\n') + 1]
+        self.offset += len(new)
+        return new.decode('utf-8')
+
+    @staticmethod
+    def lineEnd(txt:str) -> int:
+        '''
+        Returns the byte offset just after the last complete line in txt, the
+        contents of a file that has already been read. Use this as the offset
+        to follow the file from.
+        '''
+        return len(txt[:txt.rfind('\n') + 1].encode('utf-8'))
+
+    def _lastLineEnd(self, size:int) -> int:
+        '''
+        Returns the byte offset just after the last newline in the first size
+        bytes of the file (0 if there is none).
+        '''
+        with open(self.filepath, mode='rb') as f:
+            end = size
+            while end > 0:
+                start = max(end - self.BLOCK_SIZE, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline != -1:
+                    return start + newline + 1
+                end = start
+        return 0
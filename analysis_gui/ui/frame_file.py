@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the single class that reads the frames (time intervals) of a
+Quantics output file on demand, so that large animated plots can be shown
+without reading the whole file.
+'''
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import threading
+
+import numpy as np
+from .analysis_tab import AnalysisTab
+from .directory_cache import DirectoryCache
+
+class FrameFile:
+    '''
+    A grid of floats in a file (eg. the output of showd1d -T) split into frames
+    by a key column (eg. time): a frame is a block of consecutive rows with the
+    same key. Every frame must have the same grid, ie. the same number of rows
+    and the same values in grid_column.
+
+    When created, the file is scanned once for the byte offset at which each
+    frame starts, and it can be scanned again for new frames using refresh.
+    The offsets are kept in the directory cache (see DirectoryCache) in the
+    same directory as the file, so the scan is only repeated if the file
+    changes. Frames are then parsed when they are indexed, eg. frame_file[i]
+    is a (points, columns) array, and the most recently used frames are kept
+    in memory, up to max_bytes. If the whole file has already been read and
+    checked (eg. by AnalysisSystem.den1dFrames), the (frames, points, columns)
+    array can be given as frames, and frame_file[i] is then a view of it.
+
+    The frames can be read ahead of time on a background thread using
+    prefetch, and np.asarray(frame_file) reads every frame into one
+    (frames, points, columns) array, eg. to save it.
+    '''
+
+    # fields of the index of the frames in the file, see _scan
+    INDEX_DTYPE = [('offset', 'i8'), ('key', 'f8'), ('rows', 'i8')]
+
+    def __init__(self, filepath, key_column:int=1, grid_column:int=0,
+                 floats_per_line:int=None, ignore_regex:str=None,
+                 cache:DirectoryCache=None, max_bytes:int=64*1024**2,
+                 frames:np.ndarray=None):
+        '''
+        Constructor method. Scans the file for frames (or loads the scan from
+        cache) and reads the first frame, unless frames is given. Raises
+        ValueError if there are no frames in the file.
+        '''
+        self.filepath = filepath
+        self.key_column = key_column
+        self.grid_column = grid_column
+        self.floats_per_line = floats_per_line
+        self.ignore_regex = ignore_regex
+        self.max_bytes = max_bytes
+        self.index = self._loadIndex(cache)
+        if len(self.index) < 2:
+            raise ValueError(f'No data found in {filepath}')
+        # frames read so far, least recently used first
+        self._frames = OrderedDict()
+        # frames being read in the background, as futures
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        # frames of the whole file, read before it was scanned (any frames
+        # added since are read from the file)
+        self._whole = None if frames is None else frames[:len(self)]
+        # the first frame sets the grid that all the others must have
+        if self._whole is not None and len(self._whole):
+            self.first = self._whole[0]
+        else:
+            self.first = self._readFrame(0)
+            self._frames[0] = self.first
+
+    @property
+    def times(self) -> np.ndarray:
+        '''
+        The key (eg. time) of each frame.
+        '''
+        return self.index['key'][:len(self)]
+
+    def __len__(self) -> int:
+        '''
+        Returns the number of frames. A last frame with fewer rows than the
+        first is assumed to still be being written, so is not counted.
+        '''
+        n_frames = len(self.index) - 1
+        if n_frames > 1 and self.index['rows'][n_frames-1] < self.index['rows'][0]:
+            n_frames -= 1
+        return n_frames
+
+    def __getitem__(self, i:int) -> np.ndarray:
+        '''
+        Returns frame i as a read-only (points, columns) array, reading it from
+        the file if it is not in memory.
+        '''
+        i = range(len(self))[i]
+        with self._lock:
+            if self._whole is not None and i < len(self._whole):
+                return self._whole[i]
+            if i in self._frames:
+                self._frames.move_to_end(i)
+                return self._frames[i]
+            future = self._pending.get(i)
+        if future is not None:
+            # already being read ahead
+            return future.result()
+        return self._load(i)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        '''
+        Returns every frame in one (frames, points, columns) array.
+        '''
+        if self._whole is not None and len(self._whole) == len(self):
+            return np.asarray(self._whole, dtype=dtype)
+        arr = np.empty((len(self),) + self.first.shape, dtype=dtype or self.first.dtype)
+        for i in range(len(self)):
+            with self._lock:
+                if self._whole is not None and i < len(self._whole):
+                    frame = self._whole[i]
+                else:
+                    frame = self._frames.get(i)
+            # don't fill the cache of recently used frames with every frame
+            arr[i] = self._readFrame(i) if frame is None else frame
+        return arr
+
+    def refresh(self) -> int:
+        '''
+        Scans any rows added to the end of the file since it was last scanned
+        (eg. by a program that is still running), returning the number of new
+        frames. Raises ValueError if the file has become shorter.
+        '''
+        end = self.index['offset'][-1]
+        size = os.stat(self.filepath).st_size
+        if size < end:
+            raise ValueError(f'{self.filepath} has been overwritten')
+        if size == end:
+            return 0
+        n_frames = len(self)
+        # scan again from the start of the last frame, which may have been
+        # incomplete
+        last = len(self.index) - 2
+        tail = self._scan(self.index['offset'][last])
+        if len(tail) == 0:
+            return 0
+        with self._lock:
+            self.index = np.concatenate([self.index[:last], tail])
+            self._frames.pop(last, None)
+            if self._whole is not None:
+                self._whole = self._whole[:last]
+        return len(self) - n_frames
+
+    def prefetch(self, frames:range):
+        '''
+        Reads the frames given (eg. the next few while an animation is playing)
+        on a background thread, if they are not already in memory.
+        '''
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        for i in frames:
+            if not 0 <= i < len(self) or \
+            (self._whole is not None and i < len(self._whole)):
+                continue
+            with self._lock:
+                if i in self._frames or i in self._pending:
+                    continue
+                self._pending[i] = self._executor.submit(self._load, i)
+
+    def close(self):
+        '''
+        Stops reading frames in the background.
+        '''
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _load(self, i:int) -> np.ndarray:
+        '''
+        Reads frame i and keeps it in memory, removing the least recently used
+        frames if over max_bytes.
+        '''
+        try:
+            frame = self._readFrame(i)
+        finally:
+            with self._lock:
+                self._pending.pop(i, None)
+        with self._lock:
+            self._frames[i] = frame
+            self._frames.move_to_end(i)
+            while len(self._frames) > 1 and \
+            len(self._frames)*frame.nbytes > self.max_bytes:
+                self._frames.popitem(last=False)
+        return frame
+
+    def _readFrame(self, i:int) -> np.ndarray:
+        '''
+        Parses frame i from the file. Raises ValueError if its grid is not the
+        same as that of the first frame.
+        '''
+        start, end = self.index['offset'][i:i+2]
+        with open(self.filepath, mode='rb') as f:
+            f.seek(start)
+            lines = f.read(end - start).decode('utf-8').split('\n')
+        frame = AnalysisTab.readFloats(lines, self.floats_per_line, self.ignore_regex)
+        frame.flags.writeable = False
+        if i > 0 and (frame.shape != self.first.shape or not np.array_equal(
+            frame[:, self.grid_column], self.first[:, self.grid_column]
+        )):
+            raise ValueError(f'Frame {i} of {self.filepath} has a different '
+                             f'grid to the first frame')
+        return frame
+
+    def _loadIndex(self, cache:DirectoryCache) -> np.ndarray:
+        '''
+        Returns the index of the frames in the file, from the cache if it has
+        been made before, see _scan.
+        '''
+        if cache is None or not cache.enabled:
+            return self._scan()
+        key = cache.makeKey('FrameFile', self.INDEX_DTYPE, cache.fileStamp(self.filepath),
+                            self.key_column, self.ignore_regex)
+        index = cache.loadArray(key)
+        if index is None:
+            index = self._scan()
+            cache.saveArray(key, index)
+        return np.array(index)
+
+    def _scan(self, start:int=0) -> np.ndarray:
+        '''
+        Scans the file once from byte offset start (which should be the start
+        of a line), returning a structured array with the byte offset, key and
+        number of rows of each frame. The last element is the end of the scan
+        (with a NaN key), so frame i is between index[i] and index[i+1]. A
+        partly written last line is not included.
+        '''
+        ignore = re.compile(self.ignore_regex.encode('utf-8')) \
+                 if self.ignore_regex else None
+        offsets, keys, rows = [], [], []
+        previous = None
+        offset = start
+        with open(self.filepath, mode='rb') as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # still being written
+                    break
+                cells = line.split()
+                if len(cells) > self.key_column and \
+                (ignore is None or not ignore.search(line)):
+                    # the key is compared as text, which is the same for every
+                    # row of a frame since they are written with the same format
+                    if cells[self.key_column] == previous:
+                        rows[-1] += 1
+                    else:
+                        try:
+                            keys.append(float(cells[self.key_column]))
+                            offsets.append(offset)
+                            rows.append(1)
+                            previous = cells[self.key_column]
+                        except ValueError:
+                            # not a row of floats, ignore it like readFloats does
+                            pass
+                offset += len(line)
+        index = np.empty(len(offsets) + 1 if offsets else 0, dtype=self.INDEX_DTYPE)
+        if offsets:
+            index['offset'] = offsets + [offset]
+            index['key'] = keys + [np.nan]
+            index['rows'] = rows + [0]
+        return index
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the class that records how long each phase of an analysis takes
+(eg. running the Quantics program, reading files, plotting) and how much
+memory it uses, and the functions used to mark the phases in the code.
+
+Phases are marked using
+
+    with instrumentation.phase('readFloats'):
+        ...
+
+which does nothing unless a Profile has been activated in the current thread
+with instrumentation.activate, so it is cheap to leave in the code.
+'''
+
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from time import perf_counter
+import json
+import os
+import platform
+import threading
+import tracemalloc
+
+import numpy as np
+from PyQt5 import QtCore
+
+# the profile active in each thread, and the stack of phases in that thread
+_local = threading.local()
+
+class Profile:
+    '''
+    Records the wall time, CPU time (of this process and the programs it runs)
+    and peak memory (traced by tracemalloc, if it is tracing) of each phase of
+    one analysis. Phases can be nested, and can be recorded from several
+    threads (eg. the GUI thread and a worker thread). Peak memory is that of
+    the whole process, so it is only exact when one phase runs at a time.
+    '''
+
+    def __init__(self, name:str, directory:str=''):
+        '''
+        Constructor method. name is the name of the analysis, directory the
+        directory of Quantics files it is run in.
+        '''
+        self.name = name
+        self.directory = str(directory)
+        self.start = perf_counter()
+        self.date = datetime.now().isoformat(timespec='seconds')
+        # list of dicts, one for each phase in the order they finished
+        self.phases = []
+        self.data_size = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name:str):
+        '''
+        Context manager recording the phase called name. A phase nested in a
+        phase with the same name (eg. readFloats called by readFloatsParallel)
+        is not recorded separately.
+        '''
+        stack = _stack()
+        if any(frame['name'] == name for frame in stack):
+            yield None
+            return
+        tracing = tracemalloc.is_tracing()
+        frame = {'name': name, 'depth': len(stack), 'peak': 0}
+        if tracing:
+            # the peak is reset for this phase, so first record the peak so far
+            # in the phases this one is nested in
+            current, peak = tracemalloc.get_traced_memory()
+            for outer in stack:
+                outer['peak'] = max(outer['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['start_memory'] = current
+        stack.append(frame)
+        times = os.times()
+        wall = perf_counter()
+        try:
+            yield frame
+        finally:
+            wall = perf_counter() - wall
+            end_times = os.times()
+            stack.pop()
+            # cpu time includes any programs run (and waited for) by runCmd
+            cpu = sum(end_times[i] - times[i] for i in range(4))
+            peak = None
+            if tracing and tracemalloc.is_tracing():
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                for outer in stack:
+                    outer['peak'] = max(outer['peak'], peak)
+                # peak memory used by the phase, on top of what was used before
+                peak = max(peak - frame['start_memory'], 0)
+            with self._lock:
+                self.phases.append({'name': name, 'depth': frame['depth'],
+                                    'thread': threading.current_thread().name,
+                                    'wall': wall, 'cpu': cpu, 'peak': peak})
+
+    def finish(self, data=None):
+        '''
+        Marks the end of the analysis. data is the data plotted (ie.
+        self.window().data), whose size is recorded.
+        '''
+        self.wall = perf_counter() - self.start
+        if isinstance(data, np.ndarray):
+            self.data_size = data.nbytes
+        elif isinstance(data, (list, tuple)):
+            self.data_size = sum(getattr(item, 'nbytes', 0) for item in data)
+
+    def summary(self) -> dict:
+        '''
+        Returns a dict of the total wall time, CPU time, and peak memory of
+        each phase name (summed over phases with the same name).
+        '''
+        totals = {}
+        with self._lock:
+            for phase in self.phases:
+                total = totals.setdefault(phase['name'], {
+                    'depth': phase['depth'], 'count': 0, 'wall': 0.0,
+                    'cpu': 0.0, 'peak': None
+                })
+                total['depth'] = min(total['depth'], phase['depth'])
+                total['count'] += 1
+                total['wall'] += phase['wall']
+                total['cpu'] += phase['cpu']
+                if phase['peak'] is not None:
+                    total['peak'] = max(total['peak'] or 0, phase['peak'])
+        return totals
+
+    def text(self) -> str:
+        '''
+        Returns a one line summary of the phases, for the status bar.
+        '''
+        parts = [f'{name} {total["wall"]:.3g} s'
+                 for name, total in self.summary().items()]
+        return f'{self.name}: {self.wall:.3g} s (' + ', '.join(parts) + ')'
+
+    def table(self) -> str:
+        '''
+        Returns a table of the phases, one on each line, nested phases
+        indented.
+        '''
+        lines = [f'{self.name} in {self.directory}',
+                 f'{"phase":<24}{"count":>6}{"wall (s)":>12}{"cpu (s)":>12}'
+                 f'{"peak (MB)":>12}']
+        for name, total in self.summary().items():
+            peak = '' if total['peak'] is None else f'{total["peak"]/1024**2:.1f}'
+            lines.append(f'{"  "*total["depth"] + name:<24}{total["count"]:>6}'
+                         f'{total["wall"]:>12.4f}{total["cpu"]:>12.4f}{peak:>12}')
+        lines.append(f'{"total":<24}{"":>6}{self.wall:>12.4f}')
+        if self.data_size is not None:
+            lines.append(f'data size {self.data_size/1024**2:.1f} MB')
+        return '\n'.join(lines)
+
+    def toJson(self) -> str:
+        '''
+        Returns the profile as one line of JSON, for a JSON-lines log.
+        '''
+        return json.dumps({
+            'date': self.date, 'analysis': self.name,
+            'directory': self.directory, 'wall': self.wall,
+            'data_size': self.data_size, 'phases': self.phases,
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'qt': QtCore.QT_VERSION_STR,
+        })
+
+def _stack() -> list:
+    '''
+    Returns the stack of phases in the current thread.
+    '''
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+@contextmanager
+def activate(profile:Profile):
+    '''
+    Context manager that makes phases in the current thread be recorded in
+    profile. Does nothing if profile is None.
+    '''
+    previous = getattr(_local, 'profile', None)
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+
+def phase(name:str):
+    '''
+    Returns a context manager recording the phase called name in the profile
+    active in the current thread, or one that does nothing if there is none.
+    '''
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return nullcontext()
+    return profile.phase(name)
+
+def current() -> Profile:
+    '''
+    Returns the profile active in the current thread (None if there is none),
+    eg. to activate it in another thread.
+    '''
+    return getattr(_local, 'profile', None)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the classes that draw curves with a large number of points at a
+level of detail that depends on how far the plot is zoomed in, so that the
+cost of drawing depends on the width of the plot in pixels rather than the
+number of points.
+'''
+
+import numpy as np
+import pyqtgraph as pg
+
+class LODPyramid:
+    '''
+    Min/max decimation of a curve y(x), with x in increasing order, at several
+    levels of detail. At level k the points are split into bins of
+    FACTOR**k consecutive points, and only the points with the minimum and
+    maximum y in each bin are kept, so peaks stay visible however far the
+    curve is decimated.
+
+    The levels are computed once, each from the level below, in O(points)
+    time overall. select then returns the points to draw for a range of x.
+    '''
+    # number of bins of one level combined into each bin of the next level
+    FACTOR = 4
+
+    def __init__(self, x:np.ndarray, y:np.ndarray):
+        '''
+        Constructor method. Computes every level of the pyramid.
+        '''
+        self.x = x
+        self.y = y
+        # list of (imin, imax) for levels 1, 2, ..., the indices of the points
+        # with the minimum and maximum y in each bin
+        self.levels = []
+        imin = imax = np.arange(len(y))
+        while len(imin) > 1:
+            imin = self._reduce(imin, np.argmin)
+            imax = self._reduce(imax, np.argmax)
+            self.levels.append((imin, imax))
+
+    def _reduce(self, indices:np.ndarray, arg:callable) -> np.ndarray:
+        '''
+        Combines each FACTOR consecutive indices into the one of the point with
+        the minimum (arg is np.argmin) or maximum (np.argmax) y.
+        '''
+        # repeat the last index to fill the last bin
+        pad = -len(indices) % self.FACTOR
+        groups = np.pad(indices, (0, pad), mode='edge').reshape(-1, self.FACTOR)
+        best = arg(self.y[groups], axis=1)
+        return groups[np.arange(len(groups)), best]
+
+    def select(self, x_min:float, x_max:float, max_points:int) -> tuple:
+        '''
+        Returns (level, indices), where indices are the indices of at most
+        about max_points points to draw for the part of the curve between
+        x_min and x_max (and the points either side), from the least
+        decimated level that has few enough points. Level 0 is all the points.
+        '''
+        start = max(np.searchsorted(self.x, x_min, side='left') - 1, 0)
+        stop = min(np.searchsorted(self.x, x_max, side='right') + 1, len(self.x))
+        if stop - start <= max_points:
+            return 0, np.arange(start, stop)
+        for level, (imin, imax) in enumerate(self.levels, start=1):
+            size = self.FACTOR**level
+            if 2*(stop - start)/size <= max_points or level == len(self.levels):
+                break
+        bins = slice(start//size, (stop - 1)//size + 1)
+        first = np.minimum(imin[bins], imax[bins])
+        second = np.maximum(imin[bins], imax[bins])
+        # draw the minimum and maximum of each bin in the order they occur
+        return level, np.column_stack([first, second]).ravel()
+
+class LODPlotDataItem(pg.PlotDataItem):
+    '''
+    PlotDataItem that draws a curve of more than MIN_POINTS points (with x in
+    increasing order) using a LODPyramid, picking the level of detail from
+    the visible range of x and the width of the plot whenever the view
+    changes. Other curves, and curves with stepMode or a connect array, are
+    drawn as normal.
+
+    The level of detail only applies to drawing: the full curve stays the
+    data of the item (eg. for getData and the exporters), and only the
+    PlotCurveItem that draws it (self.curve) is given the points needed.
+    '''
+    # curves with fewer points are drawn in full
+    MIN_POINTS = 20000
+    # points drawn per pixel of the width of the plot (one min and one max)
+    POINTS_PER_PIXEL = 2
+
+    def __init__(self, *args, **kwargs):
+        '''
+        Constructor method, see pyqtgraph's PlotDataItem.
+        '''
+        self.lod = None
+        self._selected = None
+        super().__init__(*args, **kwargs)
+
+    def updateItems(self, styleUpdate:bool=True):
+        '''
+        Updates the curve drawn when the data or style changes, see pyqtgraph's
+        PlotDataItem.updateItems. Makes the level of detail pyramid of the data
+        shown (after eg. log mode) if the curve is large enough, and draws
+        only the points needed.
+        '''
+        super().updateItems(styleUpdate)
+        # the curve has just been given every point
+        self._selected = None
+        x, y = self.getData()
+        if self.lod is not None and self.lod.x is x and self.lod.y is y:
+            self.updateLOD()
+            return None
+        self.lod = None
+        # (the x check is also false if there are NaNs in x)
+        if x is None or len(x) <= self.MIN_POINTS or self.opts['stepMode'] \
+        or isinstance(self.opts['connect'], np.ndarray) or not np.all(x[1:] >= x[:-1]):
+            return None
+        self.lod = LODPyramid(x, y)
+        self.updateLOD()
+        return None
+
+    def viewRangeChanged(self, *args, **kwargs):
+        '''
+        Updates the level of detail when the view is panned, zoomed or resized.
+        '''
+        super().viewRangeChanged(*args, **kwargs)
+        if self.lod is not None:
+            self.updateLOD()
+
+    def updateLOD(self):
+        '''
+        Draws the points of the curve needed at the current view.
+        '''
+        x_min, x_max = self.lod.x[0], self.lod.x[-1]
+        width = 1000
+        view = self.getViewBox()
+        # (while being added to a plot this may not be a ViewBox yet)
+        if isinstance(view, pg.ViewBox):
+            width = max(int(view.width()), 100)
+            # while autoranging the view is about to be fitted to the data, so
+            # keep all of it in view
+            if not view.autoRangeEnabled()[0]:
+                x_min, x_max = view.viewRange()[0]
+        level, indices = self.lod.select(x_min, x_max, self.POINTS_PER_PIXEL*width)
+        selected = (level, indices[0], indices[-1]) if len(indices) else (level,)
+        if selected == self._selected:
+            return None
+        self._selected = selected
+        # only the points drawn change, the style of the curve is kept
+        self.curve.setData(x=self.lod.x[indices], y=self.lod.y[indices])
+        return None
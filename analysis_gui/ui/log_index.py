@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the single class that indexes the time steps of a direct dynamics
+log, so that the counts of each time step (eg. QC calculations) can be looked
+up and the log read from any time step without reading the whole file.
+'''
+
+import hashlib
+import mmap
+import os
+import re
+
+import numpy as np
+from .directory_cache import DirectoryCache
+
+class LogIndex:
+    '''
+    The byte offset of each time step (a line with 'time[fs]' in it) of the
+    log written by a direct dynamics propagation, and counters of what
+    happened during each time step, see COUNTERS.
+
+    When created, the log is scanned once in blocks of BLOCK_SIZE bytes and
+    the index is kept in the directory cache (see DirectoryCache) in the same
+    directory as the log. The index is stored under the start of the log
+    (which has the host, PID and date of the run) rather than its size, so
+    when the log has grown (eg. the propagation is still running) only the
+    part added since is scanned, see refresh.
+
+    index[0] has the counts before the first time step, index[i+1] is time
+    step i, and the last element is the end of the scan (with a NaN time).
+    '''
+    # a line with the time of a time step
+    TIME_PATTERN = re.compile(rb'time\[fs\][ \t]*([+-]?\d+(?:\.\d*)?)')
+    # the counters of each time step, and the lines they count. a pattern
+    # with a group adds the (integer) value of the group instead of 1. kept
+    # as separate patterns since re only skips quickly to the next match of a
+    # pattern starting with a literal
+    COUNTERS = {
+        'qc_calcs': re.compile(rb'No\. QC calculations[ \t]*:?[ \t]*(\d+)'),
+        'warnings': re.compile(rb'WARNING'),
+        'db_points': re.compile(rb'Generating DB Point'),
+    }
+    # fields of the index, see _scan
+    INDEX_DTYPE = [('offset', 'i8'), ('time', 'f8')] \
+                  + [(name, 'i8') for name in COUNTERS]
+    # size of the blocks the log is scanned in
+    BLOCK_SIZE = 64*1024**2
+    # number of bytes at the start of the log that identify it
+    HEAD_SIZE = 4096
+
+    def __init__(self, filepath, cache:DirectoryCache=None):
+        '''
+        Constructor method. Loads the index from cache if the log has been
+        indexed before, scanning any part of the log added since, otherwise
+        scans the whole log.
+        '''
+        self.filepath = filepath
+        self.cache = cache
+        self.index = None
+        index = self._loadIndex()
+        if index is not None:
+            self.index = index
+            try:
+                self.refresh()
+            except ValueError:
+                # made shorter, so not the log that was indexed
+                self.index = None
+        if self.index is None:
+            self.index = self._scan()
+            self._saveIndex()
+
+    @property
+    def times(self) -> np.ndarray:
+        '''
+        The time of each time step.
+        '''
+        return self.index['time'][1:-1]
+
+    @property
+    def end(self) -> int:
+        '''
+        The byte offset up to which the log has been scanned, the end of its
+        last complete line.
+        '''
+        return int(self.index['offset'][-1])
+
+    def __len__(self) -> int:
+        '''
+        Returns the number of time steps.
+        '''
+        return len(self.index) - 2
+
+    def counts(self, name:str) -> np.ndarray:
+        '''
+        Returns the counter called name (see COUNTERS) of each time step.
+        '''
+        return self.index[name][1:-1]
+
+    def before(self, name:str) -> int:
+        '''
+        Returns the counter called name before the first time step.
+        '''
+        return int(self.index[name][0])
+
+    def find(self, time:float) -> int:
+        '''
+        Returns the index of the time step that time is in, ie. the last one
+        starting at or before time (or the first time step).
+        '''
+        return max(int(np.searchsorted(self.times, time, side='right')) - 1, 0)
+
+    def read(self, i:int=None, max_bytes:int=None) -> tuple:
+        '''
+        Returns (text, more), the text of the log from the start of time step i
+        (or from the start of the log if i is None) up to the end of the scan,
+        and the number of bytes after the text that were not read. If
+        max_bytes is given, at most that many bytes (up to the end of a line)
+        are read.
+        '''
+        start = 0 if i is None else int(self.index['offset'][range(len(self))[i] + 1])
+        stop = self.end
+        if max_bytes is not None and stop - start > max_bytes:
+            stop = start + max_bytes
+        with open(self.filepath, mode='rb') as f:
+            f.seek(start)
+            data = f.read(stop - start)
+        if stop < self.end:
+            # up to the end of a line
+            data = data[:data.rfind(b'\n') + 1] or data
+        return data.decode('utf-8', errors='replace'), self.end - start - len(data)
+
+    def refresh(self) -> int:
+        '''
+        Scans any lines added to the end of the log since it was last scanned,
+        returning the number of new time steps. Raises ValueError if the log
+        has become shorter.
+        '''
+        size = os.stat(self.filepath).st_size
+        if size < self.end:
+            raise ValueError(f'{self.filepath} has been overwritten')
+        if size == self.end:
+            return 0
+        n_steps = len(self)
+        if n_steps == 0:
+            self.index = self._scan()
+        else:
+            # scan again from the start of the last time step, whose counts
+            # may have been incomplete
+            last = len(self.index) - 2
+            tail = self._scan(int(self.index['offset'][last]))
+            self.index = np.concatenate([self.index[:last], tail[1:]])
+        self._saveIndex()
+        return len(self) - n_steps
+
+    def _key(self) -> str:
+        '''
+        Returns the key of the index in the cache, made from the path and the
+        start of the log.
+        '''
+        with open(self.filepath, mode='rb') as f:
+            head = hashlib.sha1(f.read(self.HEAD_SIZE)).hexdigest()
+        patterns = [self.TIME_PATTERN.pattern] \
+                   + [pattern.pattern for pattern in self.COUNTERS.values()]
+        return DirectoryCache.makeKey('LogIndex', self.INDEX_DTYPE, patterns,
+                                      str(os.path.abspath(self.filepath)), head)
+
+    def _loadIndex(self) -> np.ndarray:
+        '''
+        Returns the index stored in the cache, or None if there isn't one.
+        '''
+        if self.cache is None or not self.cache.enabled:
+            return None
+        index = self.cache.loadArray(self._key())
+        return None if index is None else np.array(index)
+
+    def _saveIndex(self):
+        '''
+        Stores the index in the cache (if there is one).
+        '''
+        if self.cache is not None and self.cache.enabled:
+            self.cache.saveArray(self._key(), self.index)
+
+    @classmethod
+    def countSteps(cls, data:bytes, start:int=0, end:int=None) -> tuple:
+        '''
+        Finds the time steps in data[start:end] (the bytes of a log, or a
+        memory map of it), returning a numpy array of the byte offset of the
+        start of the line of each time step, a numpy array of the times, and a
+        dict with a numpy array of each counter (see COUNTERS), where element
+        0 is the count before the first time step and element i+1 the count in
+        time step i.
+
+        Each pattern is found with finditer over the whole range, rather than
+        searching each line, and the counts are summed into their time steps
+        with numpy.
+        '''
+        if end is None:
+            end = len(data)
+        def find(pattern:re.Pattern) -> tuple:
+            # byte offsets and values of the matches of pattern
+            found = [(match.start(), match[1] if pattern.groups else 1)
+                     for match in pattern.finditer(data, start, end)]
+            if not found:
+                return np.empty(0, dtype=int), np.empty(0)
+            starts, values = zip(*found)
+            return np.array(starts), np.array(values).astype(float)
+        time_starts, times = find(cls.TIME_PATTERN)
+        # a time step starts at the start of its line
+        time_starts = np.array([max(data.rfind(b'\n', start, offset) + 1, start)
+                                for offset in time_starts], dtype=int)
+        counts = {}
+        for name, pattern in cls.COUNTERS.items():
+            starts, values = find(pattern)
+            # the time step (+1) that each match is in
+            step = np.searchsorted(time_starts, starts, side='right')
+            counts[name] = np.bincount(step, weights=values,
+                                       minlength=len(times) + 1).astype(int)
+        return time_starts, times, counts
+
+    def _scan(self, start:int=0) -> np.ndarray:
+        '''
+        Scans the log once from byte offset start (which should be the start
+        of a line), returning the index of the time steps found (see the class
+        documentation), with index[0] the counts between start and the first
+        time step. A partly written last line is not included.
+        '''
+        time_starts, times = [], []
+        # the counts before the first time step, then in each time step
+        counts = {name: [0] for name in self.COUNTERS}
+        end = start
+        with open(self.filepath, mode='rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            # (empty files can't be memory-mapped)
+            if size > start:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    # search the log in place, one block (of whole lines) at a
+                    # time
+                    end = data.rfind(b'\n', start) + 1 or start
+                    block_start = start
+                    while block_start < end:
+                        block_end = min(block_start + self.BLOCK_SIZE, end)
+                        if block_end < end:
+                            block_end = data.rfind(b'\n', block_start, block_end) + 1 \
+                                        or data.find(b'\n', block_end) + 1
+                        block = self.countSteps(data, block_start, block_end)
+                        time_starts.extend(block[0].tolist())
+                        times.extend(block[1].tolist())
+                        for name, count in block[2].items():
+                            # counts before the first time step in the block
+                            # are in the last time step before it
+                            counts[name][-1] += int(count[0])
+                            counts[name].extend(count[1:].tolist())
+                        block_start = block_end
+        index = np.zeros(len(times) + 2, dtype=self.INDEX_DTYPE)
+        index['offset'] = [start] + time_starts + [end]
+        index['time'][1:-1] = times
+        index['time'][[0, -1]] = np.nan
+        for name, count in counts.items():
+            index[name][:-1] = count
+        return index
@@ -7,8 +7,11 @@ window, including menus.
 '''
 
 from pathlib import Path
+import shutil
 import subprocess
+import tracemalloc
 from PyQt5 import QtWidgets, QtCore, QtGui, uic
+from .directory_cache import DirectoryCache
 
 class AnalysisMain(QtWidgets.QMainWindow):
     '''
@@ -45,6 +48,9 @@ class AnalysisMain(QtWidgets.QMainWindow):
         self.cleanup.triggered.connect(self.cleanupDirectory)
         self.allow_add_flags.triggered.connect(self.showAddFlags)
         self.open_guide.triggered.connect(self.openUserGuide)
+        self.follow.triggered.connect(self.toggleFollow)
+        self.instrument.triggered.connect(self.toggleInstrumentation)
+        self.instrument_log.triggered.connect(self.toggleInstrumentationLog)
 
         # add a timeout spinbox to the timeout menu
         self.timeout = QtWidgets.QDoubleSpinBox(self)
@@ -55,11 +61,51 @@ class AnalysisMain(QtWidgets.QMainWindow):
         timeout_action = QtWidgets.QWidgetAction(self)
         timeout_action.setDefaultWidget(self.timeout)
         self.menu_timeout.addAction(timeout_action)
+        # add a spinbox to the cache size menu, for the maximum size of the
+        # cache of parsed output files kept in each directory (0 disables it)
+        self.cache_size = QtWidgets.QSpinBox(self)
+        self.cache_size.setSuffix(' MB')
+        self.cache_size.setMaximum(1024**2)
+        self.cache_size.setValue(1024)
+        self.cache_size.setStatusTip('Maximum size of the cache of parsed '
+                                     'output files in each directory (0 to '
+                                     'disable).')
+        cache_action = QtWidgets.QWidgetAction(self)
+        cache_action.setDefaultWidget(self.cache_size)
+        self.menu_cache.addAction(cache_action)
+
+        # busy indicator in the status bar, shown while analyses are running
+        # on worker threads
+        self.running = 0
+        self.busy = QtWidgets.QProgressBar(self)
+        self.busy.setRange(0, 0)
+        self.busy.setMaximumWidth(150)
+        self.busy.hide()
+        self.statusbar.addPermanentWidget(self.busy)
+        # summary of the performance instrumentation of the last analysis,
+        # hover over it for the full table
+        self.profile_label = QtWidgets.QLabel(self)
+        self.profile_label.hide()
+        self.statusbar.addPermanentWidget(self.profile_label)
+        # JSON lines file the instrumentation is appended to (None if not)
+        self.instrument_log_path = None
 
         # activate the analysis widgets
-        for widget in [self.analconv, self.analint, self.analres, self.analsys, self.analdd]:
+        self.tabs = [self.analconv, self.analint, self.analres, self.analsys, self.analdd]
+        for widget in self.tabs:
             widget.activate()
 
+    def closeEvent(self, event:QtGui.QCloseEvent):
+        '''
+        Cancels any analyses still running on worker threads before closing,
+        so that no commands are left running.
+        '''
+        for widget in self.tabs:
+            if widget.worker is not None:
+                widget.cancel()
+        QtCore.QThreadPool.globalInstance().waitForDone()
+        super().closeEvent(event)
+
     @QtCore.pyqtSlot()
     def cleanupDirectory(self):
         '''
@@ -97,6 +143,11 @@ class AnalysisMain(QtWidgets.QMainWindow):
         files = []
         for glob in file_glob:
             files.extend(list(self.dir.cwd.glob(glob)))
+        # the cache folder (including the stored showsys plots, see
+        # AnalysisSystem.runShowsys) is removed as a whole
+        cache_dir = self.dir.cwd/DirectoryCache.DIRNAME
+        if cache_dir.is_dir():
+            files.append(cache_dir)
 
         if files:
             clicked = QtWidgets.QMessageBox.question(
@@ -105,7 +156,10 @@ class AnalysisMain(QtWidgets.QMainWindow):
             )
             if clicked == QtWidgets.QMessageBox.Yes:
                 for file in files:
-                    file.unlink()
+                    if file.is_dir():
+                        shutil.rmtree(file)
+                    else:
+                        file.unlink()
                 QtWidgets.QMessageBox.information(
                     self, 'Success', 'Deletion successful.'
                 )
@@ -115,6 +169,84 @@ class AnalysisMain(QtWidgets.QMainWindow):
                 'Found no analysis output files in this directory.'
             )
 
+    def analysisStarted(self):
+        '''
+        Shows the busy indicator, called when an analysis tab starts running an
+        analysis on a worker thread.
+        '''
+        self.running += 1
+        self.busy.setToolTip(f'{self.running} analysis(es) running')
+        self.busy.show()
+
+    def analysisFinished(self):
+        '''
+        Hides the busy indicator once all analyses running on worker threads
+        have finished.
+        '''
+        self.running -= 1
+        self.busy.setToolTip(f'{self.running} analysis(es) running')
+        if self.running == 0:
+            self.busy.hide()
+
+    @QtCore.pyqtSlot()
+    def toggleFollow(self):
+        '''
+        Stops following files when the user turns following off. Following
+        starts with the next analysis when turned on.
+        '''
+        if not self.follow.isChecked():
+            for widget in self.tabs:
+                widget.stopFollowing()
+
+    @QtCore.pyqtSlot()
+    def toggleInstrumentation(self):
+        '''
+        Starts/stops tracing memory allocations when the user turns the
+        performance instrumentation on/off, since tracing slows python down.
+        '''
+        if self.instrument.isChecked():
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        else:
+            tracemalloc.stop()
+            self.profile_label.hide()
+
+    @QtCore.pyqtSlot()
+    def toggleInstrumentationLog(self):
+        '''
+        Asks the user for the file to log the performance instrumentation to
+        when they turn logging on.
+        '''
+        if not self.instrument_log.isChecked():
+            self.instrument_log_path = None
+            return None
+        filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Log instrumentation to file',
+            str(Path(self.dir.cwd)/'analysis_profile.jsonl'),
+            'JSON lines (*.jsonl);;All files (*)'
+        )
+        if filepath:
+            self.instrument_log_path = filepath
+        else:
+            self.instrument_log.setChecked(False)
+        return None
+
+    def showProfile(self, profile):
+        '''
+        Shows the performance instrumentation of an analysis (an
+        instrumentation.Profile) in the status bar, and appends it to the log
+        file if logging is on.
+        '''
+        self.profile_label.setText(profile.text())
+        self.profile_label.setToolTip(f'<pre>{profile.table()}</pre>')
+        self.profile_label.show()
+        if self.instrument_log_path:
+            try:
+                with open(self.instrument_log_path, mode='a', encoding='utf-8') as f:
+                    f.write(profile.toJson() + '\n')
+            except OSError as e:
+                self.statusbar.showMessage(f'Could not log instrumentation: {e}', 10000)
+
     @QtCore.pyqtSlot()
     def showAddFlags(self):
         '''
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the single class that draws a large number of lines (eg. the
+trajectory of every GWP) as one plot item.
+'''
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtCore
+
+class MultiLineItem(pg.GraphicsObject):
+    '''
+    Draws many lines with the same number of points as a single item, rather
+    than one PlotDataItem each. The lines drawn with the same pen are joined
+    into one QPainterPath, so the cost of drawing depends on the number of
+    pens rather than the number of lines.
+    '''
+
+    def __init__(self, x:np.ndarray, y:np.ndarray, pens:list, pen_index:np.ndarray=None):
+        '''
+        Constructor method. x and y are (lines, points) arrays (either can
+        also be a (points,) array shared by every line), pens are the pens
+        used (anything accepted by pyqtgraph's mkPen), and pen_index is the
+        index of the pen of each line (by default, the first pen for every
+        line).
+        '''
+        super().__init__()
+        self.pens = [pg.mkPen(pen) for pen in pens]
+        # QPainterPath of each pen
+        self.paths = []
+        self._bounds = QtCore.QRectF()
+        self.setLines(x, y, pen_index)
+
+    def setLines(self, x:np.ndarray, y:np.ndarray, pen_index:np.ndarray=None):
+        '''
+        Sets the lines drawn, see the constructor.
+        '''
+        x, y = np.broadcast_arrays(np.atleast_2d(x), np.atleast_2d(y))
+        if pen_index is None:
+            pen_index = np.zeros(len(x), dtype=int)
+        self.prepareGeometryChange()
+        self.paths = []
+        self._bounds = QtCore.QRectF()
+        for i, pen in enumerate(self.pens):
+            lines = np.nonzero(pen_index == i)[0]
+            if len(lines) == 0 or x.shape[1] == 0:
+                continue
+            # join each point to the next, except the last point of each line
+            connect = np.ones((len(lines), x.shape[1]), dtype=bool)
+            connect[:, -1] = False
+            path = pg.arrayToQPath(x[lines].ravel(), y[lines].ravel(),
+                                   connect=connect.ravel())
+            self.paths.append((pen, path))
+            self._bounds = self._bounds.united(path.boundingRect())
+        self.update()
+
+    def boundingRect(self) -> QtCore.QRectF:
+        '''
+        Returns the rectangle containing all the lines.
+        '''
+        return self._bounds
+
+    def paint(self, painter, *args):
+        '''
+        Draws the lines of each pen.
+        '''
+        for pen, path in self.paths:
+            painter.setPen(pen)
+            painter.drawPath(path)
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the classes that show a large table of results (eg. the entries
+of the database found by ddpesgeo), formatting only the rows that are shown.
+'''
+
+import numpy as np
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+class ResultTableModel(QtCore.QAbstractTableModel):
+    '''
+    Table model of columns of numpy arrays. The rows are added to the view a
+    page of PAGE_ROWS at a time as it is scrolled (see fetchMore), and a cell
+    is only formatted when the view shows it, so the size of the table
+    doesn't affect how long it takes to show.
+
+    bold is an optional (rows, columns) boolean array of the cells to show in
+    bold. detail is an optional function of the row returning text to show
+    about it (eg. the geometry of an entry), see ResultTable. extra_header
+    and extra are columns (an (rows, columns) array) that aren't shown in the
+    table but are written by export.
+    '''
+    # rows added to the view at a time
+    PAGE_ROWS = 1000
+
+    def __init__(self, header:list, columns:list, bold:np.ndarray=None,
+                 detail:callable=None, extra_header:list=None,
+                 extra:np.ndarray=None, parent:QtCore.QObject=None):
+        '''
+        Constructor method. columns is a list of (rows,) arrays, with a name
+        in header for each.
+        '''
+        super().__init__(parent)
+        self.header = list(header)
+        self.columns = columns
+        self.bold = bold
+        self.detail = detail
+        self.extra_header = list(extra_header or [])
+        self.extra = extra
+        self.n_rows = len(columns[0]) if columns else 0
+        # number of rows added to the view so far
+        self._loaded = min(self.n_rows, self.PAGE_ROWS)
+
+    def rowCount(self, parent:QtCore.QModelIndex=QtCore.QModelIndex()) -> int:
+        '''
+        Returns the number of rows added to the view so far.
+        '''
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent:QtCore.QModelIndex=QtCore.QModelIndex()) -> int:
+        '''
+        Returns the number of columns.
+        '''
+        return 0 if parent.isValid() else len(self.columns)
+
+    def canFetchMore(self, parent:QtCore.QModelIndex) -> bool:
+        '''
+        Returns whether there are rows that have not been added to the view.
+        '''
+        return not parent.isValid() and self._loaded < self.n_rows
+
+    def fetchMore(self, parent:QtCore.QModelIndex):
+        '''
+        Adds the next page of rows to the view, called by the view when it is
+        scrolled to the end of the rows added so far.
+        '''
+        if parent.isValid():
+            return None
+        n_new = min(self.n_rows - self._loaded, self.PAGE_ROWS)
+        self.beginInsertRows(QtCore.QModelIndex(), self._loaded, self._loaded + n_new - 1)
+        self._loaded += n_new
+        self.endInsertRows()
+        return None
+
+    def data(self, index:QtCore.QModelIndex, role:int=QtCore.Qt.DisplayRole):
+        '''
+        Returns the formatted value of a cell (or its font or alignment).
+        '''
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == QtCore.Qt.DisplayRole:
+            return self.formatCell(self.columns[col][row])
+        if role == QtCore.Qt.FontRole and self.bold is not None and self.bold[row, col]:
+            font = QtGui.QFont()
+            font.setBold(True)
+            return font
+        if role == QtCore.Qt.TextAlignmentRole:
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section:int, orientation:QtCore.Qt.Orientation,
+                   role:int=QtCore.Qt.DisplayRole):
+        '''
+        Returns the name of a column, or the number of a row (from 1).
+        '''
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.header[section]
+        return str(section + 1)
+
+    @staticmethod
+    def formatCell(value) -> str:
+        '''
+        Formats the value of a cell, floats in scientific format.
+        '''
+        if isinstance(value, (float, np.floating)):
+            return f'{value: .8e}'
+        return str(value)
+
+    def export(self, filepath, chunk_rows:int=10000):
+        '''
+        Writes every row of the table (including the extra columns) to
+        filepath, as whitespace-separated columns with a header line. The
+        rows are formatted and written chunk_rows at a time, so the whole
+        table is never formatted in memory at once.
+        '''
+        header = [name.replace(' ', '_') for name in self.header + self.extra_header]
+        columns = list(self.columns)
+        if self.extra is not None:
+            columns.extend(self.extra.T)
+        # one format for a whole row, floats as formatCell does
+        row_format = ' '.join('% .8e' if np.issubdtype(np.asarray(column).dtype, np.floating)
+                              else '%s' for column in columns) + '\n'
+        with open(filepath, mode='w', encoding='utf-8') as s:
+            s.write('# ' + ' '.join(header) + '\n')
+            for start in range(0, self.n_rows, chunk_rows):
+                chunk = []
+                for column in columns:
+                    column = np.asarray(column[start:start+chunk_rows])
+                    if column.dtype.kind == 'U':
+                        # so the columns can be split on whitespace
+                        column = np.char.replace(column, ' ', '_')
+                    chunk.append(column.tolist())
+                s.writelines(row_format % row for row in zip(*chunk))
+
+class ResultTable(QtWidgets.QWidget):
+    '''
+    Shows a ResultTableModel in a table view, with a title above and a pane
+    below it showing the detail of the row selected (see the model). The
+    table can be exported by right-clicking it.
+
+    This widget cannot function independently as it is tied to the
+    AnalysisMain class, referred to using self.window().
+    '''
+
+    def __init__(self, *args, **kwargs):
+        '''
+        Constructor method.
+        '''
+        super().__init__(*args, **kwargs)
+        self.title = QtWidgets.QLabel(self)
+        self.title.setWordWrap(True)
+        self.view = QtWidgets.QTableView(self)
+        self.view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        # all rows have the same height, so the view doesn't need to measure
+        # each one
+        self.view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.view.customContextMenuRequested.connect(self.showTableMenu)
+        self.detail = QtWidgets.QPlainTextEdit(self)
+        self.detail.setReadOnly(True)
+        self.detail.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.detail.setFont(QtGui.QFont('Courier'))
+        splitter = QtWidgets.QSplitter(QtCore.Qt.Vertical, self)
+        splitter.addWidget(self.view)
+        splitter.addWidget(self.detail)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 1)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.title)
+        layout.addWidget(splitter)
+        self.export_table = QtWidgets.QAction('Export table')
+        self.export_table.triggered.connect(self.exportTable)
+
+    def setModel(self, model:ResultTableModel, title:str=''):
+        '''
+        Shows the table of model, with title above it.
+        '''
+        old = self.view.model()
+        self.title.setText(title)
+        self.detail.clear()
+        model.setParent(self)
+        self.view.setModel(model)
+        self.view.selectionModel().currentRowChanged.connect(self.showDetail)
+        # size the columns from the first rows only
+        self.view.horizontalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.ResizeToContents
+        )
+        self.view.horizontalHeader().setResizeContentsPrecision(100)
+        if old is not None:
+            old.deleteLater()
+
+    @QtCore.pyqtSlot(QtCore.QModelIndex, QtCore.QModelIndex)
+    def showDetail(self, current:QtCore.QModelIndex, previous:QtCore.QModelIndex):
+        '''
+        Shows the detail of the row selected.
+        '''
+        model = self.view.model()
+        if not current.isValid() or model.detail is None:
+            self.detail.clear()
+            return None
+        self.detail.setPlainText(model.detail(current.row()))
+        return None
+
+    @QtCore.pyqtSlot(QtCore.QPoint)
+    def showTableMenu(self, point:QtCore.QPoint):
+        '''
+        Shows a context menu when right-clicking on the table.
+        '''
+        menu = QtWidgets.QMenu(self)
+        menu.addAction(self.export_table)
+        self.export_table.setEnabled(self.view.model() is not None)
+        menu.exec_(self.view.viewport().mapToGlobal(point))
+
+    @QtCore.pyqtSlot()
+    def exportTable(self):
+        '''
+        Exports every row of the table to a file chosen by the user.
+        '''
+        savename, ok = QtWidgets.QFileDialog.getSaveFileName(self,
+            'Export Table', str(self.window().dir.cwd / 'Untitled.txt'),
+            'Text (*.txt);;All files (*)'
+        )
+        if not ok or not savename:
+            # user cancels operation
+            return None
+        self.view.model().export(savename)
+        self.window().statusbar.showMessage(f'Exported table to {savename}', 5000)
+        return None
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the class that describes the columns of a type of Quantics output
+file, and SCHEMAS, the dictionary of schemas for each file type read by the
+analysis tabs.
+'''
+
+import re
+import numpy as np
+from .analysis_tab import AnalysisTab
+
+# a float in the form 0.123, -1.234E-10, etc.
+FLOAT = r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+# whitespace within a line
+WS = r'[ \t]'
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct',
+          'Nov', 'Dec']
+
+class Schema:
+    '''
+    Describes the columns of a type of Quantics output file, so that the file
+    can be read straight into a numpy structured array in a single pass.
+
+    fields is a list of (name, dtype) tuples, one for each column. The last
+    field may instead be (name, dtype, None), which takes all the remaining
+    columns as one 2D field (eg. one column for each state). A dtype of 'U'
+    (string) is sized to fit the longest string in the column.
+
+    If regex is None, the file is read as a grid of numbers using
+    AnalysisTab.readFloats, ignoring lines matching ignore_regex and lines
+    without the right number of columns. Otherwise, each row is given by a
+    match of regex in the file (with re.MULTILINE), with one group for each
+    field. Dates (datetime64 fields) are matched in the form 'MMM DD hh:mm:ss',
+    with the year taken from the first full date ('MMM DD hh:mm:ss YYYY')
+    found in the file.
+    '''
+
+    def __init__(self, fields:list, regex:str=None, ignore_regex:str=None):
+        '''
+        Constructor method. See the class docstring for the arguments.
+        '''
+        self.fields = fields
+        self.regex = re.compile(regex, re.MULTILINE) if regex else None
+        self.ignore_regex = ignore_regex
+
+    def read(self, filepath:str) -> np.ndarray:
+        '''
+        Reads the file at filepath and returns a structured array with one
+        element for each row. Raises ValueError if no rows are found.
+        '''
+        with open(filepath, mode='r', encoding='utf-8') as f:
+            return self.readText(f.read())
+
+    def readText(self, txt:str, after:np.datetime64=None) -> np.ndarray:
+        '''
+        Same as read, but reads the rows in the string txt (eg. the lines added
+        to the end of a file). after is the date of the row before txt (eg. the
+        last row already read), which the year of the dates is taken from if
+        there is no full date in txt.
+        '''
+        if self.regex is None:
+            columns = self._gridColumns(txt)
+        else:
+            columns = self._regexColumns(txt, after)
+        arr = np.empty(len(columns[0]),
+                       dtype=[(field[0], col.dtype, col.shape[1:])
+                              for field, col in zip(self.fields, columns)])
+        for field, col in zip(self.fields, columns):
+            arr[field[0]] = col
+        return arr
+
+    def _gridColumns(self, txt:str) -> list:
+        '''
+        Returns a list of arrays, one for each field, of a file that is a grid
+        of numbers.
+        '''
+        rest = len(self.fields[-1]) == 3
+        n_fixed = len(self.fields) - rest
+        floats = AnalysisTab.readFloats(txt.split('\n'),
+                                        None if rest else n_fixed,
+                                        self.ignore_regex)
+        if floats.shape[1] <= n_fixed and rest:
+            raise ValueError(f'Expected more than {n_fixed} columns, found '
+                             f'{floats.shape[1]}')
+        columns = [floats[:, i].astype(self.fields[i][1]) for i in range(n_fixed)]
+        if rest:
+            columns.append(floats[:, n_fixed:].astype(self.fields[-1][1]))
+        return columns
+
+    def _regexColumns(self, txt:str, after:np.datetime64=None) -> list:
+        '''
+        Returns a list of arrays, one for each field, of the groups matched by
+        self.regex in txt.
+        '''
+        matches = self.regex.findall(txt)
+        if len(matches) == 0:
+            raise ValueError('No rows found in file')
+        # 2D array of strings, one column for each group
+        strings = np.array(matches, ndmin=2)
+        columns = []
+        for i, (name, dtype) in enumerate(self.fields):
+            if np.dtype(dtype).kind == 'M':
+                columns.append(self._parseDates(strings[:, i], txt, after))
+            else:
+                columns.append(strings[:, i].astype(dtype))
+        return columns
+
+    @staticmethod
+    def _parseDates(strings:np.ndarray, txt:str, after:np.datetime64=None) -> np.ndarray:
+        '''
+        Converts an array of dates in the form 'MMM DD hh:mm:ss' into an array
+        of datetime64. The dates are assumed to be in order, so that the year
+        increases whenever the month goes backwards. The year of the first date
+        is taken from the first full date in txt, or if there is none, from the
+        date after (increased if the first month is before the month of after).
+        '''
+        match = re.search(r'\w{3}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2}\s+(\d{4})', txt)
+        year = 1970
+        if match:
+            year = int(match[1])
+        elif after is not None:
+            year = after.astype('M8[Y]').astype(int) + 1970
+        # split into month, day, hh:mm:ss
+        parts = np.array([date.split() for date in strings.tolist()], ndmin=2)
+        # convert month names to 0 (Jan) ... 11 (Dec)
+        order = np.argsort(MONTHS)
+        index = np.searchsorted(np.array(MONTHS)[order], parts[:, 0])
+        month = order[np.minimum(index, 11)]
+        if np.any(np.array(MONTHS)[month] != parts[:, 0]):
+            raise ValueError('Invalid month in date')
+        if not match and after is not None \
+        and month[0] < after.astype('M8[M]').astype(int) % 12:
+            # eg. December to January between the rows before and txt
+            year += 1
+        years = year + np.cumsum(np.diff(month, prepend=month[0]) < 0)
+        hms = np.array([time.split(':') for time in parts[:, 2].tolist()], dtype=int)
+        return ((years - 1970) * 12 + month).astype('M8[M]').astype('M8[s]') \
+               + (parts[:, 1].astype(int) - 1).astype('m8[D]') \
+               + (hms @ np.array([3600, 60, 1])).astype('m8[s]')
+
+# schemas of the Quantics output files read by the analysis tabs. see the
+# docstrings of each analysis method for the file formats
+SCHEMAS = {
+    'speed': Schema(
+        [('time', 'f8'), ('cpu', 'f8'), ('delta_cpu', 'f8'), ('date', 'M8[s]'),
+         ('real', 'f8'), ('real_h', 'f8')],
+        regex=(rf'^{WS}*({FLOAT}){WS}+({FLOAT}){WS}+({FLOAT}){WS}+'
+               rf'(\w{{3}}{WS}+\d{{1,2}}{WS}+\d{{2}}:\d{{2}}:\d{{2}}){WS}+'
+               rf'({FLOAT}){WS}+({FLOAT}){WS}*$')
+    ),
+    'timing': Schema(
+        [('line', 'U'), ('name', 'U'), ('calls', 'i8'), ('cpu_per_call', 'f8'),
+         ('cpu', 'f8'), ('cpu_percent', 'f8'), ('clock', 'f8')],
+        # the whole line is also kept (first group), to display it as it is
+        regex=(rf'^({WS}*(\S.*?){WS}+(\d+){WS}+({FLOAT}){WS}+({FLOAT}){WS}+'
+               rf'({FLOAT}){WS}+({FLOAT}){WS}*)$')
+    ),
+    'update': Schema(
+        [('step', 'i8'), ('step_size', 'f8'), ('error_a', 'f8'),
+         ('error_spf', 'f8'), ('time', 'f8')],
+        ignore_regex=r'^#'
+    ),
+    'auto': Schema(
+        [('time', 'f8'), ('re', 'f8'), ('im', 'f8'), ('abs', 'f8')],
+        ignore_regex=r'^#'
+    ),
+    'eigval': Schema(
+        [('n', 'i8'), ('eigenvalue', 'f8'), ('intensity', 'f8'),
+         ('error', 'f8'), ('eigenvalue_cm', 'f8'), ('excitation', 'f8')]
+    ),
+    'spops': Schema(
+        [('time', 'f8'), ('population', 'f8', None)],
+        ignore_regex=r'^#'
+    ),
+    'gpop.pl': Schema(
+        [('time', 'f8'), ('grid_begin', 'f8'), ('grid_end', 'f8'),
+         ('basis_begin', 'f8'), ('basis_end', 'f8')],
+        ignore_regex=r'^#'
+    ),
+    'natpop_*.pl': Schema(
+        [('time', 'f8'), ('weight', 'f8', None)]
+    ),
+    'qdq_*.pl': Schema(
+        [('time', 'f8'), ('q', 'f8'), ('dq', 'f8')]
+    ),
+}
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+'''
+@author: 19081417
+
+Consists of the single class that provides a dialog showing a grid of small
+plots, one for each of a set of related analyses.
+'''
+
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph import intColor as colr
+from PyQt5 import QtWidgets, QtCore
+
+class SmallMultiplesDialog(QtWidgets.QDialog):
+    '''
+    A non-modal dialog with a grid of small plots sharing the same x axis, eg.
+    the natural populations for each mode (rows) and state (columns).
+
+    data should be a 4D array with shape (rows, columns, points, 1 + curves),
+    where data[i, j, :, 0] is the x data of the plot in row i and column j,
+    and data[i, j, :, k] the y data of its curve k. Any NaN (eg. padding for
+    plots with fewer points or curves) is not plotted.
+
+    Clicking on a plot emits cellClicked with its row and column.
+    '''
+    cellClicked = QtCore.pyqtSignal(int, int)
+    # height of each plot in pixels
+    CELL_HEIGHT = 160
+
+    def __init__(self, parent:QtWidgets.QWidget, title:str, data:np.ndarray,
+                 row_names:list, column_names:list):
+        '''
+        Constructor method. Creates one plot for each row and column of data,
+        labelled using row_names and column_names.
+        '''
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.resize(250*min(data.shape[1], 4) + 40, 600)
+        self.setLayout(QtWidgets.QVBoxLayout())
+        self.layout().addWidget(QtWidgets.QLabel('Click on a plot to show it in '
+                                                 'the main window.'))
+        self.graphics = pg.GraphicsLayoutWidget()
+        self.graphics.setBackground('w')
+        self.graphics.setMinimumHeight(self.CELL_HEIGHT*data.shape[0])
+        scroll = QtWidgets.QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(self.graphics)
+        self.layout().addWidget(scroll)
+
+        # the PlotItem in each cell, to find which one was clicked
+        self.cells = {}
+        first = None
+        for i, row_name in enumerate(row_names):
+            for j, column_name in enumerate(column_names):
+                cell = self.graphics.addPlot(row=i, col=j,
+                                             title=f'{row_name}, {column_name}')
+                # share the x axis, so that zooming in one zooms in all
+                if first is None:
+                    first = cell
+                else:
+                    cell.setXLink(first)
+                n_curves = data.shape[3] - 1
+                for k in range(n_curves):
+                    y = data[i, j, :, k+1]
+                    keep = ~np.isnan(y)
+                    if keep.any():
+                        cell.plot(data[i, j, keep, 0], y[keep],
+                                  pen=colr(k, n_curves, maxValue=200))
+                self.cells[cell] = (i, j)
+        self.graphics.scene().sigMouseClicked.connect(self.mouseClicked)
+
+    @QtCore.pyqtSlot(object)
+    def mouseClicked(self, event):
+        '''
+        Emits cellClicked if the user clicked on one of the plots.
+        '''
+        for cell, (i, j) in self.cells.items():
+            if cell.sceneBoundingRect().contains(event.scenePos()):
+                self.cellClicked.emit(i, j)
+                return None
+        return None
@@ -20,9 +20,12 @@ if cwd not in sys.path:
     sys.path.append(cwd)
     print(f'Note: {cwd} appended to sys.path')
 
-if '-test' in sys.argv:
-    from analysis_gui.tests import run_tests
-    run_tests.runTests()
-else:
-    from analysis_gui import gui
-    gui.openGui()
+# the guard is needed since worker processes (eg. for parsing large files in
+# parallel) import this file again
+if __name__ == '__main__':
+    if '-test' in sys.argv:
+        from analysis_gui.tests import run_tests
+        run_tests.runTests()
+    else:
+        from analysis_gui import gui
+        gui.openGui()